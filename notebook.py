@@ -11,6 +11,7 @@ async with app.setup(hide_code=True):
     if "pyodide" in sys.modules:
         import micropip
         await micropip.install("polars")
+        await micropip.install("numpy")
         await micropip.install("pyarrow")
         await micropip.install("xlsxwriter")
         # electricore 1.2.0+ avec core minimal compatible WASM
@@ -19,21 +20,39 @@ async with app.setup(hide_code=True):
     # Imports standards
     import marimo as mo
     import polars as pl
-    from pathlib import Path
-    from datetime import datetime, time, timedelta
-    import io
+    from datetime import datetime
     import altair as alt
 
     # Import electricore pour calculs TURPE
-    from electricore.core.pipelines.turpe import (
-        ajouter_turpe_fixe,
-        ajouter_turpe_variable,
-        load_turpe_rules,
+    from electricore.core.pipelines.turpe import load_turpe_rules
+
+    # Moteur d'optimisation (courbe → index de dépassement → scénarios → coûts)
+    from opti_c4 import (
+        CalendrierCadrans,
+        agreger_balayage_plages_hc,
+        agreger_depassements,
+        analyser_courbe,
+        calculer_couts,
+        charger_courbe_avec_cache,
+        classifier_courbe,
+        construire_index_depassement,
+        construire_index_mensuel,
+        COLONNES_RESULTATS,
+        COLONNES_SCENARIOS,
+        CubeDepassementMensuel,
+        extraire_regles_turpe,
+        fusionner_courbes,
+        generer_scenarios,
+        generer_scenarios_btinf,
+        generer_scenarios_optimaux_btsup,
+        NoyauTurpe,
+        parser_plages_horaires,
+        preparer_scenarios_turpe,
+        reechantillonner_courbe,
+        selectionner_source_pmax,
+        verifier_noyau_turpe,
     )
 
-    # Import pour optimisation multi-cadrans
-    from itertools import combinations_with_replacement
-
 
 @app.cell(hide_code=True)
 def _():
@@ -66,7 +85,8 @@ def _():
     file_upload = mo.ui.file(
         filetypes=[".csv"],
         kind="area",
-        label="Sélectionnez votre fichier CSV R63 (format Enedis)"
+        multiple=True,
+        label="Sélectionnez vos fichiers CSV R63 (format Enedis) : en cas de recouvrement, le dernier fichier l'emporte"
     )
     file_upload
     return (file_upload,)
@@ -92,40 +112,81 @@ def _():
         placeholder="Ex: 02h00-07h00 ou 02h00-07h00;22h00-06h00",
         full_width=True
     )
-    plage_hc_input
-    return (plage_hc_input,)
+    # Plages HC saisonnalisées (TURPE 7) : vide = mêmes plages toute l'année
+    plage_hc_saison_basse_input = mo.ui.text(
+        value="",
+        label="Plages HC en saison basse (avril-octobre), si différentes",
+        placeholder="Ex: 02h00-06h00;11h00-15h00 (vide = identiques)",
+        full_width=True
+    )
+    hc_jours_non_ouvres = mo.ui.checkbox(
+        value=False,
+        label="Week-ends et jours fériés entièrement en Heures Creuses"
+    )
+    plages_hc_par_prm_input = mo.ui.text_area(
+        value="",
+        label="Plages HC spécifiques par PRM (une ligne par PRM)",
+        placeholder="Ex: 12345678901234: 01h00-07h00;12h30-14h30",
+        full_width=True
+    )
+    # Balayage : jeux de plages HC candidats comparés en un seul passage
+    plages_hc_candidates_input = mo.ui.text_area(
+        value="",
+        label="Plages HC candidates à comparer (un jeu par ligne, optionnel)",
+        placeholder="Ex:\n22h00-06h00\n23h00-07h00\n02h00-07h00;13h00-16h00",
+        full_width=True
+    )
+    mo.vstack([
+        plage_hc_input,
+        plage_hc_saison_basse_input,
+        hc_jours_non_ouvres,
+        plages_hc_par_prm_input,
+        plages_hc_candidates_input,
+    ])
+    return (
+        hc_jours_non_ouvres,
+        plage_hc_input,
+        plage_hc_saison_basse_input,
+        plages_hc_candidates_input,
+        plages_hc_par_prm_input,
+    )
 
 
 @app.cell(hide_code=True)
-def _(plage_hc_input):
-    # Parser les plages horaires une seule fois
-    def parser_plages_horaires(plage_str: str) -> list[tuple[time, time]]:
-        """
-        Parse une chaîne de plages horaires format Enedis.
-
-        Format : "08h00-12h00;14h00-18h00"
-
-        Returns:
-            Liste de tuples (heure_debut, heure_fin)
-        """
-        if not plage_str or plage_str.strip() == '':
-            return []
-
-        plage_str = plage_str.replace(' ', '').replace('(', '').replace(')', '')
-        plages = []
-
-        for slot in plage_str.split(';'):
-            if '-' not in slot:
-                continue
-            start_str, end_str = slot.split('-')
-            start_time = datetime.strptime(start_str, '%Hh%M').time()
-            end_time = datetime.strptime(end_str, '%Hh%M').time()
-            plages.append((start_time, end_time))
+def _(
+    hc_jours_non_ouvres,
+    plage_hc_input,
+    plage_hc_saison_basse_input,
+    plages_hc_candidates_input,
+    plages_hc_par_prm_input,
+):
+    plages_hc = parser_plages_horaires(plage_hc_input.value)
 
-        return plages
+    def construire_calendrier(plages_str: str) -> CalendrierCadrans:
+        plages_saison_basse = plage_hc_saison_basse_input.value
+        return CalendrierCadrans.depuis_plages(
+            parser_plages_horaires(plages_str),
+            plages_hc_saison_basse=parser_plages_horaires(plages_saison_basse) if plages_saison_basse.strip() else None,
+            hc_jours_non_ouvres=hc_jours_non_ouvres.value,
+        )
 
-    plages_hc = parser_plages_horaires(plage_hc_input.value)
-    return (plages_hc,)
+    # Plages par PRM : lignes "PRM: plages", les autres PRM suivent les plages générales
+    _calendriers_prm = {}
+    for _ligne in plages_hc_par_prm_input.value.splitlines():
+        if ':' not in _ligne:
+            continue
+        _prm, _plages_prm = _ligne.split(':', 1)
+        _calendriers_prm[_prm.strip()] = construire_calendrier(_plages_prm)
+
+    calendrier_cadrans = CalendrierCadrans.par_prm(construire_calendrier(plage_hc_input.value), _calendriers_prm)
+
+    # Candidats du balayage : mêmes options et plages par PRM, seules les plages générales changent
+    calendriers_candidats = {
+        _ligne.strip(): CalendrierCadrans.par_prm(construire_calendrier(_ligne), _calendriers_prm)
+        for _ligne in plages_hc_candidates_input.value.splitlines()
+        if _ligne.strip()
+    }
+    return calendrier_cadrans, calendriers_candidats, plages_hc
 
 
 @app.cell(hide_code=True)
@@ -149,6 +210,76 @@ def _():
     return (plage_puissance,)
 
 
+@app.cell(hide_code=True)
+def _():
+    mode_index_depassement = mo.ui.dropdown(
+        options={
+            'Exact (pmax triés)': 'exact',
+            'Histogramme par kVA entier (mémoire constante)': 'entier',
+        },
+        value='Exact (pmax triés)',
+        label="Index des dépassements"
+    )
+    mode_index_depassement
+    return (mode_index_depassement,)
+
+
+@app.cell(hide_code=True)
+def _():
+    methode_pmax = mo.ui.dropdown(
+        options={
+            'Pas natif de la courbe': 'brut',
+            'Max sur 5 min': 'max_5m',
+            'Moyenne sur 5 min': 'moyenne_5m',
+            'Max sur 10 min': 'max_10m',
+            'Moyenne sur 10 min': 'moyenne_10m',
+            'Max sur 1 h': 'max_1h',
+            'Moyenne sur 1 h': 'moyenne_1h',
+        },
+        value='Pas natif de la courbe',
+        label="Méthode de calcul des pmax / dépassements"
+    )
+    methode_pmax
+    return (methode_pmax,)
+
+
+@app.cell(hide_code=True)
+def _():
+    # Courbes à pas mixtes (ex: PT5M puis PT10M après un changement de compteur)
+    pas_commun = mo.ui.dropdown(
+        options={
+            'Pas natif de chaque mesure': 0,
+            '5 min': 5,
+            '10 min': 10,
+            '15 min': 15,
+            '30 min': 30,
+            '1 h': 60,
+        },
+        value='Pas natif de chaque mesure',
+        label="Grille commune de la courbe"
+    )
+    regle_reechantillonnage = mo.ui.dropdown(
+        options={
+            'Moyenne (énergie conservée)': 'moyenne',
+            'Pic (dépassements conservés)': 'pic',
+        },
+        value='Moyenne (énergie conservée)',
+        label="Rééchantillonnage"
+    )
+    mo.hstack([pas_commun, regle_reechantillonnage], justify='start')
+    return pas_commun, regle_reechantillonnage
+
+
+@app.cell(hide_code=True)
+def _():
+    afficher_balayage = mo.ui.checkbox(
+        value=True,
+        label="Afficher aussi le balayage heuristique BTSUP (réduction proportionnelle)"
+    )
+    afficher_balayage
+    return (afficher_balayage,)
+
+
 @app.cell(hide_code=True)
 def _():
     mo.md(
@@ -233,248 +364,122 @@ def _():
 
 
 @app.cell(hide_code=True)
-def _(
-    expr_cadran,
-    expr_pas_heures,
-    expr_pmax,
-    expr_volume,
-    file_upload,
-    plages_hc,
-):
+def _(file_upload, pas_commun, regle_reechantillonnage):
     mo.stop(not file_upload.value, mo.md("⚠️ Veuillez uploader un fichier CSV"))
 
-    # Lecture initiale pour calculer la période d'analyse (12 derniers mois)
-    _df_initial = pl.read_csv(io.BytesIO(file_upload.contents()), separator=';')
-
-    date_max_donnees = (
-        _df_initial
-        .filter(pl.col('Grandeur physique') == 'PA')
-        .select(pl.col('Horodate').str.strptime(pl.Datetime, '%Y-%m-%d %H:%M:%S').max())
-        .item()
+    # Étape 1 : courbe brute typée, indépendante des plages HC (ne se relance qu'au changement de fichier)
+    # Courbe PA typée : relue en memory-map depuis le cache si ce fichier a déjà été parsé
+    # Fichiers recouvrants (exports mensuels + annuel) : tri-fusion sans doublon (PRM, Horodate)
+    _fusion = fusionner_courbes(
+        [charger_courbe_avec_cache(_fichier.contents) for _fichier in file_upload.value],
+        [_fichier.name for _fichier in file_upload.value],
     )
-    date_fin_analyse = date_max_donnees
-    date_debut_analyse = date_fin_analyse - timedelta(days=365)
-
-    # Pipeline EAGER - lecture directe depuis mémoire avec filtre temporel
-    _cdc_temp = (
-        _df_initial
-        .filter(pl.col('Grandeur physique') == 'PA')
-        .with_columns([
-            pl.col('Horodate').str.strptime(pl.Datetime, '%Y-%m-%d %H:%M:%S'),
-        ])
-        # Filtrage sur 12 derniers mois disponibles
-        .filter(
-            (pl.col('Horodate') >= date_debut_analyse) &
-            (pl.col('Horodate') <= date_fin_analyse)
-        )
-        .with_columns([
-            (pl.col('Valeur') / 1000.0).alias('Valeur'),
-        ])
-        .with_columns([
-            expr_pas_heures().alias('pas_heures')
-        ])
-        .with_columns([
-            expr_volume().alias('volume'),
-            expr_pmax().alias('pmax'),
-            expr_cadran(plages_hc).alias('cadran')
-        ])
+    _courbe = _fusion.courbe
+    if pas_commun.value:
+        # Pas mixtes ramenés sur une grille commune, en un seul group_by streaming
+        _courbe = reechantillonner_courbe(_courbe, pas_commun.value, regle_reechantillonnage.value)
+    analyse_courbe = analyser_courbe(_courbe)
+    recouvrements = _fusion.recouvrements.collect()
+    date_debut_analyse = analyse_courbe.date_debut
+    date_fin_analyse = analyse_courbe.date_fin
+    dates_par_pdl = analyse_courbe.dates_par_pdl
+
+    # Mémo des agrégats par plages HC, propre à cette courbe
+    agregats_par_plages_hc = {}
+    return (
+        agregats_par_plages_hc,
+        analyse_courbe,
+        date_debut_analyse,
+        date_fin_analyse,
+        dates_par_pdl,
+        recouvrements,
     )
 
-    # Extraire le pas en heures (constante)
-    pas_heures = _cdc_temp.select('pas_heures').limit(1).item()
 
-    # Calculer dates et pmax_moyenne par PDL
-    dates_et_pmax_par_pdl = (
-        _cdc_temp
-        .group_by('Identifiant PRM')
-        .agg([
-            pl.col('Horodate').min().alias('date_debut'),
-            pl.col('Horodate').max().alias('date_fin'),
-            pl.col('pmax').max().alias('pmax_moyenne_kva'),
-        ])
-    )
-
-    # Agrégation des énergies et pmax par PDL et cadran
-    _energies_par_cadran = (
-        _cdc_temp
-        .group_by(['Identifiant PRM', 'cadran'])
-        .agg([
-            pl.col('volume').sum().alias('energie_kwh'),
-            pl.col('pmax').max().alias('pmax_cadran_kva'),
-        ])
-    )
+@app.cell(hide_code=True)
+def _(recouvrements):
+    mo.stop(recouvrements.is_empty())
 
-    # Pivots
-    _energies_pivot = _energies_par_cadran.pivot(
-        on='cadran',
-        index='Identifiant PRM',
-        values='energie_kwh',
-    )
+    mo.vstack([
+        mo.md(
+            f"**🔁 Fichiers recouvrants** — {recouvrements['mesures_en_double'].sum():,} mesures en double "
+            f"écartées, dont {recouvrements['conflits'].sum():,} de valeur différente de la mesure retenue"
+        ),
+        mo.ui.table(recouvrements, selection=None),
+    ])
+    return
 
-    _pmax_pivot = _energies_par_cadran.pivot(
-        on='cadran',
-        index='Identifiant PRM',
-        values='pmax_cadran_kva',
-    )
 
-    # Joindre tout
-    consos_agregees = (
-        _energies_pivot
-        .join(dates_et_pmax_par_pdl, on='Identifiant PRM', how='left')
-        .join(
-            _pmax_pivot.rename({
-                'HPH': 'pmax_hph_kva',
-                'HCH': 'pmax_hch_kva',
-                'HPB': 'pmax_hpb_kva',
-                'HCB': 'pmax_hcb_kva',
-            }),
-            on='Identifiant PRM',
-            how='left'
-        )
-        # Renommer pour format electricore
-        .rename({
-            'Identifiant PRM': 'pdl',
-            'HPH': 'energie_hph_kwh',
-            'HCH': 'energie_hch_kwh',
-            'HPB': 'energie_hpb_kwh',
-            'HCB': 'energie_hcb_kwh',
-        })
-        # Remplir les valeurs manquantes par 0 (si un cadran n'existe pas)
-        .with_columns([
-            # Calculer le nombre de jours de la période
-            (pl.col('date_fin') - pl.col('date_debut')).dt.total_days().alias('nb_jours'),
-            pl.col('energie_hph_kwh').fill_null(0).floor(),
-            pl.col('energie_hch_kwh').fill_null(0).floor(),
-            pl.col('energie_hpb_kwh').fill_null(0).floor(),
-            pl.col('energie_hcb_kwh').fill_null(0).floor(),
-        ])
+@app.cell(hide_code=True)
+def _(analyse_courbe):
+    # Diagnostic calculé pendant l'étape 1 (même scan que les dates de mesure par PRM, pas celui des cadrans)
+    _qualite = analyse_courbe.qualite
+    _niveau = (
+        'danger' if (_qualite['niveau'] == 'erreur').any()
+        else 'warn' if (_qualite['niveau'] == 'avertissement').any()
+        else 'success'
     )
+    _alertes = [
+        f"- PRM `{_prm}` : {' ; '.join(_messages)}"
+        for _prm, _messages in _qualite.select(['Identifiant PRM', 'alertes']).iter_rows()
+        if _messages
+    ]
 
-    # DataFrame ultra-optimisé : agrégation par combinaisons uniques de (PRM, cadran, pmax)
-    # Réduction ~99.7% en mémoire : de ~105k lignes à ~250 lignes par PDL
-    cdc = (
-        _cdc_temp
-        .group_by(['Identifiant PRM', 'cadran', 'pmax'])
-        .agg([
-            (pl.len() * pas_heures).alias('duree_h')
-        ])
-        # Trier par pmax décroissant pour calculer le cumul de dépassement
-        .sort(['Identifiant PRM', 'cadran', 'pmax'], descending=[False, False, True])
-        .with_columns([
-            # Cumul des heures = nombre d'heures où cette puissance est dépassée
-            pl.col('duree_h')
-              .cum_sum()
-              .over(['Identifiant PRM', 'cadran'])
-              .alias('duree_depassement_h')
-        ])
-    )
-    return cdc, consos_agregees, date_debut_analyse, date_fin_analyse
+    mo.vstack([
+        mo.callout(
+            mo.md(
+                f"**🩺 Qualité des données** — complétude minimale {_qualite['taux_completude_pct'].min():.1f} %\n\n"
+                + ("\n".join(_alertes) or "Aucune anomalie détectée")
+            ),
+            kind=_niveau,
+        ),
+        mo.accordion({
+            "Détail par PRM et trous de plus d'une heure": mo.vstack([
+                mo.ui.table(_qualite.with_columns(pl.col('alertes').list.join(' ; ')), selection=None),
+                mo.ui.table(analyse_courbe.trous, selection=None),
+            ])
+        }),
+    ])
+    return
 
 
 @app.cell(hide_code=True)
-def fonctions_enrichissement():
-    """Fonctions utilitaires pour enrichir la courbe de charge avec cadrans horaires."""
-
-    def expr_pas_heures() -> pl.Expr:
-        """
-        Expression Polars pour calculer le pas en heures à partir de la colonne 'Pas'.
-
-        Convertit 'PT5M' → 5/60 = 0.0833 heures
-
-        Returns:
-            Expression Polars du pas en heures
-        """
-        return (
-            pl.col('Pas')
-            .str.strip_prefix('PT')
-            .str.strip_suffix('M')
-            .cast(pl.Int32)
-            / 60.0
-        )
-
-    def expr_volume() -> pl.Expr:
-        """
-        Expression Polars pour calculer le volume en kWh.
-
-        volume = Valeur (kW) × pas_heures (h)
-
-        Returns:
-            Expression Polars du volume en kWh
-        """
-        return pl.col('Valeur') * pl.col('pas_heures')
-
-    def expr_pmax() -> pl.Expr:
-        """
-        Expression Polars pour estimer la Pmax en kVA.
-
-        volume = Valeur (kW) × coef
-
-        Returns:
-            Expression Polars du volume en kWh
-        """
-        return (pl.col('Valeur') * 1.10).round(3)
-
-    def expr_saison() -> pl.Expr:
-        """
-        Expression Polars pour déterminer la saison tarifaire.
+def _(agregats_par_plages_hc, analyse_courbe, calendrier_cadrans):
+    # Étape 2 : classification en cadrans et agrégats, mémorisés par plages HC
+    # Revenir à des plages déjà testées ne relit pas la courbe
+    _cle_plages = calendrier_cadrans.cle
+    if _cle_plages not in agregats_par_plages_hc:
+        agregats_par_plages_hc[_cle_plages] = classifier_courbe(analyse_courbe, calendrier_cadrans)
 
-        - H (Hiver) : novembre à mars (mois < 4 ou > 10)
-        - B (Été/Basse) : avril à octobre (mois 4-10)
+    energies_agregees = agregats_par_plages_hc[_cle_plages].energies_agregees
+    durees_par_methode = agregats_par_plages_hc[_cle_plages].durees_par_methode
+    return durees_par_methode, energies_agregees
 
-        Returns:
-            Expression Polars retournant 'H' ou 'B'
-        """
-        return pl.when(
-            (pl.col('Horodate').dt.month() < 4) | (pl.col('Horodate').dt.month() > 10)
-        ).then(pl.lit('H')).otherwise(pl.lit('B'))
 
-    def expr_horaire(plages: list[tuple[time, time]]) -> pl.Expr:
-        """
-        Expression Polars pour déterminer si en Heures Creuses (HC) ou Heures Pleines (HP).
-
-        Args:
-            plages: Liste de tuples (heure_debut, heure_fin) pour les HC
-
-        Returns:
-            Expression Polars retournant 'HC' ou 'HP'
-        """
-        if not plages:
-            # Pas de plages HC définies = tout en HP
-            return pl.lit('HP')
-
-        # Construire la condition : True si dans une des plages HC
-        condition = pl.lit(False)
-
-        for start_time, end_time in plages:
-            heure_courante = pl.col('Horodate').dt.time()
-
-            if start_time < end_time:
-                # Plage normale (ex: 02h00-07h00)
-                condition = condition | (
-                    (heure_courante >= start_time) & (heure_courante <= end_time)
-                )
-            else:
-                # Plage à cheval sur minuit (ex: 22h00-06h00)
-                condition = condition | (
-                    (heure_courante >= start_time) | (heure_courante <= end_time)
-                )
+@app.cell(hide_code=True)
+def _(durees_par_methode, energies_agregees, methode_pmax):
+    # Méthodologie de pmax choisie : simple sélection dans la pyramide, sans relire la courbe
+    _durees = durees_par_methode[methode_pmax.value]
 
-        return pl.when(condition).then(pl.lit('HC')).otherwise(pl.lit('HP'))
+    cdc, cdc_mensuelle, consos_agregees = agreger_depassements(_durees, energies_agregees)
+    return cdc, cdc_mensuelle, consos_agregees
 
-    def expr_cadran(plages: list[tuple[time, time]]) -> pl.Expr:
-        """
-        Expression Polars pour déterminer le cadran tarifaire complet.
 
-        Cadrans possibles : HPH, HCH, HPB, HCB
+@app.cell(hide_code=True)
+def _(cdc, cdc_mensuelle, mode_index_depassement):
+    # Index par (PRM, cadran) pour les lookups vectorisés de dépassement
+    # Mode 'entier' : taille fixe de 250 kVA (plafond C4, bornes du curseur et de la configuration actuelle)
+    index_depassement = construire_index_depassement(cdc, mode_index_depassement.value)
 
-        Args:
-            plages: Liste de tuples (heure_debut, heure_fin) pour les HC
+    # Cube (PRM, mois, cadran, kVA) : bilan mensuel de toute configuration par lookup
+    cube_depassement = CubeDepassementMensuel.depuis_cdc_mensuelle(cdc_mensuelle)
 
-        Returns:
-            Expression Polars retournant le cadran (ex: 'HPH', 'HCB')
-        """
-        return expr_horaire(plages) + expr_saison()
-    return expr_cadran, expr_pas_heures, expr_pmax, expr_volume
+    # Index par (PRM, mois, cadran) pour la facturation mensuelle des dépassements
+    if mode_index_depassement.value == 'entier':
+        index_depassement_mensuel = cube_depassement
+    else:
+        index_depassement_mensuel = construire_index_mensuel(cdc_mensuelle)
+    return cube_depassement, index_depassement, index_depassement_mensuel
 
 
 @app.cell(hide_code=True)
@@ -515,383 +520,36 @@ def _(consos_agregees):
     return
 
 
+@app.cell(hide_code=True)
+def _(consos_agregees):
+    # PDL affiché : configuration actuelle, recommandation, graphique et bilan mensuel
+    _pdls = [str(_pdl) for _pdl in consos_agregees['pdl'].sort()]
+    pdl_affiche = mo.ui.dropdown(options=_pdls, value=_pdls[0], label="PDL affiché")
+    pdl_affiche
+    return (pdl_affiche,)
+
+
 @app.cell
 def _():
     mo.md(r"""## 🎯 Génération des scénarios d'optimisation""")
     return
 
 
-@app.function(hide_code=True)
-def generer_scenarios_reduction_proportionnelle(
-    consos_agregees: pl.DataFrame,
-    cdc: pl.DataFrame,
-    seuil_depassement_h: float = 10.0,
-    config_actuelle: dict = None
-) -> pl.DataFrame:
-    """
-    Génère les scénarios multi-cadrans par réduction proportionnelle simultanée.
-
-    Principe :
-    - Part de la puissance donnant ~seuil_depassement_h heures de dépassement pour chaque cadran
-    - Applique la contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb
-    - Réduit toutes les puissances de 1 kVA simultanément jusqu'à ce que le min atteigne 36
-
-    Args:
-        consos_agregees: DataFrame avec les consommations agrégées
-        config_actuelle: Dict optionnel avec les clés:
-            - 'fta': formule tarifaire actuelle (ex: 'BTSUPCU')
-            - 'p_hph', 'p_hch', 'p_hpb', 'p_hcb': puissances actuelles par cadran
-
-    Hypothèse : Le profil de charge est similaire entre cadrans (seule l'amplitude diffère)
-    """
-    from math import ceil
-
-    scenarios_list = []
-
-    for row in consos_agregees.iter_rows(named=True):
-        # Étape 1 : Calculer les puissances de base depuis seuil de dépassement
-        # Au lieu de partir de pmax (qui peut avoir des pics isolés),
-        # partir de la puissance donnant ~seuil_depassement_h heures de dépassement
-        p_hph_base = trouver_puissance_pour_depassement(cdc, 'HPH', seuil_depassement_h)
-        p_hch_base = trouver_puissance_pour_depassement(cdc, 'HCH', seuil_depassement_h)
-        p_hpb_base = trouver_puissance_pour_depassement(cdc, 'HPB', seuil_depassement_h)
-        p_hcb_base = trouver_puissance_pour_depassement(cdc, 'HCB', seuil_depassement_h)
-
-        # Étape 2 : Forcer la contrainte d'ordre (cascade)
-        p_hph_initial = max(36, p_hph_base)
-        p_hch_initial = max(p_hph_initial, p_hch_base)
-        p_hpb_initial = max(p_hch_initial, p_hpb_base)
-        p_hcb_initial = max(p_hpb_initial, p_hcb_base)
-
-        # Étape 3 : Le minimum détermine le nombre d'itérations
-        p_min_initial = min(p_hph_initial, p_hch_initial, p_hpb_initial, p_hcb_initial)
-        nb_iterations = p_min_initial - 36 + 1  # Jusqu'à ce que le min atteigne 36
-
-        # Étape 4 : Générer toutes les configurations par réduction simultanée
-        for i in range(nb_iterations):
-            reduction = i
-            config = {
-                'pdl': row['pdl'],
-                'energie_hph_kwh': row['energie_hph_kwh'],
-                'energie_hch_kwh': row['energie_hch_kwh'],
-                'energie_hpb_kwh': row['energie_hpb_kwh'],
-                'energie_hcb_kwh': row['energie_hcb_kwh'],
-                'puissance_hph_kva': max(36, p_hph_initial - reduction),
-                'puissance_hch_kva': max(36, p_hch_initial - reduction),
-                'puissance_hpb_kva': max(36, p_hpb_initial - reduction),
-                'puissance_hcb_kva': max(36, p_hcb_initial - reduction),
-                'iteration': i,
-            }
-            scenarios_list.append(config)
-
-    # Créer DataFrame
-    df_scenarios = pl.DataFrame(scenarios_list)
-
-    # Ajouter dates, FTA, etc.
-    df_scenarios = (
-        df_scenarios
-        .with_columns([
-            pl.lit(datetime(2025, 8, 1)).dt.replace_time_zone('Europe/Paris').alias('date_debut'),
-            pl.lit(datetime(2026, 7, 31)).dt.replace_time_zone('Europe/Paris').alias('date_fin'),
-            pl.lit(365).alias('nb_jours'),
-            pl.lit(['BTSUPCU', 'BTSUPLU']).alias('formule_tarifaire_acheminement'),
-        ])
-        .explode('formule_tarifaire_acheminement')
-        .with_columns([
-            pl.col('puissance_hcb_kva').alias('puissance_souscrite_kva'),  # Max pour compatibilité
-        ])
-    )
-
-    # Marquer le scénario actuel si fourni
-    if config_actuelle is not None:
-        df_scenarios = df_scenarios.with_columns([
-            (
-                (pl.col('formule_tarifaire_acheminement') == config_actuelle['fta']) &
-                (pl.col('puissance_hph_kva') == config_actuelle['p_hph']) &
-                (pl.col('puissance_hch_kva') == config_actuelle['p_hch']) &
-                (pl.col('puissance_hpb_kva') == config_actuelle['p_hpb']) &
-                (pl.col('puissance_hcb_kva') == config_actuelle['p_hcb'])
-            ).alias('est_scenario_actuel')
-        ])
-    else:
-        df_scenarios = df_scenarios.with_columns([
-            pl.lit(False).alias('est_scenario_actuel')
-        ])
-
-    return df_scenarios
-
-
-@app.function(hide_code=True)
-def trouver_puissance_pour_depassement(
-    cdc: pl.DataFrame,
-    cadran: str,
-    seuil_depassement_h: float
-) -> int:
-    """
-    Trouve la puissance qui donne environ seuil_depassement_h heures de dépassement.
-
-    Args:
-        cdc: DataFrame avec colonnes 'cadran', 'pmax', 'duree_depassement_h'
-        cadran: 'HPH', 'HCH', 'HPB', ou 'HCB'
-        seuil_depassement_h: Heures de dépassement cibles (ex: 10h)
-
-    Returns:
-        Puissance en kVA (arrondie à l'entier supérieur)
-    """
-    from math import ceil
-
-    result = (
-        cdc
-        .filter(pl.col('cadran') == cadran)
-        .filter(pl.col('duree_depassement_h') >= seuil_depassement_h)
-        .sort('duree_depassement_h')
-        .select('pmax')
-        .limit(1)
-    )
-
-    if result.height > 0:
-        return int(ceil(result.item()))
-    else:
-        # Si aucune puissance ne donne ≥ seuil, prendre la max observée
-        p_max = cdc.filter(pl.col('cadran') == cadran).select(pl.col('pmax').max()).item()
-        return int(ceil(p_max))
-
-
-@app.function(hide_code=True)
-def generer_scenarios_reduction_depuis_seuil(
-    consos_agregees: pl.DataFrame,
-    cdc: pl.DataFrame,
-    seuil_depassement_h: float = 10.0,
-    config_actuelle: dict = None
-) -> pl.DataFrame:
-    """
-    Génère scénarios par réduction simultanée depuis un seuil de dépassement constant.
-
-    Principe :
-    1. Trouver puissance donnant ~seuil_depassement_h pour chaque cadran
-    2. Forcer contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb (cascade)
-    3. Réduire simultanément de 1 kVA jusqu'à 36 kVA
-
-    Args:
-        consos_agregees: DataFrame avec énergies par PDL
-        cdc: DataFrame avec colonnes 'cadran', 'pmax', 'duree_depassement_h'
-        seuil_depassement_h: Heures de dépassement initial (défaut: 10h)
-        config_actuelle: Config actuelle pour marquage (optionnel)
-
-    Returns:
-        DataFrame avec scénarios générés
-    """
-    scenarios_list = []
-
-    for row in consos_agregees.iter_rows(named=True):
-        pdl = row['pdl']
-
-        # Étape 1 : Trouver puissance avec seuil_depassement_h pour chaque cadran
-        p_hph_base = trouver_puissance_pour_depassement(cdc, 'HPH', seuil_depassement_h)
-        p_hch_base = trouver_puissance_pour_depassement(cdc, 'HCH', seuil_depassement_h)
-        p_hpb_base = trouver_puissance_pour_depassement(cdc, 'HPB', seuil_depassement_h)
-        p_hcb_base = trouver_puissance_pour_depassement(cdc, 'HCB', seuil_depassement_h)
-
-        # Étape 2 : Forcer contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb (cascade)
-        p_hph_initial = max(36, p_hph_base)
-        p_hch_initial = max(p_hph_initial, p_hch_base)
-        p_hpb_initial = max(p_hch_initial, p_hpb_base)
-        p_hcb_initial = max(p_hpb_initial, p_hcb_base)
-
-        print(f"PDL {pdl}: Initialisation depuis {seuil_depassement_h}h de dépassement")
-        print(f"  Puissances de base: HPH {p_hph_base}, HCH {p_hch_base}, "
-              f"HPB {p_hpb_base}, HCB {p_hcb_base}")
-        print(f"  Après contrainte: HPH {p_hph_initial}, HCH {p_hch_initial}, "
-              f"HPB {p_hpb_initial}, HCB {p_hcb_initial}")
-
-        # Étape 3 : Le minimum détermine le nombre d'itérations
-        p_min_initial = min(p_hph_initial, p_hch_initial, p_hpb_initial, p_hcb_initial)
-        nb_iterations = p_min_initial - 36 + 1
-
-        # Étape 4 : Réduction simultanée
-        for i in range(nb_iterations):
-            reduction = i
-            scenarios_list.append({
-                'pdl': pdl,
-                'energie_hph_kwh': row['energie_hph_kwh'],
-                'energie_hch_kwh': row['energie_hch_kwh'],
-                'energie_hpb_kwh': row['energie_hpb_kwh'],
-                'energie_hcb_kwh': row['energie_hcb_kwh'],
-                'puissance_hph_kva': max(36, p_hph_initial - reduction),
-                'puissance_hch_kva': max(36, p_hch_initial - reduction),
-                'puissance_hpb_kva': max(36, p_hpb_initial - reduction),
-                'puissance_hcb_kva': max(36, p_hcb_initial - reduction),
-            })
-
-        print(f"  → {len(scenarios_list)} scénarios générés")
-
-    # Créer DataFrame
-    df_scenarios = pl.DataFrame(scenarios_list)
-
-    # Ajouter dates, FTA, etc.
-    df_scenarios = (
-        df_scenarios
-        .with_columns([
-            pl.lit(datetime(2025, 8, 1)).dt.replace_time_zone('Europe/Paris').alias('date_debut'),
-            pl.lit(datetime(2026, 7, 31)).dt.replace_time_zone('Europe/Paris').alias('date_fin'),
-            pl.lit(365).alias('nb_jours'),
-            pl.lit(['BTSUPCU', 'BTSUPLU']).alias('formule_tarifaire_acheminement'),
-        ])
-        .explode('formule_tarifaire_acheminement')
-        .with_columns([
-            pl.col('puissance_hcb_kva').alias('puissance_souscrite_kva'),
-        ])
-    )
-
-    # Marquer scénario actuel
-    if config_actuelle is not None:
-        df_scenarios = df_scenarios.with_columns([
-            (
-                (pl.col('formule_tarifaire_acheminement') == config_actuelle['fta']) &
-                (pl.col('puissance_hph_kva') == config_actuelle['p_hph']) &
-                (pl.col('puissance_hch_kva') == config_actuelle['p_hch']) &
-                (pl.col('puissance_hpb_kva') == config_actuelle['p_hpb']) &
-                (pl.col('puissance_hcb_kva') == config_actuelle['p_hcb'])
-            ).alias('est_scenario_actuel')
-        ])
-    else:
-        df_scenarios = df_scenarios.with_columns([
-            pl.lit(False).alias('est_scenario_actuel')
-        ])
-
-    return df_scenarios
-
-
-@app.function(hide_code=True)
-def generer_scenarios_exhaustifs(
-    consos_agregees: pl.DataFrame,
-    cdc: pl.DataFrame,
-    config_actuelle: dict = None
-) -> pl.DataFrame:
-    """
-    Génère TOUS les scénarios valides avec contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb.
-
-    Utilise combinations_with_replacement pour générer efficacement les combinaisons
-    croissantes de puissances dans des plages réalistes par cadran.
-
-    Args:
-        consos_agregees: DataFrame avec énergies par PDL et cadran
-        cdc: DataFrame avec colonnes 'cadran', 'pmax', 'duree_depassement_h'
-        config_actuelle: Config actuelle pour marquage (optionnel)
-
-    Returns:
-        DataFrame avec tous les scénarios valides
-    """
-    from itertools import combinations_with_replacement
-
-    scenarios_list = []
-
-    for row in consos_agregees.iter_rows(named=True):
-        pdl = row['pdl']
-
-        # Calculer plages réalistes par cadran
-        p_hph_min, p_hph_max = calculer_plages_optimisation(cdc, 'HPH')
-        p_hch_min, p_hch_max = calculer_plages_optimisation(cdc, 'HCH')
-        p_hpb_min, p_hpb_max = calculer_plages_optimisation(cdc, 'HPB')
-        p_hcb_min, p_hcb_max = calculer_plages_optimisation(cdc, 'HCB')
-
-        # Pool global (union des plages)
-        p_min = min(p_hph_min, p_hch_min, p_hpb_min, p_hcb_min)
-        p_max = max(p_hph_max, p_hch_max, p_hpb_max, p_hcb_max)
-        puissances = range(p_min, p_max + 1)
-
-        # Générer combinaisons croissantes (garantit p_hph ≤ p_hch ≤ p_hpb ≤ p_hcb)
-        for p_hph, p_hch, p_hpb, p_hcb in combinations_with_replacement(puissances, 4):
-            # Filtres par plage individuelle de chaque cadran
-            if not (p_hph_min <= p_hph <= p_hph_max):
-                continue
-            if not (p_hch_min <= p_hch <= p_hch_max):
-                continue
-            if not (p_hpb_min <= p_hpb <= p_hpb_max):
-                continue
-            if not (p_hcb_min <= p_hcb <= p_hcb_max):
-                continue
-
-            scenarios_list.append({
-                'pdl': pdl,
-                'energie_hph_kwh': row['energie_hph_kwh'],
-                'energie_hch_kwh': row['energie_hch_kwh'],
-                'energie_hpb_kwh': row['energie_hpb_kwh'],
-                'energie_hcb_kwh': row['energie_hcb_kwh'],
-                'puissance_hph_kva': p_hph,
-                'puissance_hch_kva': p_hch,
-                'puissance_hpb_kva': p_hpb,
-                'puissance_hcb_kva': p_hcb,
-            })
-
-        print(f"PDL {pdl}: {len(scenarios_list)} scénarios générés")
-        print(f"  Plages: HPH [{p_hph_min}-{p_hph_max}], HCH [{p_hch_min}-{p_hch_max}], "
-              f"HPB [{p_hpb_min}-{p_hpb_max}], HCB [{p_hcb_min}-{p_hcb_max}]")
-
-    # Protection : Gérer le cas 0 scénarios générés (profil < 36 kVA partout)
-    if len(scenarios_list) == 0:
-        print("⚠️ Aucun scénario généré (profil probablement < 36 kVA)")
-        # Retourner DataFrame vide structuré avec toutes les colonnes nécessaires
-        return pl.DataFrame(schema={
-            'pdl': pl.String,
-            'energie_hph_kwh': pl.Float64,
-            'energie_hch_kwh': pl.Float64,
-            'energie_hpb_kwh': pl.Float64,
-            'energie_hcb_kwh': pl.Float64,
-            'puissance_hph_kva': pl.Int64,
-            'puissance_hch_kva': pl.Int64,
-            'puissance_hpb_kva': pl.Int64,
-            'puissance_hcb_kva': pl.Int64,
-            'date_debut': pl.Datetime,
-            'date_fin': pl.Datetime,
-            'nb_jours': pl.Int32,
-            'puissance_souscrite_kva': pl.Int64,
-            'formule_tarifaire_acheminement': pl.String,
-            'est_scenario_actuel': pl.Boolean,
-        })
-
-    # Créer DataFrame (on sait qu'il n'est pas vide)
-    df_scenarios = pl.DataFrame(scenarios_list)
-
-    # Ajouter dates, FTA, etc.
-    df_scenarios = (
-        df_scenarios
-        .with_columns([
-            pl.lit(datetime(2025, 8, 1)).dt.replace_time_zone('Europe/Paris').alias('date_debut'),
-            pl.lit(datetime(2026, 7, 31)).dt.replace_time_zone('Europe/Paris').alias('date_fin'),
-            pl.lit(365).alias('nb_jours'),
-            pl.lit(['BTSUPCU', 'BTSUPLU']).alias('formule_tarifaire_acheminement'),
-        ])
-        .explode('formule_tarifaire_acheminement')
-        .with_columns([
-            pl.col('puissance_hcb_kva').alias('puissance_souscrite_kva'),
-        ])
-    )
-
-    # Marquer scénario actuel si fourni
-    if config_actuelle is not None:
-        df_scenarios = df_scenarios.with_columns([
-            (
-                (pl.col('formule_tarifaire_acheminement') == config_actuelle['fta']) &
-                (pl.col('puissance_hph_kva') == config_actuelle['p_hph']) &
-                (pl.col('puissance_hch_kva') == config_actuelle['p_hch']) &
-                (pl.col('puissance_hpb_kva') == config_actuelle['p_hpb']) &
-                (pl.col('puissance_hcb_kva') == config_actuelle['p_hcb'])
-            ).alias('est_scenario_actuel')
-        ])
-    else:
-        df_scenarios = df_scenarios.with_columns([
-            pl.lit(False).alias('est_scenario_actuel')
-        ])
-
-    return df_scenarios
+@app.cell(hide_code=True)
+def _():
+    # Charger les règles TURPE une seule fois (optimiseur et calcul electricore)
+    print(f"🔍 Chargement des règles TURPE...")
+    regles_turpe = load_turpe_rules()
+    print(f"✅ Règles TURPE chargées")
+    return (regles_turpe,)
 
 
 @app.cell(hide_code=True)
 def _(
-    cdc,
     consos_agregees,
     fta_actuel,
+    index_depassement,
+    pdl_affiche,
     puissance_actuelle_hcb,
     puissance_actuelle_hch,
     puissance_actuelle_hpb,
@@ -900,11 +558,8 @@ def _(
 ):
     # Génération du scénario actuel pour comparaison
 
-    # Sélectionner les colonnes nécessaires pour le calcul de dépassement
-    #_cdc_actuel = cdc.select(['Valeur', 'pas_heures', 'cadran'])
-
-    # Récupérer les énergies depuis consos_agregees (1 ligne par PDL)
-    _row_actuel = consos_agregees[0]
+    # Récupérer les énergies du PDL affiché depuis consos_agregees (1 ligne par PDL)
+    _row_actuel = consos_agregees.filter(pl.col('pdl').cast(pl.String) == pdl_affiche.value)
 
     # Déterminer si mono ou multi-puissance
     _is_btinf_actuel = fta_actuel.value in ['BTINFCU4', 'BTINFMU4', 'BTINFLU']
@@ -948,14 +603,11 @@ def _(
         }
 
     # Calculer dépassement
-    _duree_depassement_actuel = calculer_duree_depassement_par_cadran(
-        cdc,
-        _scenario_actuel_dict['puissance_hph_kva'],
-        _scenario_actuel_dict['puissance_hch_kva'],
-        _scenario_actuel_dict['puissance_hpb_kva'],
-        _scenario_actuel_dict['puissance_hcb_kva']
+    _scenario_actuel_dict['duree_depassement_h'] = (
+        index_depassement
+        .duree_depassement_scenarios(pl.DataFrame([_scenario_actuel_dict]))
+        .item()
     )
-    _scenario_actuel_dict['duree_depassement_h'] = _duree_depassement_actuel
 
     # Créer DataFrame avec colonnes dans le même ordre que scenarios
     scenario_actuel = (
@@ -979,13 +631,7 @@ def _(
             # Marquer comme scénario actuel
             pl.lit(True).alias('est_scenario_actuel'),
         ])
-        .select([
-            'pdl', 'energie_hph_kwh', 'energie_hch_kwh', 'energie_hpb_kwh', 'energie_hcb_kwh',
-            'date_debut', 'date_fin', 'nb_jours',
-            'puissance_souscrite_kva', 'formule_tarifaire_acheminement', 'duree_depassement_h',
-            'puissance_hph_kva', 'puissance_hch_kva', 'puissance_hpb_kva', 'puissance_hcb_kva',
-            'est_scenario_actuel'
-        ])
+        .select(COLONNES_SCENARIOS)
     )
     return (scenario_actuel,)
 
@@ -997,98 +643,32 @@ def _():
 
 @app.cell(hide_code=True)
 def _(
+    afficher_balayage,
     cdc,
     consos_agregees,
     fta_actuel,
+    index_depassement,
     plage_puissance,
     puissance_actuelle_hcb,
     puissance_actuelle_hch,
     puissance_actuelle_hpb,
     puissance_actuelle_hph,
     puissance_actuelle_mono,
+    regles_turpe,
 ):
-    # Génération des scénarios multi-cadrans par réduction proportionnelle
+    # Génération des scénarios : optimum exact BTSUP + balayage heuristique optionnel
 
     _P_min, _P_max = plage_puissance.value
 
-    # Mode multi-cadrans: réduction proportionnelle simultanée
-
-    # Étape 1: Scénarios BTINF mono-puissance (< 36 kVA) si nécessaire
-    _scenarios_btinf = None
-    if _P_min < 36:
-        _puissances_btinf = list(range(_P_min, min(36, _P_max + 1)))
-
-        # Identifier le scénario actuel si c'est BTINF
-        _is_btinf_actuel = fta_actuel.value in ['BTINFCU4', 'BTINFMU4', 'BTINFLU']
-
-        _scenarios_btinf = (
-            consos_agregees
-            .select(['pdl', 'energie_hph_kwh', 'energie_hch_kwh',
-                     'energie_hpb_kwh', 'energie_hcb_kwh', 'pmax_moyenne_kva'])
-            .with_columns([
-                pl.lit(datetime(2025, 8, 1)).dt.replace_time_zone('Europe/Paris').alias('date_debut'),
-                pl.lit(datetime(2026, 7, 31)).dt.replace_time_zone('Europe/Paris').alias('date_fin'),
-                pl.lit(365).alias('nb_jours'),
-                pl.lit(_puissances_btinf).alias('puissance_souscrite_kva')
-            ])
-            .explode('puissance_souscrite_kva')
-            .with_columns([
-                pl.lit(['BTINFCU4', 'BTINFMU4', 'BTINFLU']).alias('formule_tarifaire_acheminement')
-            ])
-            .explode('formule_tarifaire_acheminement')
-        )
-
-        # Marquer le scénario actuel si applicable
-        if _is_btinf_actuel:
-            _puissance_actuel = float(puissance_actuelle_mono.value)
-            _fta_actuel = fta_actuel.value
-            _scenarios_btinf = _scenarios_btinf.with_columns([
-                (
-                    (pl.col('puissance_souscrite_kva') == _puissance_actuel) &
-                    (pl.col('formule_tarifaire_acheminement') == _fta_actuel)
-                ).alias('est_scenario_actuel')
-            ])
-        else:
-            _scenarios_btinf = _scenarios_btinf.with_columns([
-                pl.lit(False).alias('est_scenario_actuel')
-            ])
-
-        _scenarios_btinf = (
-            _scenarios_btinf
-            .filter(
-                # Garder soit les scénarios valides, soit le scénario actuel
-                (pl.col('puissance_souscrite_kva') >= pl.col('pmax_moyenne_kva')) |
-                pl.col('est_scenario_actuel')
-            )
-            .with_columns([
-                # Remplir les 4 colonnes avec la puissance mono pour BTINF
-                pl.col('puissance_souscrite_kva').alias('puissance_hph_kva'),
-                pl.col('puissance_souscrite_kva').alias('puissance_hch_kva'),
-                pl.col('puissance_souscrite_kva').alias('puissance_hpb_kva'),
-                pl.col('puissance_souscrite_kva').alias('puissance_hcb_kva'),
-            ])
-            .with_columns([
-                # Calculer durée dépassement avec les 4 puissances par cadran
-                pl.struct(['puissance_hph_kva', 'puissance_hch_kva', 'puissance_hpb_kva', 'puissance_hcb_kva'])
-                .map_elements(
-                    lambda row: calculer_duree_depassement_par_cadran(
-                        cdc,
-                        row['puissance_hph_kva'],
-                        row['puissance_hch_kva'],
-                        row['puissance_hpb_kva'],
-                        row['puissance_hcb_kva']
-                    ),
-                    return_dtype=pl.Float64
-                )
-                .alias('duree_depassement_h')
-            ])
-        )
-
-    # Étape 2: Scénarios BTSUP multi-cadrans (≥ 36 kVA) - Réduction proportionnelle
-    # Identifier le scénario actuel si c'est BTSUP
-    _is_btsup_actuel = fta_actuel.value in ['BTSUPCU', 'BTSUPLU']
+    # Identifier le scénario actuel (BTINF mono-puissance ou BTSUP multi-cadrans)
+    _config_actuelle_btinf = None
+    if fta_actuel.value in ['BTINFCU4', 'BTINFMU4', 'BTINFLU']:
+        _config_actuelle_btinf = {
+            'fta': fta_actuel.value,
+            'puissance': float(puissance_actuelle_mono.value),
+        }
     _config_actuelle_btsup = None
-    if _is_btsup_actuel:
+    if fta_actuel.value in ['BTSUPCU', 'BTSUPLU']:
         _config_actuelle_btsup = {
             'fta': fta_actuel.value,
             'p_hph': float(puissance_actuelle_hph.value),
@@ -1097,56 +677,23 @@ def _(
             'p_hcb': float(puissance_actuelle_hcb.value),
         }
 
-    # Générer scénarios depuis un seul seuil de dépassement
-    _scenarios_btsup = generer_scenarios_reduction_proportionnelle(
+    scenarios = generer_scenarios(
         consos_agregees,
         cdc,
-        seuil_depassement_h=10.0,
-        config_actuelle=_config_actuelle_btsup
+        index_depassement,
+        extraire_regles_turpe(regles_turpe, datetime(2025, 8, 1)),
+        p_min=_P_min,
+        p_max=_P_max,
+        config_actuelle_btinf=_config_actuelle_btinf,
+        config_actuelle_btsup=_config_actuelle_btsup,
+        balayage=afficher_balayage.value,
     )
 
-    # Calculer dépassements pour BTSUP
-    _scenarios_btsup = _scenarios_btsup.with_columns([
-        pl.struct(['puissance_hph_kva', 'puissance_hch_kva', 'puissance_hpb_kva', 'puissance_hcb_kva'])
-        .map_elements(
-            lambda row: calculer_duree_depassement_par_cadran(
-                cdc,
-                row['puissance_hph_kva'],
-                row['puissance_hch_kva'],
-                row['puissance_hpb_kva'],
-                row['puissance_hcb_kva']
-            ),
-            return_dtype=pl.Float64
-        )
-        .alias('duree_depassement_h')
-    ])
-
-    # Harmoniser l'ordre des colonnes avant concat
-    _colonnes_ordre = [
-        'pdl', 'energie_hph_kwh', 'energie_hch_kwh', 'energie_hpb_kwh', 'energie_hcb_kwh',
-        'date_debut', 'date_fin', 'nb_jours',
-        'puissance_souscrite_kva', 'formule_tarifaire_acheminement', 'duree_depassement_h',
-        'puissance_hph_kva', 'puissance_hch_kva', 'puissance_hpb_kva', 'puissance_hcb_kva',
-        'est_scenario_actuel'
-    ]
-
-    # Ajouter pmax_moyenne_kva si nécessaire pour BTINF
-    if 'pmax_moyenne_kva' in _scenarios_btsup.columns:
-        _scenarios_btsup = _scenarios_btsup.select(_colonnes_ordre + ['pmax_moyenne_kva'])
-    else:
-        _scenarios_btsup = _scenarios_btsup.select(_colonnes_ordre)
-
-    # Concaténer BTINF et BTSUP
-    if _scenarios_btinf is not None:
-        _colonnes_communes = [col for col in _colonnes_ordre if col in _scenarios_btinf.columns]
-        _scenarios_btinf = _scenarios_btinf.select(_colonnes_communes)
-        _scenarios_btsup = _scenarios_btsup.select(_colonnes_communes)
-        scenarios = pl.concat([_scenarios_btinf, _scenarios_btsup])
-    else:
-        scenarios = _scenarios_btsup
-
-    _nb_scenarios_btsup = len(_scenarios_btsup)
-    _info = f"Multi-cadrans réduction proportionnelle: {_nb_scenarios_btsup} scénarios BTSUP"
+    _nb_scenarios_btsup = scenarios.filter(
+        pl.col('formule_tarifaire_acheminement').str.starts_with('BTSUP')
+    ).height
+    _info = f"Multi-cadrans : {_nb_scenarios_btsup} scénarios BTSUP (optimums exacts par programmation dynamique"
+    _info += " + balayage heuristique)" if afficher_balayage.value else ")"
 
     _nb_scenarios = len(scenarios)
     _nb_pdl = scenarios['pdl'].n_unique()
@@ -1162,54 +709,6 @@ def _(
     return (scenarios,)
 
 
-@app.function(hide_code=True)
-# Fonction pour calculer la durée de dépassement par cadran
-def calculer_duree_depassement_par_cadran(
-    cdc: pl.DataFrame,
-    puissance_hph_kva: float,
-    puissance_hch_kva: float,
-    puissance_hpb_kva: float,
-    puissance_hcb_kva: float
-) -> float:
-    """
-    Calcule la durée totale de dépassement via lookup dans duree_depassement_h.
-
-    Principe : pour chaque cadran, trouve la ligne avec min(pmax > seuil)
-    et lit duree_depassement_h (qui contient le cumul pré-calculé des heures
-    où la puissance dépasse ce seuil).
-
-    Args:
-        cdc: DataFrame agrégé avec colonnes 'pmax', 'cadran', 'duree_depassement_h'
-        puissance_hph_kva, puissance_hch_kva, puissance_hpb_kva, puissance_hcb_kva:
-            Puissances souscrites par cadran (kVA)
-
-    Returns:
-        Durée totale de dépassement en heures (somme sur tous les cadrans)
-    """
-    seuils = {
-        'HPH': puissance_hph_kva,
-        'HCH': puissance_hch_kva,
-        'HPB': puissance_hpb_kva,
-        'HCB': puissance_hcb_kva,
-    }
-
-    total = 0.0
-    for cadran, seuil in seuils.items():
-        # Lookup optimisé : trouver min(pmax > seuil) pour ce cadran
-        # et lire duree_depassement_h (heures cumulées de dépassement)
-        result = (
-            cdc
-            .filter((pl.col('cadran') == cadran) & (pl.col('pmax') > seuil))
-            .sort('pmax')  # Tri croissant pour avoir min en premier
-            .select('duree_depassement_h')
-            .limit(1)  # Une seule valeur suffit
-        )
-        if result.height > 0:  # Si au moins une ligne trouvée
-            total += result.item()  # Ajouter au total
-
-    return total
-
-
 @app.cell
 def _(scenarios):
     scenarios
@@ -1223,89 +722,40 @@ def _():
 
 
 @app.cell(hide_code=True)
-def _(scenario_actuel, scenarios):
-    # Charger les règles TURPE une seule fois
-    print(f"🔍 Chargement des règles TURPE...")
-    _regles_turpe = load_turpe_rules()
-    print(f"✅ Règles TURPE chargées")
-
+def _(index_depassement_mensuel, regles_turpe, scenario_actuel, scenarios):
     # Concaténer scénario actuel avec les scénarios d'optimisation
     print(f"🔍 Concatenation: {len(scenario_actuel)} + {len(scenarios)} scénarios")
     _tous_scenarios = pl.concat([scenario_actuel, scenarios])
     print(f"✅ Total: {len(_tous_scenarios)} scénarios")
 
-    # Calcul TURPE via electricore sur tous les scénarios
+    # Préparation au format electricore (partagé par le noyau et la vérification)
     print(f"🔍 Préparation des données...")
-    _prepared = (
-        _tous_scenarios
-        .rename({
-            'date_debut': 'debut',
-            'date_fin': 'fin'
-        })
-        .with_columns([
-            # Ajouter timezone Europe/Paris pour compatibilité avec electricore
-            pl.col('debut').dt.replace_time_zone('Europe/Paris').alias('debut'),
-            pl.col('fin').dt.replace_time_zone('Europe/Paris').alias('fin'),
-        ])
-        .with_columns([
-            # Ajouter les colonnes agrégées pour formules C5 (HP/HC/Base)
-            (pl.col('energie_hph_kwh') + pl.col('energie_hpb_kwh')).alias('energie_hp_kwh'),
-            (pl.col('energie_hch_kwh') + pl.col('energie_hcb_kwh')).alias('energie_hc_kwh'),
-            (pl.col('energie_hph_kwh') + pl.col('energie_hch_kwh') +
-             pl.col('energie_hpb_kwh') + pl.col('energie_hcb_kwh')).alias('energie_base_kwh'),
-            # Pour C4 : les colonnes puissance_*_kva existent toujours maintenant
-            # On les renomme juste en puissance_souscrite_*_kva pour electricore
-            pl.col('puissance_hph_kva').alias('puissance_souscrite_hph_kva'),
-            pl.col('puissance_hch_kva').alias('puissance_souscrite_hch_kva'),
-            pl.col('puissance_hpb_kva').alias('puissance_souscrite_hpb_kva'),
-            pl.col('puissance_hcb_kva').alias('puissance_souscrite_hcb_kva'),
-        ])
-        .lazy()
-    )
+    _prepared = preparer_scenarios_turpe(_tous_scenarios)
     print(f"✅ Données préparées")
 
-    print(f"🔍 Calcul TURPE fixe...")
+    # Calcul TURPE par le noyau en forme fermée (coefficients par FTA × variables des scénarios)
+    print(f"🔍 Calcul TURPE (noyau NumPy)...")
+    noyau_turpe = NoyauTurpe.depuis_regles(regles_turpe, datetime(2025, 8, 1))
+    _with_turpe = calculer_couts(_prepared, noyau_turpe, index_depassement_mensuel)
+    print(f"✅ TURPE fixe, variable et dépassements mensuels calculés")
+
+    # Contrôle d'équivalence sur un échantillon recalculé par electricore
+    print(f"🔍 Vérification sur échantillon electricore...")
     if "pyodide" in sys.modules:
         print(f"   (Mode WASM - ceci peut échouer avec 'Cannot allocate memory')")
-    _with_fixe = _prepared.pipe(ajouter_turpe_fixe, regles=_regles_turpe)
-    print(f"✅ TURPE fixe calculé")
-
-    print(f"🔍 Calcul TURPE variable...")
-    _with_variable = _with_fixe.pipe(ajouter_turpe_variable, regles=_regles_turpe)
-    print(f"✅ TURPE variable calculé")
-
-    print(f"🔍 Calcul total et collect()...")
+    _nb_verifies, _ecart_max = verifier_noyau_turpe(_with_turpe, regles_turpe)
+    print(f"✅ {_nb_verifies} scénarios vérifiés (écart max {_ecart_max:.4f} €)")
 
-    import gc
-    gc.collect()
     _resultats_tous = (
-        _with_variable
-        .with_columns([
-            (pl.col('turpe_fixe_eur') + pl.col('turpe_variable_eur')).alias('turpe_total_eur')
-        ])
+        _with_turpe
         # Optimisation WASM : convertir en Categorical APRÈS les calculs (évite problème de merge)
         .with_columns([
             pl.col('pdl').cast(pl.String).cast(pl.Categorical),
             pl.col('formule_tarifaire_acheminement').cast(pl.Categorical)
         ])
         # Sélectionner uniquement les colonnes nécessaires pour réduire la mémoire
-        .select([
-            'pdl',
-            'formule_tarifaire_acheminement',
-            'puissance_souscrite_kva',
-            'puissance_hph_kva',
-            'puissance_hch_kva',
-            'puissance_hpb_kva',
-            'puissance_hcb_kva',
-            'turpe_fixe_eur',
-            'turpe_variable_eur',
-            'turpe_total_eur',
-            'est_scenario_actuel'
-        ])
-        .collect()
+        .select(COLONNES_RESULTATS)
     )
-    print(f"✅ Collect terminé")
-
     # Séparer scénario actuel vs résultats d'optimisation
     cout_actuel = _resultats_tous.filter(pl.col('est_scenario_actuel') == True)
     resultats = _resultats_tous.filter(pl.col('est_scenario_actuel') == False)
@@ -1319,11 +769,12 @@ def _(scenario_actuel, scenarios):
     ✅ **Calculs TURPE terminés**
 
     - Scénarios calculés : {_nb_resultats:,}
+    - Équivalence electricore vérifiée sur {_nb_verifies} scénarios (écart max {_ecart_max:.4f} €)
     - **Coût actuel** : **{_cout_actuel_val:,.2f} €/an**
     - Coût min (optimisé) : {_cout_min:.2f} €/an
     - Coût max : {_cout_max:.2f} €/an
     """)
-    return cout_actuel, resultats
+    return cout_actuel, noyau_turpe, resultats
 
 
 @app.cell
@@ -1339,10 +790,13 @@ def _():
 
 
 @app.cell(hide_code=True)
-def _(cout_actuel, resultats):
+def _(cout_actuel, pdl_affiche, resultats):
+    # Résultats du PDL affiché (la configuration actuelle est celle de ce PDL)
+    _resultats_pdl = resultats.filter(pl.col('pdl').cast(pl.String) == pdl_affiche.value)
+
     # Trouver l'optimum global (toutes FTA confondues)
-    idx_opt = resultats['turpe_total_eur'].arg_min()
-    optimum = resultats[idx_opt]
+    idx_opt = _resultats_pdl['turpe_total_eur'].arg_min()
+    optimum = _resultats_pdl[idx_opt]
 
     # Calculer économies
     economie_annuelle = cout_actuel['turpe_total_eur'][0] - optimum['turpe_total_eur'][0]
@@ -1377,7 +831,7 @@ def _(cout_actuel, resultats):
 
     # Optimums par FTA
     optimums_par_fta = (
-        resultats
+        _resultats_pdl
         .group_by(['pdl', 'formule_tarifaire_acheminement'])
         .agg([
             pl.col('turpe_total_eur').min().alias('cout_min_eur'),
@@ -1399,6 +853,7 @@ def _(cout_actuel, resultats):
     | **Puissance(s)** | {puissances_actuel} | {puissances_opt} | - |
     | **Part fixe** | {cout_actuel['turpe_fixe_eur'][0]:,.2f} € | {optimum['turpe_fixe_eur'][0]:,.2f} € | {cout_actuel['turpe_fixe_eur'][0] - optimum['turpe_fixe_eur'][0]:,.2f} € |
     | **Part variable** | {cout_actuel['turpe_variable_eur'][0]:,.2f} € | {optimum['turpe_variable_eur'][0]:,.2f} € | {cout_actuel['turpe_variable_eur'][0] - optimum['turpe_variable_eur'][0]:,.2f} € |
+    | **Dépassements (CMDPS)** | {cout_actuel['turpe_depassement_eur'][0]:,.2f} € | {optimum['turpe_depassement_eur'][0]:,.2f} € | {cout_actuel['turpe_depassement_eur'][0] - optimum['turpe_depassement_eur'][0]:,.2f} € |
     | **📈 COÛT TOTAL** | **{cout_actuel['turpe_total_eur'][0]:,.2f} €/an** | **{optimum['turpe_total_eur'][0]:,.2f} €/an** | **🎉 {economie_annuelle:,.2f} € ({economie_pct:.1f}%)** |
 
     ---
@@ -1418,13 +873,13 @@ def _(cout_actuel, resultats):
 
 
 @app.cell(hide_code=True)
-def _(cout_actuel, resultats):
+def _(cout_actuel, pdl_affiche, resultats):
     # Graphique interactif avec marqueurs pour actuel et optimal
-    # Filtrer sur le premier PDL pour la visualisation
-    pdl_unique = resultats['pdl'][0]
+    # Filtrer sur le PDL affiché pour la visualisation
+    pdl_unique = pdl_affiche.value
     df_plot = (
         resultats
-        .filter(pl.col('pdl') == pdl_unique)
+        .filter(pl.col('pdl').cast(pl.String) == pdl_unique)
         # Trier par FTA puis par puissance pour que les lignes se tracent correctement
         .sort(['formule_tarifaire_acheminement', 'puissance_souscrite_kva'])
     )
@@ -1443,6 +898,7 @@ def _(cout_actuel, resultats):
         pl.col('turpe_total_eur').cast(pl.Float64),
         pl.col('turpe_fixe_eur').cast(pl.Float64),
         pl.col('turpe_variable_eur').cast(pl.Float64),
+        pl.col('turpe_depassement_eur').cast(pl.Float64),
     ])
 
     # Convertir en pandas pour Altair (plus de compatibilité qu'avec to_dicts)
@@ -1478,6 +934,7 @@ def _(cout_actuel, resultats):
             alt.Tooltip('formule_tarifaire_acheminement:N', title='FTA'),
             alt.Tooltip('turpe_fixe_eur:Q', title='Part fixe (€)', format='.2f'),
             alt.Tooltip('turpe_variable_eur:Q', title='Part variable (€)', format='.2f'),
+            alt.Tooltip('turpe_depassement_eur:Q', title='Dépassements (€)', format='.2f'),
             alt.Tooltip('turpe_total_eur:Q', title='Total (€)', format='.2f'),
         ]
     ).properties(
@@ -1540,6 +997,176 @@ def _(cout_actuel, resultats):
     return
 
 
+@app.cell
+def _():
+    mo.md(r"""## 📅 Bilan mensuel des dépassements""")
+    return
+
+
+@app.cell(hide_code=True)
+def _(cout_actuel, cube_depassement, noyau_turpe, pdl_affiche, resultats):
+    # Bilan mensuel de chaque scénario du PDL affiché, lu dans le cube (aucun rescan de la courbe)
+    _scenarios_bilan = (
+        pl.concat([
+            cout_actuel.with_columns(pl.lit('Actuel').alias('configuration')),
+            resultats
+            .filter(pl.col('pdl').cast(pl.String) == pdl_affiche.value)
+            .with_columns(pl.lit('Candidat').alias('configuration')),
+        ], how='vertical_relaxed')
+        .with_columns(pl.col('pdl').cast(pl.String))
+        .with_row_index('scenario')
+    )
+    _bilan = cube_depassement.bilan_mensuel(
+        _scenarios_bilan,
+        noyau_turpe.cout_depassement_mensuel(_scenarios_bilan, cube_depassement),
+    )
+
+    # Tableau de la configuration actuelle (scénario 0)
+    _bilan_actuel = (
+        _bilan
+        .filter(pl.col('scenario') == 0)
+        .group_by('mois')
+        .agg([
+            pl.col('heures_depassement').sum().round(2).alias('Heures de dépassement'),
+            pl.col('cout_depassement_eur').sum().round(2).alias('Coût des dépassements (€)'),
+        ])
+        .sort('mois')
+        .rename({'mois': 'Mois'})
+    )
+
+    # Données du graphique : une barre par (scénario, mois, cadran)
+    _donnees_bilan = (
+        _bilan
+        .join(
+            _scenarios_bilan.select([
+                'scenario', 'configuration', 'formule_tarifaire_acheminement',
+                'puissance_souscrite_kva', 'turpe_total_eur',
+            ]).with_columns(pl.col('formule_tarifaire_acheminement').cast(pl.String)),
+            on='scenario',
+        )
+        .with_columns(pl.col('mois').dt.strftime('%Y-%m'))
+        .to_pandas()
+    )
+
+    # Survol d'un scénario → son bilan mensuel (actuel affiché par défaut)
+    _survol = alt.selection_point(
+        fields=['scenario'], on='pointerover', nearest=True, value=[{'scenario': 0}]
+    )
+    _scenarios_chart = alt.Chart(_donnees_bilan).mark_point(filled=True, size=80).encode(
+        x=alt.X('puissance_souscrite_kva:Q', title='Puissance souscrite max (kVA)'),
+        y=alt.Y('turpe_total_eur:Q', title='Coût annuel TURPE (€/an)', scale=alt.Scale(zero=False)),
+        color=alt.Color('formule_tarifaire_acheminement:N', title='Formule tarifaire'),
+        shape=alt.Shape('configuration:N', title='Configuration'),
+        opacity=alt.condition(_survol, alt.value(1.0), alt.value(0.3)),
+        tooltip=[
+            alt.Tooltip('formule_tarifaire_acheminement:N', title='FTA'),
+            alt.Tooltip('puissance_souscrite_kva:Q', title='P max (kVA)'),
+            alt.Tooltip('turpe_total_eur:Q', title='Total (€)', format='.2f'),
+        ],
+    ).add_params(_survol).properties(width=400, height=350, title='Scénarios (survoler)')
+
+    _mensuel_chart = alt.Chart(_donnees_bilan).mark_bar().encode(
+        x=alt.X('mois:O', title='Mois'),
+        y=alt.Y('sum(heures_depassement):Q', title='Heures de dépassement'),
+        color=alt.Color('cadran:N', title='Cadran', sort=list(CubeDepassementMensuel.CADRANS)),
+        tooltip=[
+            alt.Tooltip('mois:O', title='Mois'),
+            alt.Tooltip('cadran:N', title='Cadran'),
+            alt.Tooltip('sum(heures_depassement):Q', title='Heures', format='.2f'),
+            alt.Tooltip('sum(cout_depassement_eur):Q', title='Coût (€)', format='.2f'),
+        ],
+    ).transform_filter(_survol).properties(width=450, height=350, title='Bilan mensuel du scénario survolé')
+
+    mo.vstack([
+        mo.md(f"**Configuration actuelle** — PDL `{cout_actuel['pdl'][0]}`"),
+        mo.ui.table(_bilan_actuel, selection=None),
+        mo.ui.altair_chart(alt.hconcat(_scenarios_chart, _mensuel_chart)),
+    ])
+    return
+
+
+@app.cell
+def _():
+    mo.md(r"""## 🔀 Comparaison des plages HC candidates""")
+    return
+
+
+@app.cell(hide_code=True)
+def _(
+    analyse_courbe,
+    calendriers_candidats,
+    methode_pmax,
+    noyau_turpe,
+    plage_puissance,
+    regles_turpe,
+):
+    mo.stop(
+        not calendriers_candidats,
+        mo.md("ℹ️ Saisissez des plages HC candidates (un jeu par ligne) pour les comparer.")
+    )
+
+    _P_min, _P_max = plage_puissance.value
+
+    # Source des pmax selon la méthodologie choisie : pas natif ou niveau de la pyramide
+    _source_pmax, _colonne_pmax = selectionner_source_pmax(analyse_courbe, methode_pmax.value)
+
+    # Un seul passage pour les K candidats (masque de K bits par ligne)
+    print(f"🔍 Balayage de {len(calendriers_candidats)} jeux de plages HC...")
+    _agregats = agreger_balayage_plages_hc(
+        analyse_courbe.courbe, _source_pmax, _colonne_pmax, calendriers_candidats, analyse_courbe.dates_par_pdl
+    )
+
+    # Optimisation par candidat sur ses agrégats réduits
+    _regles = extraire_regles_turpe(regles_turpe, datetime(2025, 8, 1))
+    _resultats_candidats = []
+    for _libelle, (_energies, _durees) in _agregats.items():
+        _cdc, _cdc_mensuelle, _consos = agreger_depassements(_durees, _energies)
+        _index = construire_index_depassement(_cdc)
+        _scenarios = generer_scenarios_optimaux_btsup(_consos, _index, _regles, p_min=_P_min, p_max=_P_max)
+        if _P_min < 36:
+            _scenarios = pl.concat([
+                _scenarios,
+                generer_scenarios_btinf(_consos, list(range(_P_min, min(36, _P_max + 1)))),
+            ], how='diagonal_relaxed')
+        _resultats_candidats.append(
+            calculer_couts(_scenarios, noyau_turpe, construire_index_mensuel(_cdc_mensuelle))
+            .with_columns(pl.lit(_libelle).alias('plages_hc'))
+        )
+    print(f"✅ Balayage terminé")
+
+    # Classement conjoint plages HC × FTA × puissances, par PDL
+    classement_plages_hc = (
+        pl.concat(_resultats_candidats, how='diagonal_relaxed')
+        .with_columns(pl.col('pdl').cast(pl.String))
+        .sort(['pdl', 'turpe_total_eur'])
+        .with_columns(pl.int_range(1, pl.len() + 1).over('pdl').alias('rang'))
+        .select([
+            'pdl', 'rang', 'plages_hc', 'formule_tarifaire_acheminement',
+            'puissance_souscrite_kva',
+            'puissance_hph_kva', 'puissance_hch_kva', 'puissance_hpb_kva', 'puissance_hcb_kva',
+            'turpe_fixe_eur', 'turpe_variable_eur', 'turpe_depassement_eur', 'turpe_total_eur',
+        ])
+    )
+
+    # Meilleure configuration par (PDL, plages HC, FTA)
+    _meilleurs = (
+        classement_plages_hc
+        .group_by(['pdl', 'plages_hc', 'formule_tarifaire_acheminement'])
+        .agg(pl.all().sort_by('turpe_total_eur').first())
+        .sort(['pdl', 'turpe_total_eur'])
+    )
+    _meilleur = classement_plages_hc.row(0, named=True)
+
+    mo.vstack([
+        mo.md(f"""
+    🏆 **Meilleure combinaison** (PDL `{_meilleur['pdl']}`) : plages **{_meilleur['plages_hc']}**,
+    **{_meilleur['formule_tarifaire_acheminement']}** → **{_meilleur['turpe_total_eur']:,.2f} €/an**
+    """),
+        mo.ui.table(_meilleurs, selection=None),
+    ])
+    return (classement_plages_hc,)
+
+
 @app.cell
 def _():
     mo.md(r"""## 📈 Analyse du profil de charge""")
@@ -1562,11 +1189,12 @@ def _():
 
 
 @app.cell(hide_code=True)
-def _(cdc, duree_max_monotone):
+def _(cdc, duree_max_monotone, pdl_affiche):
     # Courbe de monotone (load duration curve) par cadran
     # Filtre sur zone d'optimisation pertinente (0-Xh de dépassement)
     df_monotone_final = (
         cdc
+        .filter(pl.col('Identifiant PRM').cast(pl.String) == pdl_affiche.value)
         .filter(pl.col('duree_depassement_h') <= duree_max_monotone.value)
         .select(['cadran', 'pmax', 'duree_depassement_h'])
         .rename({'duree_depassement_h': 'duree_cumulee_h'})
@@ -1628,13 +1256,14 @@ def _(cdc, duree_max_monotone):
 
 
 @app.cell(hide_code=True)
-def _(cdc, duree_max_monotone):
+def _(cdc, duree_max_monotone, pdl_affiche):
     # Histogramme durée cumulée par tranche de puissance et cadran
     # Filtre sur même plage que courbe de monotone pour cohérence
 
     # Agréger durée par puissance arrondie et cadran
     df_histo = (
         cdc
+        .filter(pl.col('Identifiant PRM').cast(pl.String) == pdl_affiche.value)
         .filter(pl.col('duree_depassement_h') <= duree_max_monotone.value)
         .with_columns([
             # Arrondir pmax à l'entier le plus proche pour réduire la granularité
@@ -1693,9 +1322,10 @@ def _():
 
 
 @app.cell(hide_code=True)
-def _(cdc):
-    _min = int(cdc['pmax'].min())
-    _max = int(cdc['pmax'].max())
+def _(cdc, pdl_affiche):
+    _pmax = cdc.filter(pl.col('Identifiant PRM').cast(pl.String) == pdl_affiche.value)['pmax']
+    _min = int(_pmax.min())
+    _max = int(_pmax.max())
     _moy = (_min + _max)//2
     # Slider pour choisir un seuil de puissance
     seuil_puissance = mo.ui.slider(
@@ -1711,7 +1341,7 @@ def _(cdc):
 
 
 @app.cell(hide_code=True)
-def _(cdc, seuil_puissance):
+def _(cdc, pdl_affiche, seuil_puissance):
     # Calculer les heures de dépassement pour le seuil choisi par cadran
     _seuil = seuil_puissance.value
 
@@ -1719,6 +1349,7 @@ def _(cdc, seuil_puissance):
     # On prend la valeur de duree_depassement_h pour la puissance la plus proche du seuil
     depassements_par_cadran = (
         cdc
+        .filter(pl.col('Identifiant PRM').cast(pl.String) == pdl_affiche.value)
         .filter(pl.col('pmax') >= _seuil)
         .group_by('cadran')
         .agg([
@@ -14,7 +14,10 @@ async with app.setup(hide_code=True):
     import marimo as mo
     import polars as pl
     from pathlib import Path
-    import subprocess
+
+    # Extraction partagée M-2/M-6 des archives chiffrées, incrémentale (manifeste)
+    from opti_c4.archives import COLONNES_PROVENANCE, extraire_dossier, scanner_extraction
+    from opti_c4.exports import consolider_plus_recent, exporter_partitions
 
 
 @app.cell(hide_code=True)
@@ -26,10 +29,16 @@ def _():
     Cet outil permet de :
     - Sélectionner un dossier contenant des fichiers ZIP protégés
     - Choisir le type de fichier à extraire (M-2 ou M-6)
-    - Extraire automatiquement tous les ZIP avec **7z** (via `extract_all.sh`)
     - Déverrouiller les ZIP avec le mot de passe depuis `mdp.txt`
-    - Ignorer les fichiers déjà extraits
-    - Lire et concaténer tous les fichiers CSV extraits avec Polars
+    - Extraire une seule fois les CSV des ZIP, pour M-2 et M-6, en Parquet (`.extraction/`),
+      en parallèle (un processus par cœur) ; **7z** n'est utilisé que s'il est installé ou si le
+      chiffrement (AES) n'est pas géré par Python
+    - Relancer sans ré-extraire : un manifeste (empreinte, membres, tailles, date d'extraction)
+      ne fait ré-extraire que les archives modifiées ou dont l'extraction est incomplète
+    - Lire tous les CSV d'un flux en un scan lazy, restreint aux PRM de la base client
+      (les fichiers Enedis couvrent tout le périmètre du GRD)
+    - Exporter un fichier M-2 par mois, en CSV et/ou en Parquet (zstd), en une seule passe
+    - Consolider M-6 : la ligne la plus récente par PRM, mise à jour avec les seuls nouveaux fichiers
     """
     )
     return
@@ -52,6 +61,17 @@ def _():
     return (type_fichier,)
 
 
+@app.cell(hide_code=True)
+def _():
+    formats_export = mo.ui.multiselect(
+        options=["csv", "parquet"],
+        value=["csv"],
+        label="Formats des exports M-2 mensuels (parquet : compressé zstd)"
+    )
+    formats_export
+    return (formats_export,)
+
+
 @app.cell(hide_code=True)
 def _():
     mo.md("""### 📂 Sélection du dossier""")
@@ -104,103 +124,105 @@ def _(folder_path):
 
 @app.cell
 def _():
-    mo.md(r"""## 🔓 Extraction et lecture des CSV M-2""")
+    mo.md(r"""## 🔓 Extraction des ZIP (M-2 et M-6)""")
     return
 
 
-@app.function(hide_code=True)
-def extract_all_with_7z(folder_path: Path, password: str) -> tuple[str, str]:
-    """
-    Extrait tous les ZIP d'un dossier en utilisant le script bash extract_all.sh avec 7z.
+@app.cell(hide_code=True)
+def _(folder_path, password, type_fichier):
+    mo.stop(not type_fichier.value, "")
 
-    Args:
-        folder_path: Chemin vers le dossier contenant les ZIP
-        password: Mot de passe pour déverrouiller les ZIP
+    # Une seule extraction pour les deux flux : les relances ne ré-extraient que les
+    # archives modifiées, ou dont l'extraction est incomplète (cf. manifeste)
+    extraction = extraire_dossier(folder_path, password, types=type_fichier.value)
 
-    Returns:
-        Tuple (stdout, stderr)
-    """
-    # Cherche le script extract_all.sh
-    script_path = Path(__file__).parent / "extract_all.sh"
-
-    if not script_path.exists():
-        raise FileNotFoundError(f"Script extract_all.sh introuvable : {script_path}")
-
-    # Exécute le script dans le dossier cible
-    result = subprocess.run(
-        ['bash', str(script_path), password],
-        cwd=str(folder_path),
-        capture_output=True,
-        text=True,
-        timeout=300  # 5 minutes max
+    _archives = extraction.unique("archive")
+    _reextraites = _archives.filter(~pl.col("depuis_manifeste") & pl.col("erreur").is_null())
+    _erreurs = "\n".join(
+        f"- ⚠️ `{_a}` : {_e}" for _a, _e in _archives.filter(pl.col("erreur").is_not_null()).select("archive", "erreur").iter_rows()
     )
 
-    return result.stdout, result.stderr
+    mo.md(f"""
+    ## 📊 Résultat de l'extraction des ZIP
+
+    - **{len(_archives)}** archives : **{len(_reextraites)}** extraites (dont **{(_reextraites["methode"] == "7z").sum()}** via 7z),
+      **{_archives["depuis_manifeste"].sum()}** inchangées depuis la dernière extraction
+    - **{extraction["membre"].count()} fichiers CSV** disponibles
+
+    {_erreurs}
+    """)
+    return (extraction,)
+
+
+@app.cell
+def _():
+    mo.md(r"""## 📋 Lecture de la base client""")
+    return
 
 
 @app.cell(hide_code=True)
-def _(folder_path, password, type_fichier):
-    mo.stop("M-2" not in type_fichier.value, "")
+def _(folder_path):
+    # Lecture du fichier base_client.xlsx
+    base_client_file = folder_path / "base_client.xlsx"
 
-    # Extraction avec 7z via le script bash
-    try:
-        stdout, stderr = extract_all_with_7z(folder_path, password)
+    mo.stop(not base_client_file.exists(), mo.md(f"❌ Fichier `base_client.xlsx` non trouvé dans `{folder_path}`"))
 
-        # Affichage du résultat de l'extraction
-        _extraction_log = stdout.replace('\n', '\n\n')
+    base_client = pl.read_excel(base_client_file)
 
-        mo.md(f"""
-    ## 📊 Résultat de l'extraction (7z)
+    _nb_clients = len(base_client)
+    _colonnes = ", ".join([f"`{col}`" for col in base_client.columns])
+
+    mo.md(f"""
+    ✅ **Base client chargée** : {_nb_clients} clients
+
+    Colonnes : {_colonnes}
+    """)
+    return (base_client,)
+
+
+@app.cell
+def _():
+    mo.md(r"""## 📥 Chargement des CSV M-2""")
+    return
 
-    {_extraction_log}
 
-    ---
-        """)
-    except subprocess.TimeoutExpired:
-        mo.md("❌ **Timeout** : L'extraction a pris trop de temps (>5 minutes)")
-    except FileNotFoundError as e:
-        mo.md(f"❌ **Erreur** : {str(e)}")
-    except Exception as e:
-        mo.md(f"❌ **Erreur inattendue** : {str(e)}")
+@app.cell(hide_code=True)
+def _(base_client, extraction, type_fichier):
+    mo.stop("M-2" not in type_fichier.value, "")
 
-    # Lecture des CSV M-2 extraits
-    csv_files = sorted([f for f in folder_path.glob("ENEDIS_*.csv") if "M-2" in f.name])
+    membres_m2 = extraction.filter((pl.col("type") == "M-2") & pl.col("membre").is_not_null())
+    mo.stop(membres_m2.is_empty(), mo.md("❌ Aucun fichier M-2 extrait"))
 
-    all_dataframes = []
-    for csv_file in csv_files:
-        try:
-            df = pl.read_csv(csv_file, separator=';')
-            all_dataframes.append(df)
-        except Exception as e:
-            mo.md(f"⚠️ Impossible de lire `{csv_file.name}` : {str(e)}")
+    # Scan lazy de tous les CSV M-2 : seules les lignes des PRM de la base client sont lues
+    scan_m2 = scanner_extraction(extraction, "M-2", base_client)
 
-    mo.md(f"✅ **{len(all_dataframes)} fichiers CSV M-2 chargés**")
-    return (all_dataframes,)
+    mo.md(f"✅ **{len(membres_m2)} fichiers CSV M-2** à lire ({membres_m2['lignes'].sum():,} lignes, tous PRM confondus)")
+    return membres_m2, scan_m2
 
 
 @app.cell(hide_code=True)
-def _(all_dataframes, type_fichier):
+def _(membres_m2, scan_m2, type_fichier):
     mo.stop("M-2" not in type_fichier.value, "")
-    mo.stop(len(all_dataframes) == 0, mo.md("❌ Aucun DataFrame M-2 chargé"))
 
-    # Concaténation de tous les DataFrames
+    # Lecture en streaming, filtrée sur les clients au fil des fichiers
     df_concat = (
-        pl.concat(all_dataframes)
+        scan_m2
         .with_columns([
             pl.col('DATE_BASCULE').str.to_date()
         ])
+        .collect(engine="streaming")
     )
 
     _nb_lignes = len(df_concat)
     _nb_colonnes = len(df_concat.columns)
-    _nb_fichiers = len(all_dataframes)
+    _nb_fichiers = len(membres_m2)
 
     mo.md(f"""
     ## ✅ Concaténation terminée
 
-    - **{_nb_fichiers}** fichiers CSV chargés
-    - **{_nb_lignes:,}** lignes au total
-    - **{_nb_colonnes}** colonnes
+    - **{_nb_fichiers}** fichiers CSV lus
+    - **{_nb_lignes:,}** lignes des clients au total (sur {membres_m2['lignes'].sum():,})
+    - **{_nb_colonnes}** colonnes (dont la provenance : `_source_file`, `_source_timestamp`)
     """)
     return (df_concat,)
 
@@ -211,32 +233,6 @@ def _(df_concat):
     return
 
 
-@app.cell
-def _():
-    mo.md(r"""## 📋 Lecture de la base client""")
-    return
-
-
-@app.cell(hide_code=True)
-def _(folder_path):
-    # Lecture du fichier base_client.xlsx
-    base_client_file = folder_path / "base_client.xlsx"
-
-    mo.stop(not base_client_file.exists(), mo.md(f"❌ Fichier `base_client.xlsx` non trouvé dans `{folder_path}`"))
-
-    base_client = pl.read_excel(base_client_file)
-
-    _nb_clients = len(base_client)
-    _colonnes = ", ".join([f"`{col}`" for col in base_client.columns])
-
-    mo.md(f"""
-    ✅ **Base client chargée** : {_nb_clients} clients
-
-    Colonnes : {_colonnes}
-    """)
-    return (base_client,)
-
-
 @app.cell
 def _():
     mo.md(r"""## 🔗 Jointure avec les données de consommation""")
@@ -245,13 +241,9 @@ def _():
 
 @app.cell(hide_code=True)
 def _(base_client, df_concat):
-    # Left join : garder uniquement les lignes de df_concat correspondant aux clients actuels
-    # Harmonisation du type de la colonne PRM (conversion en string)
-    df_concat_typed = df_concat.with_columns([
-        pl.col("PRM").cast(pl.Utf8)
-    ])
-
-    df_final = base_client.join(df_concat_typed, on="PRM", how="left")
+    # Left join : chaque client, avec ses lignes de consommation (PRM déjà en texte,
+    # lignes déjà restreintes aux clients par le scan)
+    df_final = base_client.join(df_concat, on="PRM", how="left")
 
     _nb_avant = len(df_concat)
     _nb_apres = len(df_final)
@@ -261,8 +253,8 @@ def _(base_client, df_concat):
     ✅ **Jointure terminée**
 
     - **{_nb_clients}** clients dans la base client
-    - **{_nb_avant:,}** lignes de consommation avant jointure
-    - **{_nb_apres:,}** lignes après jointure (filtrées sur clients actuels)
+    - **{_nb_avant:,}** lignes de consommation des clients avant jointure
+    - **{_nb_apres:,}** lignes après jointure (clients sans consommation inclus)
     """)
     return (df_final,)
 
@@ -325,33 +317,29 @@ def _(df_final, type_fichier):
 
 
 @app.cell(hide_code=True)
-def _(df_with_month, folder_path, mois_stats, type_fichier):
+def _(df_with_month, folder_path, formats_export, type_fichier):
     mo.stop("M-2" not in type_fichier.value, "")
+    mo.stop(not formats_export.value, mo.md("⚠️ Aucun format d'export sélectionné"))
+
+    # Export d'un fichier M-2 par mois et par format (sans les colonnes de provenance) :
+    # découpage en une seule passe, fichiers écrits en parallèle
+    exports_m2 = exporter_partitions(
+        df_with_month.drop(COLONNES_PROVENANCE),
+        "mois",
+        folder_path,
+        "export_M2",
+        formats=tuple(formats_export.value),
+    )
 
-    # Export d'un CSV M-2 par mois
-    export_logs = []
-
-    for row in mois_stats.iter_rows(named=True):
-        mois = row['mois']
-        nb_lignes = row['nb_lignes']
-
-        # Filtrer les données du mois
-        df_mois = df_with_month.filter(pl.col("mois") == mois)
-
-        # Nom du fichier M-2
-        export_file = folder_path / f"export_M2_{mois}.csv"
-
-        # Export CSV
-        df_mois.write_csv(export_file, separator=";")
-
-        export_logs.append(f"✅ `{export_file.name}` : {nb_lignes:,} lignes")
-
-    _export_summary = "\n".join(export_logs)
+    _export_summary = "\n".join(
+        f"✅ `{Path(_fichier).name}` : {_nb_lignes:,} lignes"
+        for _fichier, _nb_lignes in exports_m2.select("fichier", "nb_lignes").iter_rows()
+    )
 
     mo.md(f"""
     ### ✅ Exports terminés
 
-    {len(export_logs)} fichiers créés dans `{folder_path}` :
+    {len(exports_m2)} fichiers créés dans `{folder_path}` :
 
     {_export_summary}
     """)
@@ -360,74 +348,34 @@ def _(df_with_month, folder_path, mois_stats, type_fichier):
 
 @app.cell
 def _():
-    mo.md(r"""## 🔓 Extraction et lecture des CSV M-6""")
+    mo.md(r"""## 🔍 Dédoublonnage M-6 : ligne la plus récente par PRM""")
     return
 
 
 @app.cell(hide_code=True)
-def _(folder_path, password, type_fichier):
+def _(base_client, extraction, folder_path, type_fichier):
     mo.stop("M-6" not in type_fichier.value, "")
 
-    # Extraction avec 7z via le script bash (identique à M-2)
-    try:
-        stdout_m6, stderr_m6 = extract_all_with_7z(folder_path, password)
+    membres_m6 = extraction.filter((pl.col("type") == "M-6") & pl.col("membre").is_not_null())
+    mo.stop(membres_m6.is_empty(), mo.md("⚠️ Aucun fichier M-6 trouvé"))
 
-        # Affichage du résultat de l'extraction
-        _extraction_log_m6 = stdout_m6.replace('\n', '\n\n')
-
-        mo.md(f"""
-    ## 📊 Résultat de l'extraction M-6 (7z)
-
-    {_extraction_log_m6}
-
-    ---
-        """)
-    except subprocess.TimeoutExpired:
-        mo.md("❌ **Timeout M-6** : L'extraction a pris trop de temps (>5 minutes)")
-    except FileNotFoundError as e:
-        mo.md(f"❌ **Erreur M-6** : {str(e)}")
-    except Exception as e:
-        mo.md(f"❌ **Erreur inattendue M-6** : {str(e)}")
-    return
+    # Ligne du fichier le plus récent (horodatage en fin de nom) par PRM client, sans tri global.
+    # L'état garde la provenance de chaque ligne : seuls les fichiers nouvellement extraits
+    # sont lus, et ne mettent à jour que les PRM qu'ils contiennent
+    consolidation_m6 = consolider_plus_recent(
+        extraction, "M-6", base_client, folder_path / ".etat_M-6.parquet"
+    )
 
+    _mode = "reconstruction complète" if consolidation_m6.reconstruite else "mise à jour incrémentale"
+    _nb_avec_m6 = consolidation_m6.lignes["_source_file"].count()
 
-@app.cell(hide_code=True)
-def _(folder_path, type_fichier):
-    mo.stop("M-6" not in type_fichier.value, "")
+    mo.md(f"""
+    ✅ **Dédoublonnage M-6 terminé** ({_mode})
 
-    import re
-
-    # Trouver tous les CSV M-6
-    csv_files_m6 = sorted([f for f in folder_path.glob("ENEDIS_*.csv") if "M-6" in f.name])
-
-    all_dataframes_m6 = []
-    for csv_file_m6 in csv_files_m6:
-        try:
-            df_m6 = pl.read_csv(csv_file_m6, separator=';')
-
-            # Extraire le timestamp du nom de fichier (derniers 14 chiffres avant .csv)
-            # Ex: 2026-04-ENEDIS_TURPE7HC_M-6_GRD-F091_001_001_20250918100525.csv
-            #                                                     ^^^^^^^^^^^^^^
-            match = re.search(r'(\d{14})\.csv$', csv_file_m6.name)
-            timestamp = match.group(1) if match else "00000000000000"
-
-            # Ajouter métadonnées pour traçabilité
-            df_m6 = df_m6.with_columns([
-                pl.lit(timestamp).alias("_source_timestamp"),
-                pl.lit(csv_file_m6.name).alias("_source_file")
-            ])
-            all_dataframes_m6.append(df_m6)
-        except Exception as e:
-            mo.md(f"⚠️ Impossible de lire `{csv_file_m6.name}` : {str(e)}")
-
-    # Concaténation (avec how="diagonal" pour gérer les colonnes différentes)
-    if len(all_dataframes_m6) > 0:
-        df_m6_concat = pl.concat(all_dataframes_m6, how="diagonal")
-        mo.md(f"✅ **{len(all_dataframes_m6)} fichiers CSV M-6 chargés** : {len(df_m6_concat):,} lignes")
-    else:
-        mo.md("⚠️ Aucun fichier M-6 trouvé")
-        df_m6_concat = None
-    return (df_m6_concat,)
+    - **{len(consolidation_m6.fichiers_lus)}** fichiers CSV M-6 lus sur {len(membres_m6)}
+    - **{len(consolidation_m6.lignes):,}** clients, dont **{_nb_avec_m6:,}** avec une ligne M-6
+    """)
+    return (consolidation_m6,)
 
 
 @app.cell
@@ -437,54 +385,18 @@ def _():
 
 
 @app.cell(hide_code=True)
-def _(base_client, df_m6_concat, type_fichier):
+def _(base_client, consolidation_m6, type_fichier):
     mo.stop("M-6" not in type_fichier.value, "")
-    mo.stop(df_m6_concat is None, mo.md("⚠️ Aucune donnée M-6 à traiter"))
 
-    # Conversion DATE_BASCULE + cast PRM
-    df_m6_typed = df_m6_concat.with_columns([
-        pl.col("DATE_BASCULE").str.to_date(),
-        pl.col("PRM").cast(pl.Utf8)
+    # Conversion DATE_BASCULE (PRM déjà en texte) et retrait des colonnes techniques
+    df_m6_plus_recent = consolidation_m6.lignes.drop(COLONNES_PROVENANCE).with_columns([
+        pl.col("DATE_BASCULE").str.to_date()
     ])
 
-    # Join avec base_client
-    df_m6_joined = base_client.join(df_m6_typed, on="PRM", how="left")
-
-    mo.md(f"✅ **Jointure M-6 terminée** : {len(df_m6_joined):,} lignes")
-    return (df_m6_joined,)
-
-
-@app.cell
-def _():
-    mo.md(r"""## 🔍 Dédoublonnage M-6""")
-    return
-
-
-@app.cell(hide_code=True)
-def _(df_m6_joined, type_fichier):
-    mo.stop("M-6" not in type_fichier.value, "")
-    mo.stop(df_m6_joined is None, "")
-
-    nb_avant_m6 = len(df_m6_joined)
+    # Join avec base_client : une ligne par client
+    df_m6_dedup = base_client.join(df_m6_plus_recent, on="PRM", how="left")
 
-    # Dédoublonnage : garder la ligne du fichier le plus récent par PRM
-    df_m6_dedup = (
-        df_m6_joined
-        .sort("_source_timestamp", descending=True)  # Plus récent en premier
-        .unique(subset=["PRM"], keep="first")
-        .drop(["_source_timestamp", "_source_file"])  # Retirer les colonnes techniques
-    )
-
-    nb_apres_m6 = len(df_m6_dedup)
-    nb_duplicatas_m6 = nb_avant_m6 - nb_apres_m6
-
-    mo.md(f"""
-    ✅ **Dédoublonnage M-6 terminé**
-
-    - **{nb_avant_m6:,}** lignes avant dédoublonnage
-    - **{nb_apres_m6:,}** lignes après dédoublonnage
-    - **{nb_duplicatas_m6:,}** duplicatas supprimés ({nb_duplicatas_m6/nb_avant_m6*100:.1f}%)
-    """)
+    mo.md(f"✅ **Jointure M-6 terminée** : {len(df_m6_dedup):,} lignes")
     return (df_m6_dedup,)
 
 
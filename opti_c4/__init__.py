@@ -0,0 +1,161 @@
+"""
+Moteur d'optimisation TURPE C4/C5, sans dépendance à l'interface.
+
+Chaîne : courbe de charge (R63) → agrégats par cadran et index de dépassement
+→ scénarios (BTINF mono-puissance, optimum exact BTSUP) → coûts TURPE.
+Les notebooks marimo ne sont que des interfaces au-dessus de ce paquet.
+
+Seul le moteur est réexporté ici : les outils de portefeuille s'importent depuis leur
+module (opti_c4.archives, opti_c4.exports, opti_c4.cache_resultats, opti_c4.batch),
+et electricore n'est chargé que par verifier_noyau_turpe (et les règles du batch) :
+importer un module du paquet ne charge ni l'outillage des ZIP M-2/M-6 ni electricore.
+"""
+
+from opti_c4.agregats import (
+    agreger_balayage_plages_hc,
+    agreger_depassements,
+    construire_energies_agregees,
+    cumuler_depassement,
+)
+from opti_c4.calendrier import CalendrierCadrans, jours_feries_france, parser_plages_horaires
+from opti_c4.courbe import (
+    REGLES_REECHANTILLONNAGE,
+    RESOLUTIONS_PYRAMIDE,
+    VERSION_CACHE_COURBE,
+    agreger_fenetres_pmax,
+    charger_courbe_avec_cache,
+    compter_durees_par_pmax,
+    evincer_cache_lru,
+    expr_pas_heures,
+    expr_pmax,
+    expr_volume,
+    reechantillonner_courbe,
+    scanner_courbe_r63,
+)
+from opti_c4.depassement import (
+    CubeDepassementMensuel,
+    HistogrammeDepassement,
+    IndexDepassement,
+    IndexDepassementMensuel,
+)
+from opti_c4.entrepot import VERSION_AGREGATS_MENSUELS, EntrepotCourbes
+from opti_c4.fusion import (
+    PRIORITES_FUSION,
+    FusionCourbes,
+    fusionner_courbes,
+    fusionner_courbes_r63,
+    ordonner_sources,
+)
+from opti_c4.pipeline import (
+    COLONNES_RESULTATS,
+    COLONNES_SCENARIOS,
+    AnalyseCourbe,
+    ClassificationCourbe,
+    ParametresOptimisation,
+    agreger_par_cadran,
+    analyser_courbe,
+    calculer_couts,
+    classifier_courbe,
+    construire_index_depassement,
+    construire_index_mensuel,
+    generer_scenarios,
+    optimiser_classification,
+    optimiser_courbe,
+    preparer_scenarios_turpe,
+    selectionner_source_pmax,
+)
+from opti_c4.qualite import (
+    DUREE_TROU_MIN,
+    PART_TROUS_AVERTISSEMENT,
+    SEUIL_COMPLETUDE_AVERTISSEMENT,
+    SEUIL_COMPLETUDE_ERREUR,
+    detecter_trous,
+    diagnostiquer_qualite,
+    exprs_statistiques_qualite,
+)
+from opti_c4.scenarios import (
+    generer_scenarios_btinf,
+    generer_scenarios_exhaustifs,
+    generer_scenarios_optimaux_btsup,
+    generer_scenarios_reduction_depuis_seuil,
+    generer_scenarios_reduction_proportionnelle,
+    optimiser_puissances_btsup,
+    puissances_pour_depassement,
+)
+from opti_c4.turpe import NoyauTurpe, extraire_regles_turpe, verifier_noyau_turpe
+
+__all__ = [
+    # Courbe de charge
+    'REGLES_REECHANTILLONNAGE',
+    'RESOLUTIONS_PYRAMIDE',
+    'VERSION_CACHE_COURBE',
+    'agreger_fenetres_pmax',
+    'charger_courbe_avec_cache',
+    'compter_durees_par_pmax',
+    'evincer_cache_lru',
+    'expr_pas_heures',
+    'expr_pmax',
+    'expr_volume',
+    'reechantillonner_courbe',
+    'scanner_courbe_r63',
+    # Fusion d'exports recouvrants
+    'PRIORITES_FUSION',
+    'FusionCourbes',
+    'fusionner_courbes',
+    'fusionner_courbes_r63',
+    'ordonner_sources',
+    # Calendrier des cadrans
+    'CalendrierCadrans',
+    'jours_feries_france',
+    'parser_plages_horaires',
+    # Qualité des données
+    'DUREE_TROU_MIN',
+    'PART_TROUS_AVERTISSEMENT',
+    'SEUIL_COMPLETUDE_AVERTISSEMENT',
+    'SEUIL_COMPLETUDE_ERREUR',
+    'detecter_trous',
+    'diagnostiquer_qualite',
+    'exprs_statistiques_qualite',
+    # Agrégats
+    'agreger_balayage_plages_hc',
+    'agreger_depassements',
+    'construire_energies_agregees',
+    'cumuler_depassement',
+    # Index de dépassement
+    'CubeDepassementMensuel',
+    'HistogrammeDepassement',
+    'IndexDepassement',
+    'IndexDepassementMensuel',
+    # Scénarios
+    'generer_scenarios_btinf',
+    'generer_scenarios_exhaustifs',
+    'generer_scenarios_optimaux_btsup',
+    'generer_scenarios_reduction_depuis_seuil',
+    'generer_scenarios_reduction_proportionnelle',
+    'optimiser_puissances_btsup',
+    'puissances_pour_depassement',
+    # TURPE
+    'NoyauTurpe',
+    'extraire_regles_turpe',
+    'verifier_noyau_turpe',
+    # Chaîne complète
+    'COLONNES_RESULTATS',
+    'COLONNES_SCENARIOS',
+    'AnalyseCourbe',
+    'ClassificationCourbe',
+    'ParametresOptimisation',
+    'agreger_par_cadran',
+    'analyser_courbe',
+    'calculer_couts',
+    'classifier_courbe',
+    'construire_index_depassement',
+    'construire_index_mensuel',
+    'generer_scenarios',
+    'optimiser_classification',
+    'optimiser_courbe',
+    'preparer_scenarios_turpe',
+    'selectionner_source_pmax',
+    # Entrepôt incrémental des courbes
+    'VERSION_AGREGATS_MENSUELS',
+    'EntrepotCourbes',
+]
@@ -0,0 +1,208 @@
+"""Agrégats par cadran : énergies, durées par pmax et cumuls de dépassement."""
+
+import polars as pl
+
+from opti_c4.calendrier import CalendrierCadrans
+
+
+def cumuler_depassement(durees: pl.DataFrame, cles: list[str]) -> pl.DataFrame:
+    """
+    Ajoute 'duree_depassement_h' : heures où la puissance est ≥ pmax, par groupe de clés.
+
+    Args:
+        durees: DataFrame avec les colonnes de cles, 'pmax' et 'duree_h'
+        cles: Colonnes de regroupement (ex: ['Identifiant PRM', 'cadran'])
+
+    Returns:
+        DataFrame trié par clés puis pmax décroissant
+    """
+    return (
+        durees
+        # Trier par pmax décroissant pour calculer le cumul de dépassement
+        .sort([*cles, 'pmax'], descending=[False] * len(cles) + [True])
+        .with_columns([
+            # Cumul des heures = nombre d'heures où cette puissance est dépassée
+            pl.col('duree_h')
+              .cum_sum()
+              .over(cles)
+              .alias('duree_depassement_h')
+        ])
+    )
+
+
+def construire_energies_agregees(energies_par_cadran: pl.DataFrame, dates_par_pdl: pl.DataFrame) -> pl.DataFrame:
+    """
+    Énergies par PDL au format electricore (une colonne par cadran) et période de mesure.
+
+    Args:
+        energies_par_cadran: DataFrame ('Identifiant PRM', 'cadran', 'energie_kwh')
+        dates_par_pdl: DataFrame ('Identifiant PRM', 'date_debut', 'date_fin')
+
+    Returns:
+        DataFrame (pdl, energie_{hph,hch,hpb,hcb}_kwh, date_debut, date_fin)
+    """
+    energies = energies_par_cadran.pivot(
+        on='cadran',
+        index='Identifiant PRM',
+        values='energie_kwh',
+    )
+    # Un cadran absent (ex: aucune plage HC) donne une énergie nulle
+    energies = energies.with_columns([
+        pl.lit(None, dtype=pl.Float64).alias(cadran)
+        for cadran in CalendrierCadrans.CADRANS if cadran not in energies.columns
+    ])
+    return (
+        energies
+        .select(['Identifiant PRM', *CalendrierCadrans.CADRANS])
+        .join(dates_par_pdl, on='Identifiant PRM', how='left')
+        # Renommer pour format electricore
+        .rename({
+            'Identifiant PRM': 'pdl',
+            'HPH': 'energie_hph_kwh',
+            'HCH': 'energie_hch_kwh',
+            'HPB': 'energie_hpb_kwh',
+            'HCB': 'energie_hcb_kwh',
+        })
+        # Remplir les valeurs manquantes par 0 (si un cadran n'existe pas)
+        .with_columns([
+            pl.col('energie_hph_kwh').fill_null(0).floor(),
+            pl.col('energie_hch_kwh').fill_null(0).floor(),
+            pl.col('energie_hpb_kwh').fill_null(0).floor(),
+            pl.col('energie_hcb_kwh').fill_null(0).floor(),
+        ])
+    )
+
+
+def agreger_depassements(
+    durees: pl.DataFrame,
+    energies_agregees: pl.DataFrame
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """
+    Agrégats de dépassement et consommations d'une méthodologie de pmax.
+
+    Args:
+        durees: DataFrame ('Identifiant PRM', 'mois', 'cadran', 'pmax', 'duree_h')
+        energies_agregees: Énergies par PDL (cf. construire_energies_agregees)
+
+    Returns:
+        Tuple (cdc, cdc_mensuelle, consos_agregees)
+    """
+    # Cumul de dépassement par (PRM, mois, cadran)
+    cdc_mensuelle = cumuler_depassement(durees, ['Identifiant PRM', 'mois', 'cadran'])
+
+    # DataFrame ultra-optimisé : agrégation par combinaisons uniques de (PRM, cadran, pmax)
+    # Réduction ~99.7% en mémoire : de ~105k lignes à ~250 lignes par PDL
+    cdc = cumuler_depassement(
+        durees
+        .group_by(['Identifiant PRM', 'cadran', 'pmax'])
+        .agg(pl.col('duree_h').sum()),
+        ['Identifiant PRM', 'cadran'],
+    )
+
+    # Pmax par PDL et par cadran selon la méthodologie
+    pmax_par_pdl = (
+        durees
+        .group_by('Identifiant PRM')
+        .agg(pl.col('pmax').max().alias('pmax_moyenne_kva'))
+        .rename({'Identifiant PRM': 'pdl'})
+    )
+    pmax_pivot = (
+        durees
+        .group_by(['Identifiant PRM', 'cadran'])
+        .agg(pl.col('pmax').max())
+        .pivot(on='cadran', index='Identifiant PRM', values='pmax')
+        .rename({
+            'Identifiant PRM': 'pdl',
+            'HPH': 'pmax_hph_kva',
+            'HCH': 'pmax_hch_kva',
+            'HPB': 'pmax_hpb_kva',
+            'HCB': 'pmax_hcb_kva',
+        }, strict=False)
+    )
+
+    # Joindre tout
+    consos_agregees = (
+        energies_agregees
+        .join(pmax_par_pdl, on='pdl', how='left')
+        .join(pmax_pivot, on='pdl', how='left')
+        .with_columns([
+            # Calculer le nombre de jours de la période
+            (pl.col('date_fin') - pl.col('date_debut')).dt.total_days().alias('nb_jours'),
+        ])
+    )
+    return cdc, cdc_mensuelle, consos_agregees
+
+
+def agreger_balayage_plages_hc(
+    courbe: pl.LazyFrame,
+    source_pmax: pl.LazyFrame,
+    colonne_pmax: str,
+    calendriers: dict[str, 'CalendrierCadrans'],
+    dates_par_pdl: pl.DataFrame
+) -> dict[str, tuple[pl.DataFrame, pl.DataFrame]]:
+    """
+    Agrégats de K jeux de plages HC candidats en un seul passage sur la courbe.
+
+    Chaque ligne est classée une fois en un masque de K bits (bit k = heure creuse
+    selon le candidat k, cf. CalendrierCadrans.expr_masque_hc). Les agrégats sont
+    calculés par (masque, saison), dont le nombre de valeurs distinctes reste petit,
+    puis dépliés candidat par candidat sur ces tables déjà réduites.
+
+    Args:
+        courbe: Courbe au pas natif ('Identifiant PRM', 'Horodate', 'volume')
+        source_pmax: Courbe ou fenêtres de la pyramide portant colonne_pmax et 'pas_heures'
+        colonne_pmax: Colonne de pmax de la méthodologie choisie
+        calendriers: Calendrier de chaque candidat, par libellé
+        dates_par_pdl: DataFrame ('Identifiant PRM', 'date_debut', 'date_fin')
+
+    Returns:
+        Dict libellé → (energies_agregees, durees) au format des étapes 2 et 3
+    """
+    masque = CalendrierCadrans.expr_masque_hc(list(calendriers.values())).alias('masque')
+    saison_haute = (
+        pl.col('Horodate').dt.month().is_in(CalendrierCadrans.MOIS_SAISON_HAUTE).alias('saison_haute')
+    )
+
+    energies, durees = pl.collect_all(
+        [
+            courbe
+            .with_columns([masque, saison_haute])
+            .group_by(['Identifiant PRM', 'saison_haute', 'masque'])
+            .agg(pl.col('volume').sum().alias('energie_kwh')),
+            source_pmax
+            .with_columns([
+                masque,
+                saison_haute,
+                pl.col('Horodate').dt.truncate('1mo').dt.date().alias('mois'),
+            ])
+            .group_by(['Identifiant PRM', 'mois', 'saison_haute', 'masque', pl.col(colonne_pmax).alias('pmax')])
+            .agg(pl.col('pas_heures').sum().alias('duree_h')),
+        ],
+        engine='streaming',
+    )
+
+    agregats = {}
+    for k, libelle in enumerate(calendriers):
+        # Cadran du candidat k : bit k du masque (HC/HP) × saison (H/B)
+        heure_creuse = (pl.col('masque') & pl.lit(1 << k, dtype=pl.UInt64)) != 0
+        cadran = (
+            pl.when(pl.col('saison_haute'))
+            .then(pl.when(heure_creuse).then(pl.lit('HCH')).otherwise(pl.lit('HPH')))
+            .otherwise(pl.when(heure_creuse).then(pl.lit('HCB')).otherwise(pl.lit('HPB')))
+            .cast(pl.Enum(CalendrierCadrans.CADRANS))
+            .alias('cadran')
+        )
+        energies_k = (
+            energies
+            .with_columns(cadran)
+            .group_by(['Identifiant PRM', 'cadran'])
+            .agg(pl.col('energie_kwh').sum())
+        )
+        durees_k = (
+            durees
+            .with_columns(cadran)
+            .group_by(['Identifiant PRM', 'mois', 'cadran', 'pmax'])
+            .agg(pl.col('duree_h').sum())
+        )
+        agregats[libelle] = (construire_energies_agregees(energies_k, dates_par_pdl), durees_k)
+    return agregats
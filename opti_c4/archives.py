@@ -0,0 +1,452 @@
+"""Lecture des archives ZIP Enedis protégées par mot de passe, et extraction incrémentale."""
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import zipfile
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from opti_c4.fichiers import ecrire_atomique, ecrire_parquet_atomique, limiter_threads_polars
+
+# Méthode de compression des membres chiffrés en AES (WinZip), non gérée par zipfile
+COMPRESSION_AES = 99
+
+# Version du format du manifeste et des extractions (à incrémenter si leur schéma change)
+VERSION_MANIFESTE = 1
+
+# Type de flux dans le nom des archives (ex: ..._TURPE7HC_M-2_GRD-F091_...)
+MOTIF_TYPE_FLUX = re.compile(r'_(M-\d+)_')
+
+# Horodatage de génération en fin de nom des CSV (ex: ..._001_001_20250918100525.csv)
+MOTIF_HORODATAGE = re.compile(r'(\d{14})\.csv$')
+
+# Colonnes de provenance ajoutées à chaque ligne (cf. scanner_extraction)
+COLONNES_PROVENANCE = ['_source_timestamp', '_source_file']
+
+# Schéma de la table des membres extraits (cf. extraire_dossier)
+SCHEMA_EXTRACTION = {
+    'archive': pl.String,
+    'type': pl.String,
+    'membre': pl.String,
+    'fichier': pl.String,
+    'lignes': pl.Int64,
+    'sha256': pl.String,
+    'extrait_le': pl.String,
+    'methode': pl.String,
+    'depuis_manifeste': pl.Boolean,
+    'erreur': pl.String,
+}
+
+
+@dataclass
+class ArchiveLue:
+    """CSV d'une archive, lus en mémoire, et méthode d'extraction utilisée."""
+
+    archive: Path
+    membres: dict[str, pl.DataFrame] = field(default_factory=dict)
+    methode: str = 'zipfile'
+    erreur: str = None
+
+
+def _decrire_erreur(exc: BaseException) -> str:
+    """Résumé sur une ligne d'une exception."""
+    message = str(exc).strip().splitlines()
+    return f"{type(exc).__name__}: {message[0] if message else ''}"
+
+
+def extraire_membre_7z(archive: Path, membre: str, mot_de_passe: str) -> bytes:
+    """
+    Contenu d'un membre extrait par 7z sur sa sortie standard, sans fichier temporaire.
+
+    Raises:
+        RuntimeError: Si 7z échoue (mot de passe, archive corrompue)
+        FileNotFoundError: Si 7z n'est pas installé
+    """
+    resultat = subprocess.run(
+        ['7z', 'x', '-so', f'-p{mot_de_passe}', str(archive), membre],
+        capture_output=True,
+        timeout=300,
+    )
+    if resultat.returncode != 0:
+        message = resultat.stderr.decode(errors='replace').strip().splitlines()
+        raise RuntimeError(f"7z ({resultat.returncode}) : {message[-1] if message else 'échec'}")
+    return resultat.stdout
+
+
+def lire_archive(
+    archive: Path,
+    mot_de_passe: str,
+    separateur: str = ';',
+    dechiffrer_par_7z: bool = None
+) -> ArchiveLue:
+    """
+    Lit les CSV d'une archive ZIP chiffrée directement dans Polars, sans fichier extrait.
+
+    Principe :
+    - Chaque membre CSV est décompressé en flux par zipfile puis lu par Polars
+    - zipfile déchiffre ZipCrypto en Python pur (quelques Mo/s) : quand 7z est installé,
+      les membres chiffrés sont plutôt lus sur sa sortie standard (7z x -so)
+    - Les membres chiffrés en AES, non gérés par zipfile, passent toujours par 7z
+    - Une erreur est consignée dans le résultat sans interrompre les autres archives
+
+    Args:
+        archive: Fichier ZIP
+        mot_de_passe: Mot de passe des archives
+        separateur: Séparateur des CSV
+        dechiffrer_par_7z: Déchiffrer ZipCrypto par 7z (défaut: si 7z est installé)
+
+    Returns:
+        ArchiveLue (membres lus, méthode 'zipfile' ou '7z', erreur éventuelle)
+    """
+    if dechiffrer_par_7z is None:
+        dechiffrer_par_7z = shutil.which('7z') is not None
+
+    lue = ArchiveLue(archive=Path(archive))
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if not info.filename.lower().endswith('.csv'):
+                    continue
+                chiffre = info.flag_bits & 0x1
+                if info.compress_type == COMPRESSION_AES or (chiffre and dechiffrer_par_7z):
+                    lue.methode = '7z'
+                    contenu = io.BytesIO(extraire_membre_7z(archive, info.filename, mot_de_passe))
+                else:
+                    contenu = zf.open(info, pwd=mot_de_passe.encode())
+                with contenu:
+                    lue.membres[Path(info.filename).name] = pl.read_csv(contenu, separator=separateur)
+    except Exception as exc:
+        lue.erreur = _decrire_erreur(exc)
+    return lue
+
+
+def _executer_en_parallele(
+    fonction: Callable,
+    arguments: list[tuple],
+    nb_processus: int = None
+) -> Iterator:
+    """
+    Applique fonction à chaque tuple d'arguments sur un pool de processus spawn.
+
+    Returns:
+        Itérateur des résultats, dans l'ordre de fin d'exécution
+    """
+    nb_processus = min(len(arguments), nb_processus or os.process_cpu_count() or 1)
+    if nb_processus <= 1:
+        for args in arguments:
+            yield fonction(*args)
+        return
+
+    threads_polars = max(1, (os.process_cpu_count() or 1) // nb_processus)
+    # spawn : les processus n'héritent pas du pool de threads Polars du parent
+    with ProcessPoolExecutor(
+        max_workers=nb_processus,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=limiter_threads_polars,
+        initargs=(threads_polars,),
+    ) as pool:
+        futures = [pool.submit(fonction, *args) for args in arguments]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def lire_archives(
+    archives: Iterable[Path],
+    mot_de_passe: str,
+    separateur: str = ';',
+    nb_processus: int = None,
+    dechiffrer_par_7z: bool = None
+) -> Iterator[ArchiveLue]:
+    """
+    Lit les CSV de toutes les archives sur un pool de processus.
+
+    Un processus par cœur parallélise réellement les archives : le déchiffrement
+    ZipCrypto de zipfile, en Python pur, resterait sous le GIL avec des threads.
+
+    Args:
+        archives: Fichiers ZIP
+        mot_de_passe: Mot de passe des archives
+        separateur: Séparateur des CSV
+        nb_processus: Taille du pool (défaut: cœurs disponibles)
+        dechiffrer_par_7z: cf. lire_archive
+
+    Returns:
+        Itérateur des ArchiveLue, dans l'ordre de fin de lecture
+    """
+    yield from _executer_en_parallele(
+        lire_archive,
+        [(archive, mot_de_passe, separateur, dechiffrer_par_7z) for archive in archives],
+        nb_processus,
+    )
+
+
+def type_flux(archive: Path) -> str:
+    """Type de flux d'une archive d'après son nom ('M-2', 'M-6'…), None s'il est absent."""
+    correspondance = MOTIF_TYPE_FLUX.search(Path(archive).name)
+    return correspondance.group(1) if correspondance else None
+
+
+def empreinte_archive(archive: Path, taille_bloc: int = 1024**2) -> str:
+    """SHA-256 du contenu d'une archive, lue par blocs."""
+    empreinte = hashlib.sha256()
+    with open(archive, 'rb') as f:
+        while bloc := f.read(taille_bloc):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def _extraction_complete(entree: dict, tailles: dict[str, int]) -> bool:
+    """Tous les membres de l'entrée sont extraits, à la taille consignée dans le manifeste."""
+    return all(tailles.get(membre['fichier']) == membre['octets'] for membre in entree['membres'])
+
+
+def _tailles_extraites(dossier_extraction: Path) -> dict[str, int]:
+    """Taille de chaque fichier du dossier d'extraction, en une lecture de répertoire."""
+    with os.scandir(dossier_extraction) as entrees:
+        return {e.name: e.stat().st_size for e in entrees if e.is_file()}
+
+
+def extraire_archive(
+    archive: Path,
+    mot_de_passe: str,
+    dossier_extraction: Path,
+    entree_connue: dict = None,
+    separateur: str = ';',
+    dechiffrer_par_7z: bool = None
+) -> dict:
+    """
+    Extrait les CSV d'une archive en Parquet (un fichier par membre) et décrit l'extraction.
+
+    L'empreinte de l'archive est toujours recalculée : si elle est identique à celle
+    d'entree_connue et que l'extraction est complète (archive seulement touchée, ou copiée
+    à l'identique), rien n'est ré-extrait.
+
+    Args:
+        archive: Fichier ZIP
+        mot_de_passe: Mot de passe des archives
+        dossier_extraction: Dossier des Parquet extraits
+        entree_connue: Entrée du manifeste pour cette archive, s'il y en a une
+        separateur: Séparateur des CSV
+        dechiffrer_par_7z: cf. lire_archive
+
+    Returns:
+        Entrée du manifeste : 'sha256', 'taille', 'mtime_ns', 'extrait_le', 'methode',
+        'membres' ('nom', 'fichier', 'lignes', 'octets'), 'erreur' et 'reextraite', ainsi que
+        'archive' (nom du fichier ZIP)
+    """
+    archive = Path(archive)
+    stat = archive.stat()
+    empreinte = empreinte_archive(archive)
+    if (entree_connue and entree_connue['sha256'] == empreinte
+            and _extraction_complete(entree_connue, _tailles_extraites(dossier_extraction))):
+        return {
+            **entree_connue,
+            'archive': archive.name,
+            'taille': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'reextraite': False,
+        }
+
+    lue = lire_archive(archive, mot_de_passe, separateur, dechiffrer_par_7z)
+    membres = []
+    for nom, df in lue.membres.items():
+        # Préfixe d'empreinte : une archive modifiée n'écrase pas l'extraction en cours de lecture
+        fichier = dossier_extraction / f"{empreinte[:16]}_{Path(nom).stem}.parquet"
+        ecrire_parquet_atomique(df, fichier)
+        membres.append({'nom': nom, 'fichier': fichier.name, 'lignes': df.height, 'octets': fichier.stat().st_size})
+    return {
+        'archive': archive.name,
+        'sha256': empreinte,
+        'taille': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'extrait_le': datetime.now().isoformat(timespec='seconds'),
+        'methode': lue.methode,
+        'membres': membres,
+        'erreur': lue.erreur,
+        'reextraite': True,
+    }
+
+
+def lire_manifeste(fichier: Path) -> dict[str, dict]:
+    """Entrées du manifeste par nom d'archive (vide si absent, illisible ou d'une autre version)."""
+    try:
+        manifeste = json.loads(fichier.read_text())
+    except (OSError, ValueError):
+        return {}
+    if manifeste.get('version') != VERSION_MANIFESTE:
+        return {}
+    return manifeste['archives']
+
+
+def _ecrire_manifeste(fichier: Path, archives: dict[str, dict]):
+    """Écriture atomique du manifeste (cf. ecrire_atomique)."""
+    contenu = json.dumps({'version': VERSION_MANIFESTE, 'archives': archives}, indent=2, ensure_ascii=False)
+    ecrire_atomique(fichier, lambda chemin: chemin.write_text(contenu))
+
+
+def extraire_dossier(
+    dossier: Path,
+    mot_de_passe: str,
+    types: Iterable[str] = None,
+    dossier_extraction: Path = None,
+    separateur: str = ';',
+    nb_processus: int = None,
+    dechiffrer_par_7z: bool = None
+) -> pl.DataFrame:
+    """
+    Étape d'extraction partagée par les flux M-2 et M-6 : chaque archive n'est extraite qu'une fois.
+
+    Principe :
+    - Un manifeste (manifeste.json) décrit chaque archive extraite : empreinte SHA-256,
+      taille et date de modification, membres (nom, fichier Parquet, lignes, octets),
+      date et méthode d'extraction
+    - À la relance, un stat par archive et une lecture du dossier d'extraction suffisent :
+      une archive de même taille et date de modification, dont tous les Parquet sont présents
+      à la taille consignée, est servie par le manifeste
+    - Sinon l'archive est confiée au pool (cf. extraire_archive) : seules les archives
+      modifiées, ou dont l'extraction est incomplète ou tronquée, sont ré-extraites
+    - Une archive en erreur n'est pas consignée : elle est retentée à la relance
+    - Les extractions des archives disparues ou remplacées sont supprimées
+
+    Args:
+        dossier: Dossier des archives ZIP
+        mot_de_passe: Mot de passe des archives
+        types: Types de flux à extraire, ex: ['M-2', 'M-6'] (défaut: toutes les archives)
+        dossier_extraction: Dossier des Parquet extraits et du manifeste (défaut: dossier/.extraction)
+        separateur: Séparateur des CSV
+        nb_processus: Taille du pool (défaut: cœurs disponibles)
+        dechiffrer_par_7z: cf. lire_archive
+
+    Returns:
+        DataFrame par membre extrait, trié par archive et membre (cf. SCHEMA_EXTRACTION) :
+        'fichier' est le chemin du Parquet, 'depuis_manifeste' vaut True si l'archive n'a pas
+        été ré-extraite ; une archive en erreur a une ligne sans membre
+    """
+    dossier = Path(dossier)
+    dossier_extraction = Path(dossier_extraction or dossier / '.extraction')
+    dossier_extraction.mkdir(parents=True, exist_ok=True)
+    fichier_manifeste = dossier_extraction / 'manifeste.json'
+    manifeste = lire_manifeste(fichier_manifeste)
+    types = set(types) if types is not None else None
+
+    archives = sorted(
+        archive for archive in dossier.glob('*.zip')
+        if types is None or type_flux(archive) in types
+    )
+    tailles = _tailles_extraites(dossier_extraction)
+
+    entrees, a_extraire = {}, []
+    for archive in archives:
+        stat = archive.stat()
+        connue = manifeste.get(archive.name)
+        if (connue and connue['taille'] == stat.st_size and connue['mtime_ns'] == stat.st_mtime_ns
+                and _extraction_complete(connue, tailles)):
+            entrees[archive.name] = {**connue, 'reextraite': False}
+        else:
+            a_extraire.append((archive, mot_de_passe, dossier_extraction, connue, separateur, dechiffrer_par_7z))
+
+    for entree in _executer_en_parallele(extraire_archive, a_extraire, nb_processus):
+        entrees[entree['archive']] = entree
+
+    # Manifeste : entrées inchangées, archives ré-extraites sans erreur, et archives
+    # d'autres types encore présentes dans le dossier
+    noms_presents = {archive.name for archive in dossier.glob('*.zip')}
+    consignees = {nom: entree for nom, entree in manifeste.items() if nom in noms_presents}
+    consignees.update({
+        nom: {cle: valeur for cle, valeur in entree.items() if cle != 'reextraite'}
+        for nom, entree in entrees.items() if not entree['erreur']
+    })
+    _ecrire_manifeste(fichier_manifeste, dict(sorted(consignees.items())))
+
+    # Parquet qui ne sont plus référencés : archives disparues ou remplacées
+    references = {membre['fichier'] for entree in consignees.values() for membre in entree['membres']}
+    for fichier in dossier_extraction.glob('*.parquet'):
+        if fichier.name not in references:
+            fichier.unlink(missing_ok=True)
+
+    lignes = [
+        {
+            'archive': nom,
+            'type': type_flux(nom),
+            'membre': membre['nom'] if membre else None,
+            'fichier': str(dossier_extraction / membre['fichier']) if membre else None,
+            'lignes': membre['lignes'] if membre else None,
+            'sha256': entree['sha256'],
+            'extrait_le': entree['extrait_le'],
+            'methode': entree['methode'],
+            'depuis_manifeste': not entree['reextraite'],
+            'erreur': entree['erreur'],
+        }
+        for nom, entree in sorted(entrees.items())
+        for membre in (entree['membres'] if not entree['erreur'] else [None])
+    ]
+    return pl.DataFrame(lignes, schema=SCHEMA_EXTRACTION)
+
+
+def horodatage_membre(membre: str) -> str:
+    """
+    Horodatage de génération d'un CSV Enedis : les 14 chiffres qui précèdent .csv.
+
+    Ex: ENEDIS_TURPE7HC_M-6_GRD-F091_001_001_20250918100525.csv → '20250918100525'
+    ('00000000000000' s'il est absent : le fichier est alors considéré comme le plus ancien)
+    """
+    correspondance = MOTIF_HORODATAGE.search(membre)
+    return correspondance.group(1) if correspondance else '00000000000000'
+
+
+def scanner_extraction(
+    extraction: pl.DataFrame,
+    flux: str,
+    clients: pl.DataFrame | pl.LazyFrame = None,
+    colonne_prm: str = 'PRM'
+) -> pl.LazyFrame:
+    """
+    Scan lazy de tous les CSV extraits d'un flux, restreint aux PRM des clients.
+
+    Principe :
+    - Un scan Parquet par membre extrait, avec ses colonnes de provenance
+      (cf. COLONNES_PROVENANCE), réunis sur un schéma commun : colonnes absentes
+      complétées par null, types divergents relevés au supertype
+    - Le PRM est typé en texte, comme dans la base client
+    - Les PRM clients sont appliqués en semi-jointure : les fichiers Enedis couvrent
+      tout le périmètre du GRD, et le moteur streaming écarte les autres PRM au fil
+      de la lecture sans jamais les matérialiser
+
+    Args:
+        extraction: Membres extraits (cf. extraire_dossier)
+        flux: Type de flux ('M-2', 'M-6'…)
+        clients: Table contenant colonne_prm (défaut: tous les PRM)
+        colonne_prm: Colonne du PRM
+
+    Returns:
+        LazyFrame des lignes des clients, fichiers dans l'ordre de l'extraction,
+        à collecter avec engine='streaming'
+    """
+    membres = extraction.filter((pl.col('type') == flux) & pl.col('membre').is_not_null())
+    if membres.is_empty():
+        raise ValueError(f"Aucun fichier {flux} extrait")
+
+    scans = [
+        pl.scan_parquet(fichier).with_columns(
+            pl.col(colonne_prm).cast(pl.String),
+            pl.lit(horodatage_membre(membre)).alias('_source_timestamp'),
+            pl.lit(membre).alias('_source_file'),
+        )
+        for membre, fichier in membres.select('membre', 'fichier').iter_rows()
+    ]
+    lignes = pl.concat(scans, how='diagonal_relaxed')
+    if clients is None:
+        return lignes
+    prms_clients = clients.lazy().select(pl.col(colonne_prm).cast(pl.String)).unique()
+    return lignes.join(prms_clients, on=colonne_prm, how='semi')
@@ -0,0 +1,446 @@
+"""
+Optimisation d'un portefeuille de PRM en ligne de commande.
+
+Les courbes R63 sont fusionnées sans doublon (PRM, Horodate) quand les fichiers
+se recouvrent, écrites dans un Parquet trié par PRM (row groups de 50 000 lignes,
+aux statistiques min/max disjointes : la lecture d'un PRM saute les autres), puis
+chaque PRM passe par la chaîne complète dans un pool de processus.
+Les résultats sont écrits au fil de l'eau dans un fichier Parquet ; un PRM en
+échec, y compris par la perte de son processus (mémoire, signal), est consigné dans
+un fichier d'erreurs sans interrompre le lot. Les PRM dont
+ni la courbe, ni les paramètres, ni les règles TURPE n'ont changé depuis le
+dernier passage sont relus depuis le cache de résultats.
+
+Avec un entrepôt (--entrepot), les fichiers fournis ne sont que les nouvelles
+livraisons : elles sont fusionnées dans l'entrepôt, puis chaque PRM de
+l'entrepôt est optimisé sur sa vue glissante de 12 mois.
+
+Usage :
+    python -m opti_c4.batch courbes/*.csv -o resultats.parquet --methode-pmax max_10m
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from opti_c4.cache_resultats import empreinte_regles_turpe, optimiser_courbe_avec_cache
+from opti_c4.courbe import REGLES_REECHANTILLONNAGE
+from opti_c4.entrepot import EntrepotCourbes
+from opti_c4.fichiers import fichier_temporaire, limiter_threads_polars
+from opti_c4.fusion import PRIORITES_FUSION, fusionner_courbes_r63
+from opti_c4.pipeline import ParametresOptimisation, optimiser_classification, optimiser_courbe
+
+# Méthodologies de pmax acceptées (cf. classifier_courbe)
+METHODES_PMAX = ('brut', 'max_5m', 'moyenne_5m', 'max_10m', 'moyenne_10m', 'max_1h', 'moyenne_1h')
+
+# Dossier par défaut du cache de résultats
+DOSSIER_CACHE_RESULTATS = Path.home() / '.cache' / 'opti-c4' / 'resultats'
+
+# Règles TURPE (et leur empreinte) chargées une fois par processus de travail
+_regles_turpe = None
+_empreinte_regles = None
+
+
+def partitionner_par_prm(sources: list[Path], dossier: Path, priorite: str = 'ordre') -> tuple[Path, list, pl.DataFrame]:
+    """
+    Écrit la courbe PA typée de tous les fichiers, dédoublonnée et triée par PRM, dans un Parquet.
+
+    Le tri garantit des statistiques min/max disjointes par row group : la lecture
+    d'un PRM (filtre poussé dans le scan) ne décode que ses propres row groups.
+
+    Args:
+        sources: Fichiers CSV R63, éventuellement recouvrants
+        dossier: Dossier de travail
+        priorite: Fichier retenu en cas de recouvrement (cf. ordonner_sources)
+
+    Returns:
+        Tuple (chemin du Parquet partitionné, liste triée des PRM, recouvrements)
+    """
+    chemin = dossier / 'courbes_par_prm.parquet'
+    fusion = fusionner_courbes_r63(sources, priorite)
+    # Une seule exécution : la courbe fusionnée est écrite pendant le calcul des recouvrements
+    _, recouvrements = pl.collect_all([
+        fusion.courbe.sink_parquet(chemin, row_group_size=50_000, lazy=True),
+        fusion.recouvrements,
+    ])
+    prms = (
+        pl.scan_parquet(chemin)
+        .select(pl.col('Identifiant PRM').unique(maintain_order=True))
+        .collect()
+        .to_series()
+        .to_list()
+    )
+    return chemin, prms, recouvrements
+
+
+def ingerer_livraisons(
+    sources: list[Path],
+    entrepot: EntrepotCourbes,
+    priorite: str = 'ordre'
+) -> tuple[list[str], pl.DataFrame]:
+    """
+    Fusionne les livraisons entre elles, puis dans l'entrepôt (la livraison l'emporte sur l'entrepôt).
+
+    Returns:
+        Tuple (PRM de l'entrepôt, recouvrements entre livraisons)
+    """
+    if not sources:
+        return entrepot.prms(), pl.DataFrame()
+
+    fusion = fusionner_courbes_r63(sources, priorite)
+    bilan = entrepot.ingerer(fusion.courbe)
+    if bilan.is_empty():
+        print(f"📥 {len(sources)} livraison(s) : aucune mesure PA", flush=True)
+    else:
+        print(
+            f"📥 {len(sources)} livraison(s) : {bilan['lignes_ajoutees'].sum():,} mesures nouvelles, "
+            f"{bilan['modifiee'].sum()} tranche(s) PRM × mois mises à jour",
+            flush=True,
+        )
+    return entrepot.prms(), fusion.recouvrements.collect()
+
+
+def signaler_recouvrements(recouvrements: pl.DataFrame, fichier: Path):
+    """Résumé des recouvrements entre fichiers, détail écrit en CSV s'il y en a."""
+    if recouvrements.is_empty():
+        return
+    recouvrements.write_csv(fichier)
+    print(
+        f"🔁 {recouvrements['mesures_en_double'].sum():,} mesures en double écartées, "
+        f"dont {recouvrements['conflits'].sum():,} en conflit, "
+        f"sur {recouvrements['Identifiant PRM'].n_unique()} PRM : détail dans {fichier}",
+        flush=True,
+    )
+
+
+def _initialiser_processus(threads_polars: int):
+    """Limite les threads Polars du processus et charge les règles TURPE une seule fois."""
+    global _regles_turpe, _empreinte_regles
+    limiter_threads_polars(threads_polars)
+    from electricore.core.pipelines.turpe import load_turpe_rules
+    _regles_turpe = load_turpe_rules()
+    _empreinte_regles = empreinte_regles_turpe(_regles_turpe)
+
+
+def decrire_erreur(exc: BaseException) -> dict:
+    """Résumé sur une ligne et traceback complet d'une exception."""
+    message = str(exc).strip().splitlines()
+    return {
+        'erreur': f"{type(exc).__name__}: {message[0] if message else ''}",
+        'trace': ''.join(traceback.format_exception(exc)),
+    }
+
+
+def optimiser_prm(
+    chemin: Path,
+    prm,
+    parametres: ParametresOptimisation,
+    dossier_cache: Path = None,
+    entrepot: Path = None
+) -> tuple:
+    """
+    Chaîne complète pour un PRM, exécutée dans un processus de travail.
+
+    Args:
+        chemin: Parquet partitionné (cf. partitionner_par_prm), ignoré avec un entrepôt
+        prm: PRM à optimiser
+        parametres: Paramètres de l'optimisation
+        dossier_cache: Cache de résultats (None : toujours recalculer)
+        entrepot: Racine d'un EntrepotCourbes (vue glissante et agrégats mensuels)
+
+    Returns:
+        Tuple (prm, résultats ou None, erreur ou None, durée en s, lu depuis le cache) ;
+        l'erreur est un dict {'erreur': résumé sur une ligne, 'trace': traceback complet}
+    """
+    debut = time.perf_counter()
+    try:
+        if entrepot is None:
+            courbe = pl.scan_parquet(chemin).filter(pl.col('Identifiant PRM') == prm)
+
+            def calculer():
+                return optimiser_courbe(courbe, _regles_turpe, parametres)
+        elif parametres.pas_commun_minutes is not None:
+            # Agrégats mensuels mémorisés au pas natif : la vue glissante est rééchantillonnée
+            courbe = EntrepotCourbes(entrepot).vue_glissante(prm)
+
+            def calculer():
+                return optimiser_courbe(courbe, _regles_turpe, parametres)
+        else:
+            entrepot = EntrepotCourbes(entrepot)
+            courbe = entrepot.vue_glissante(prm)
+
+            def calculer():
+                # Mois complets relus depuis les agrégats mensuels de l'entrepôt
+                classification = entrepot.classifier(prm, parametres.calendrier())
+                return optimiser_classification(classification, _regles_turpe, parametres)
+
+        if dossier_cache is None:
+            resultats, depuis_cache = calculer(), False
+        else:
+            resultats, depuis_cache = optimiser_courbe_avec_cache(
+                courbe.collect(),
+                _regles_turpe,
+                parametres,
+                empreinte_regles=_empreinte_regles,
+                dossier_cache=dossier_cache,
+                calculer=calculer,
+            )
+        return prm, resultats, None, time.perf_counter() - debut, depuis_cache
+    except Exception as exc:
+        return prm, None, decrire_erreur(exc), time.perf_counter() - debut, False
+
+
+def executer_par_prm(
+    fonction: Callable,
+    prms: list,
+    nb_processus: int,
+    initializer: Callable = None,
+    initargs: tuple = (),
+    fenetre: int = None,
+) -> Iterator[tuple]:
+    """
+    Exécute fonction(prm) sur un pool de processus spawn, au plus fenetre PRM soumis à la fois.
+
+    Un processus de travail perdu (mémoire, signal) rompt tout le pool : les PRM alors en
+    cours échouent ensemble avec BrokenProcessPool. Un pool neuf les rejoue un par un, pour
+    n'imputer l'échec qu'au PRM qui le provoque, puis un autre reprend les PRM restants.
+
+    Args:
+        fonction: Fonction picklable (niveau module ou partial) appelée avec un PRM
+        prms: PRM à traiter
+        nb_processus: Taille du pool
+        initializer, initargs: Initialisation de chaque processus de travail
+        fenetre: Nombre maximal de PRM soumis non consommés (défaut: 2 × nb_processus)
+
+    Yields:
+        Tuples (prm, résultat ou None, exception ou None), dans l'ordre d'achèvement
+    """
+    fenetre = fenetre or 2 * nb_processus
+    a_traiter = deque(prms)
+    suspects = deque()
+    while a_traiter or suspects:
+        # Après la perte d'un processus, les PRM qui étaient en cours passent seuls, un à la fois
+        isole = bool(suspects)
+        file = suspects if isole else a_traiter
+        en_cours = {}
+        perdus = []
+        # spawn : les processus n'héritent pas du pool de threads Polars du parent
+        with ProcessPoolExecutor(
+            max_workers=1 if isole else nb_processus,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=initializer,
+            initargs=initargs,
+        ) as pool:
+            while (file or en_cours) and not perdus:
+                while file and len(en_cours) < (1 if isole else fenetre):
+                    prm = file.popleft()
+                    en_cours[pool.submit(fonction, prm)] = prm
+                termines, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+                if any(isinstance(future.exception(), BrokenProcessPool) for future in termines):
+                    # Pool rompu : tous les futures en cours se terminent, sur un résultat ou en échec
+                    wait(en_cours)
+                    termines = list(en_cours)
+                for future in termines:
+                    prm = en_cours.pop(future)
+                    exc = future.exception()
+                    if isinstance(exc, BrokenProcessPool):
+                        perdus.append((prm, exc))
+                    else:
+                        yield prm, None if exc else future.result(), exc
+
+        if len(perdus) == 1:
+            # Seul PRM en cours à la rupture : c'est lui qui l'a provoquée
+            prm, exc = perdus[0]
+            yield prm, None, exc
+        else:
+            suspects.extend(prm for prm, _ in perdus)
+
+
+def optimiser_portefeuille(
+    sources: list[Path],
+    sortie: Path,
+    parametres: ParametresOptimisation = ParametresOptimisation(),
+    nb_processus: int = None,
+    taille_lot: int = 200,
+    dossier_cache: Path = DOSSIER_CACHE_RESULTATS,
+    entrepot: Path = None,
+    priorite: str = 'ordre',
+) -> pl.DataFrame:
+    """
+    Optimise tous les PRM des courbes fournies et écrit les résultats en Parquet.
+
+    Args:
+        sources: Fichiers CSV R63 (un ou plusieurs PRM chacun) ; nouvelles livraisons avec un entrepôt
+        sortie: Fichier Parquet des résultats (colonnes COLONNES_RESULTATS)
+        parametres: Paramètres communs à tous les PRM
+        nb_processus: Taille du pool (défaut: cœurs disponibles)
+        taille_lot: Nombre de PRM regroupés par row group écrit
+        dossier_cache: Cache de résultats (None : tout recalculer)
+        entrepot: Racine d'un EntrepotCourbes : optimise tous ses PRM après ingestion des sources
+        priorite: Fichier retenu quand des sources se recouvrent (cf. ordonner_sources) ;
+            les recouvrements sont détaillés dans <sortie>_recouvrements.csv
+
+    Returns:
+        DataFrame des erreurs ('pdl', 'erreur', 'trace'), vide si tous les PRM ont abouti
+    """
+    nb_processus = nb_processus or os.process_cpu_count() or 1
+    threads_polars = max(1, (os.process_cpu_count() or 1) // nb_processus)
+    erreurs = []
+    nb_depuis_cache = 0
+
+    sortie.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='opti-c4-') as dossier:
+        if entrepot is None:
+            print(f"🔍 Partitionnement de {len(sources)} fichier(s) par PRM...", flush=True)
+            chemin, prms, recouvrements = partitionner_par_prm(sources, Path(dossier), priorite)
+        else:
+            chemin = None
+            prms, recouvrements = ingerer_livraisons(sources, EntrepotCourbes(entrepot), priorite)
+        signaler_recouvrements(recouvrements, sortie.with_name(f"{sortie.stem}_recouvrements.csv"))
+        print(f"✅ {len(prms)} PRM à optimiser sur {nb_processus} processus", flush=True)
+
+        fichier_tmp = fichier_temporaire(sortie)
+        writer = None
+        lot = []
+
+        def ecrire_lot():
+            nonlocal writer
+            table = pl.concat(lot).to_arrow()
+            if writer is None:
+                writer = pq.ParquetWriter(fichier_tmp, table.schema, compression='zstd')
+            writer.write_table(table)
+            lot.clear()
+
+        execution = executer_par_prm(
+            partial(optimiser_prm, chemin, parametres=parametres, dossier_cache=dossier_cache, entrepot=entrepot),
+            prms,
+            nb_processus,
+            initializer=_initialiser_processus,
+            initargs=(threads_polars,),
+        )
+        for n, (prm, retour, exc) in enumerate(execution, start=1):
+            if exc is None:
+                prm, resultats, erreur, duree, depuis_cache = retour
+            else:
+                # Processus de travail perdu (mémoire, signal) en traitant ce PRM
+                resultats, erreur, duree, depuis_cache = None, decrire_erreur(exc), 0.0, False
+
+            if erreur is None and resultats.is_empty():
+                erreur = {'erreur': "Aucun scénario généré", 'trace': ''}
+            if erreur is not None:
+                erreurs.append({'pdl': str(prm), **erreur})
+                print(f"[{n}/{len(prms)}] ❌ PRM {prm} : {erreur['erreur']}", flush=True)
+                continue
+
+            lot.append(
+                resultats.with_columns([
+                    pl.col('pdl').cast(pl.String),
+                    pl.col('formule_tarifaire_acheminement').cast(pl.String),
+                ])
+            )
+            if len(lot) >= taille_lot:
+                ecrire_lot()
+            nb_depuis_cache += depuis_cache
+            print(
+                f"[{n}/{len(prms)}] ✅ PRM {prm} : {resultats['turpe_total_eur'].min():,.2f} €/an "
+                f"({'cache' if depuis_cache else f'{duree:.1f} s'})",
+                flush=True,
+            )
+
+        if lot:
+            ecrire_lot()
+        if dossier_cache is not None:
+            print(f"♻️ {nb_depuis_cache} PRM relus depuis le cache de résultats", flush=True)
+        if writer is not None:
+            writer.close()
+            fichier_tmp.replace(sortie)
+        else:
+            print("⚠️ Aucun PRM optimisé : pas de fichier de résultats", flush=True)
+
+    return pl.DataFrame(erreurs, schema={'pdl': pl.String, 'erreur': pl.String, 'trace': pl.String})
+
+
+def main(argv: list[str] = None) -> int:
+    """Point d'entrée de la ligne de commande."""
+    parser = argparse.ArgumentParser(
+        prog='opti-c4-batch',
+        description="Optimisation TURPE d'un portefeuille de PRM à partir de courbes R63.",
+    )
+    parser.add_argument('sources', nargs='*', type=Path,
+                        help="Fichiers CSV R63 (nouvelles livraisons avec --entrepot)")
+    parser.add_argument('-o', '--sortie', type=Path, default=Path('resultats.parquet'),
+                        help="Fichier Parquet des résultats (défaut: resultats.parquet)")
+    parser.add_argument('--plages-hc', default='22h00-06h00', help="Plages HC (format Enedis)")
+    parser.add_argument('--plages-hc-saison-basse', default=None, help="Plages HC de saison basse")
+    parser.add_argument('--hc-jours-non-ouvres', action='store_true',
+                        help="Week-ends et jours fériés entièrement en heures creuses")
+    parser.add_argument('--methode-pmax', choices=METHODES_PMAX, default='brut',
+                        help="Méthodologie de pmax (défaut: pas natif de la courbe)")
+    parser.add_argument('--mode-index', choices=('exact', 'entier'), default='exact',
+                        help="Index de dépassement (défaut: exact)")
+    parser.add_argument('--pas-commun', type=int, default=None, metavar='MINUTES',
+                        help="Rééchantillonne les courbes à pas mixtes sur une grille commune (défaut: pas natif)")
+    parser.add_argument('--reechantillonnage', choices=REGLES_REECHANTILLONNAGE, default='moyenne',
+                        help="Règle de rééchantillonnage : moyenne (énergie conservée) ou pic (pics conservés)")
+    parser.add_argument('--p-min', type=int, default=3, help="Puissance minimale testée (kVA)")
+    parser.add_argument('--p-max', type=int, default=250, help="Puissance maximale testée (kVA)")
+    parser.add_argument('-j', '--processus', type=int, default=None,
+                        help="Taille du pool de processus (défaut: cœurs disponibles)")
+    parser.add_argument('--cache', type=Path, default=DOSSIER_CACHE_RESULTATS,
+                        help=f"Dossier du cache de résultats (défaut: {DOSSIER_CACHE_RESULTATS})")
+    parser.add_argument('--sans-cache', action='store_true',
+                        help="Tout recalculer sans lire ni écrire le cache de résultats")
+    parser.add_argument('--entrepot', type=Path, default=None,
+                        help="Entrepôt incrémental des courbes : ingère les sources puis optimise tous ses PRM")
+    parser.add_argument('--priorite', choices=PRIORITES_FUSION, default='ordre',
+                        help="Fichier retenu quand des sources se recouvrent : le dernier fourni (ordre, "
+                             "défaut) ou le plus récemment modifié (recente)")
+    args = parser.parse_args(argv)
+    if not args.sources and args.entrepot is None:
+        parser.error("au moins un fichier R63 est requis sans --entrepot")
+
+    parametres = ParametresOptimisation(
+        plages_hc=args.plages_hc,
+        plages_hc_saison_basse=args.plages_hc_saison_basse,
+        hc_jours_non_ouvres=args.hc_jours_non_ouvres,
+        methode_pmax=args.methode_pmax,
+        mode_index=args.mode_index,
+        p_min=args.p_min,
+        p_max=args.p_max,
+        pas_commun_minutes=args.pas_commun,
+        regle_reechantillonnage=args.reechantillonnage,
+    )
+    debut = time.perf_counter()
+    erreurs = optimiser_portefeuille(
+        args.sources,
+        args.sortie,
+        parametres,
+        nb_processus=args.processus,
+        dossier_cache=None if args.sans_cache else args.cache,
+        entrepot=args.entrepot,
+        priorite=args.priorite,
+    )
+
+    if len(erreurs):
+        fichier_erreurs = args.sortie.with_name(f"{args.sortie.stem}_erreurs.csv")
+        erreurs.write_csv(fichier_erreurs)
+        print(f"⚠️ {len(erreurs)} PRM en échec, détail dans {fichier_erreurs}", flush=True)
+    print(f"✅ Terminé en {time.perf_counter() - debut:.1f} s → {args.sortie}", flush=True)
+    return 1 if len(erreurs) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
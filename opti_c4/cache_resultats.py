@@ -0,0 +1,115 @@
+"""Cache persistant des résultats d'optimisation par PRM."""
+
+import dataclasses
+import hashlib
+import json
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+import polars as pl
+
+from opti_c4.courbe import evincer_cache_lru
+from opti_c4.fichiers import ecrire_parquet_atomique
+from opti_c4.pipeline import ParametresOptimisation, optimiser_courbe
+
+# Version du format des résultats en cache (à incrémenter si le calcul ou le schéma change)
+VERSION_CACHE_RESULTATS = 1
+
+
+def empreinte_courbe(courbe: pl.DataFrame) -> str:
+    """
+    SHA-256 du contenu d'une courbe PA typée, indépendant de l'ordre des lignes.
+
+    Args:
+        courbe: DataFrame avec 'Identifiant PRM', 'Horodate', 'Valeur', 'Pas'
+
+    Returns:
+        Empreinte hexadécimale
+    """
+    return hashlib.sha256(
+        courbe
+        .select(['Identifiant PRM', 'Horodate', 'Valeur', 'Pas'])
+        .sort(['Identifiant PRM', 'Horodate'])
+        .write_csv()
+        .encode()
+    ).hexdigest()
+
+
+def empreinte_regles_turpe(regles: pl.LazyFrame) -> str:
+    """SHA-256 de la table complète load_turpe_rules() : change à chaque mise à jour tarifaire."""
+    return hashlib.sha256(regles.collect().write_csv().encode()).hexdigest()
+
+
+def cle_resultats(empreinte: str, parametres: ParametresOptimisation, empreinte_regles: str) -> str:
+    """
+    Clé d'une optimisation : courbe, plages HC, plage de puissances, méthodologie de pmax
+    et version des règles TURPE.
+    """
+    description = json.dumps(
+        {
+            'version': VERSION_CACHE_RESULTATS,
+            'courbe': empreinte,
+            'parametres': dataclasses.asdict(parametres),
+            'regles_turpe': empreinte_regles,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def optimiser_courbe_avec_cache(
+    courbe: pl.DataFrame,
+    regles_turpe: pl.LazyFrame,
+    parametres: ParametresOptimisation = ParametresOptimisation(),
+    empreinte_regles: str = None,
+    dossier_cache: Path = Path.home() / '.cache' / 'opti-c4' / 'resultats',
+    taille_max_octets: int = 1024**3,
+    calculer: Callable[[], pl.DataFrame] = None,
+) -> tuple[pl.DataFrame, bool]:
+    """
+    optimiser_courbe mémorisé sur disque, une entrée Parquet par clé (cf. cle_resultats).
+
+    Principe :
+    - Une entrée n'est réutilisée que si la courbe, les paramètres et les règles TURPE
+      sont identiques : un mois sans nouvelle donnée ni évolution tarifaire ne recalcule rien
+    - Écriture dans un fichier temporaire puis rename atomique (processus concurrents)
+    - Éviction LRU (date de dernier accès) tant que le cache dépasse taille_max_octets
+
+    Args:
+        courbe: Courbe PA typée du PRM (matérialisée pour le calcul de l'empreinte)
+        regles_turpe: LazyFrame issu de load_turpe_rules()
+        parametres: Paramètres de l'optimisation
+        empreinte_regles: Empreinte des règles déjà calculée (défaut: calculée ici)
+        dossier_cache: Dossier du cache (créé si absent)
+        taille_max_octets: Taille totale maximale du cache (défaut: 1 Go)
+        calculer: Calcul en cas d'absence du cache (défaut: optimiser_courbe sur courbe),
+            ex: depuis les agrégats mensuels d'un EntrepotCourbes
+
+    Returns:
+        Tuple (résultats de tous les scénarios, True si lus depuis le cache)
+    """
+    dossier_cache.mkdir(parents=True, exist_ok=True)
+    cle = cle_resultats(
+        empreinte_courbe(courbe),
+        parametres,
+        empreinte_regles or empreinte_regles_turpe(regles_turpe),
+    )
+    fichier = dossier_cache / f"resultats_v{VERSION_CACHE_RESULTATS}_{cle}.parquet"
+
+    try:
+        # Cache hit : rafraîchir la date d'accès pour l'éviction LRU
+        os.utime(fichier)
+        return pl.read_parquet(fichier), True
+    except FileNotFoundError:
+        # Absente, ou évincée par un autre processus entre-temps : recalcul
+        pass
+
+    if calculer is None:
+        resultats = optimiser_courbe(courbe.lazy(), regles_turpe, parametres)
+    else:
+        resultats = calculer()
+    ecrire_parquet_atomique(resultats, fichier)
+    evincer_cache_lru(dossier_cache, taille_max_octets, proteger=fichier, motif='resultats_*.parquet')
+    return resultats, False
@@ -0,0 +1,231 @@
+"""Plages horaires et table calendrier des cadrans tarifaires (HPH, HCH, HPB, HCB)."""
+
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import polars as pl
+
+
+def parser_plages_horaires(plage_str: str) -> list[tuple[time, time]]:
+    """
+    Parse une chaîne de plages horaires format Enedis.
+
+    Format : "08h00-12h00;14h00-18h00"
+
+    Returns:
+        Liste de tuples (heure_debut, heure_fin)
+    """
+    if not plage_str or plage_str.strip() == '':
+        return []
+
+    plage_str = plage_str.replace(' ', '').replace('(', '').replace(')', '')
+    plages = []
+
+    for slot in plage_str.split(';'):
+        if '-' not in slot:
+            continue
+        start_str, end_str = slot.split('-')
+        start_time = datetime.strptime(start_str, '%Hh%M').time()
+        end_time = datetime.strptime(end_str, '%Hh%M').time()
+        plages.append((start_time, end_time))
+
+    return plages
+
+
+def jours_feries_france(annee_debut: int, annee_fin: int) -> list[date]:
+    """
+    Jours fériés en France métropolitaine, de annee_debut à annee_fin incluses.
+
+    Les fêtes mobiles (lundi de Pâques, Ascension, lundi de Pentecôte) sont
+    calculées depuis la date de Pâques (algorithme de Meeus/Jones/Butcher).
+    """
+    feries = []
+    for annee in range(annee_debut, annee_fin + 1):
+        a, b, c = annee % 19, annee // 100, annee % 100
+        d, e = b // 4, b % 4
+        f = (b + 8) // 25
+        g = (b - f + 1) // 3
+        h = (19 * a + b - d - g + 15) % 30
+        i, k = c // 4, c % 4
+        l = (32 + 2 * e + 2 * i - h - k) % 7
+        m = (a + 11 * h + 22 * l) // 451
+        mois_paques, jour_paques = divmod(h + l - 7 * m + 114, 31)
+        paques = date(annee, mois_paques, jour_paques + 1)
+
+        feries += [
+            date(annee, 1, 1), date(annee, 5, 1), date(annee, 5, 8), date(annee, 7, 14),
+            date(annee, 8, 15), date(annee, 11, 1), date(annee, 11, 11), date(annee, 12, 25),
+            paques + timedelta(days=1),
+            paques + timedelta(days=39),
+            paques + timedelta(days=50),
+        ]
+    return feries
+
+
+class CalendrierCadrans:
+    """
+    Table calendrier (profil, type de jour, mois, minute du jour) → cadran.
+
+    Le cadran de chaque minute de l'année est précalculé une fois en codes UInt8
+    (ordre de CADRANS) : la classification d'une courbe se réduit à calculer un
+    indice entier par ligne et à lire la table (un seul gather), au lieu d'une
+    chaîne de comparaisons dt.time() et d'une concaténation de chaînes.
+
+    La table couvre sans surcoût par ligne :
+    - des plages HC différentes en saison haute et en saison basse (TURPE 7)
+    - des jours non ouvrés (week-ends, fériés) entièrement en HC
+    - des plages propres à certains PRM (un profil par jeu de plages)
+
+    Les bornes des plages sont incluses, à la minute près.
+    """
+
+    CADRANS = ('HPH', 'HCH', 'HPB', 'HCB')
+    MINUTES_PAR_JOUR = 24 * 60
+    # Saison haute (H) : novembre à mars ; saison basse (B) : avril à octobre
+    MOIS_SAISON_HAUTE = (1, 2, 3, 11, 12)
+
+    def __init__(self, codes: np.ndarray, profils_prm: dict[str, int] = None, jours_feries: list[date] = None):
+        """
+        Args:
+            codes: Codes cadran UInt8 de forme [n_profils, 2 (ouvré, non ouvré), 12, 1440]
+            profils_prm: Profil de chaque PRM ayant des plages spécifiques (défaut : profil 0)
+            jours_feries: Jours traités comme non ouvrés en plus des week-ends
+        """
+        self.codes = codes
+        self.profils_prm = profils_prm or {}
+        self.jours_feries = jours_feries or []
+
+    @staticmethod
+    def masque_hc(plages: list[tuple[time, time]]) -> np.ndarray:
+        """Minutes du jour (0..1439) en heures creuses pour une liste de plages (début, fin)."""
+        minutes = np.arange(CalendrierCadrans.MINUTES_PAR_JOUR)
+        masque = np.zeros(CalendrierCadrans.MINUTES_PAR_JOUR, dtype=bool)
+        for debut, fin in plages:
+            d = debut.hour * 60 + debut.minute
+            f = fin.hour * 60 + fin.minute
+            if d < f:
+                # Plage normale (ex: 02h00-07h00)
+                masque |= (minutes >= d) & (minutes <= f)
+            else:
+                # Plage à cheval sur minuit (ex: 22h00-06h00)
+                masque |= (minutes >= d) | (minutes <= f)
+        return masque
+
+    @classmethod
+    def depuis_plages(
+        cls,
+        plages_hc: list[tuple[time, time]],
+        plages_hc_saison_basse: list[tuple[time, time]] = None,
+        hc_jours_non_ouvres: bool = False,
+    ) -> 'CalendrierCadrans':
+        """
+        Construit un calendrier à un seul profil.
+
+        Args:
+            plages_hc: Plages HC (toute l'année, ou saison haute si plages_hc_saison_basse est donné)
+            plages_hc_saison_basse: Plages HC d'avril à octobre, si différentes
+            hc_jours_non_ouvres: Week-ends et jours fériés entièrement en HC
+
+        Returns:
+            CalendrierCadrans
+        """
+        hc_haute = cls.masque_hc(plages_hc)
+        hc_basse = cls.masque_hc(plages_hc_saison_basse) if plages_hc_saison_basse is not None else hc_haute
+
+        codes = np.empty((1, 2, 12, cls.MINUTES_PAR_JOUR), dtype=np.uint8)
+        for mois in range(1, 13):
+            saison_haute = mois in cls.MOIS_SAISON_HAUTE
+            hp, hc = (cls.CADRANS.index('HPH'), cls.CADRANS.index('HCH')) if saison_haute else \
+                (cls.CADRANS.index('HPB'), cls.CADRANS.index('HCB'))
+            masque = hc_haute if saison_haute else hc_basse
+            codes[0, 0, mois - 1] = np.where(masque, hc, hp)
+            codes[0, 1, mois - 1] = hc if hc_jours_non_ouvres else codes[0, 0, mois - 1]
+
+        jours_feries = jours_feries_france(2000, 2100) if hc_jours_non_ouvres else None
+        return cls(codes, jours_feries=jours_feries)
+
+    @classmethod
+    def par_prm(cls, defaut: 'CalendrierCadrans', specifiques: dict[str, 'CalendrierCadrans']) -> 'CalendrierCadrans':
+        """
+        Assemble un calendrier par défaut et des calendriers propres à certains PRM.
+
+        Args:
+            defaut: Calendrier des PRM sans plages spécifiques (profil 0)
+            specifiques: Calendrier à un profil par PRM
+
+        Returns:
+            CalendrierCadrans à plusieurs profils
+        """
+        if not specifiques:
+            return defaut
+        prms = list(specifiques)
+        codes = np.concatenate([defaut.codes, *[specifiques[prm].codes for prm in prms]])
+        jours_feries = sorted(set(defaut.jours_feries).union(*[c.jours_feries for c in specifiques.values()]))
+        return cls(codes, {prm: i + 1 for i, prm in enumerate(prms)}, jours_feries)
+
+    @property
+    def cle(self) -> tuple:
+        """Clé hashable du calendrier (mémoïsation des agrégats par jeu de plages)."""
+        return (self.codes.tobytes(), tuple(sorted(self.profils_prm.items())), bool(self.jours_feries))
+
+    def _expr_indice(self) -> pl.Expr:
+        """Indice entier de chaque ligne dans la table aplatie [profil, type de jour, mois, minute]."""
+        n_mois_minutes = 12 * self.MINUTES_PAR_JOUR
+        horodate = pl.col('Horodate')
+        indice = (
+            (horodate.dt.month().cast(pl.Int64) - 1) * self.MINUTES_PAR_JOUR
+            + horodate.dt.hour().cast(pl.Int64) * 60
+            + horodate.dt.minute().cast(pl.Int64)
+        )
+        # Jour non ouvré : seulement si la table distingue les deux types de jour
+        if not np.array_equal(self.codes[:, 0], self.codes[:, 1]):
+            non_ouvre = (horodate.dt.weekday() >= 6) | horodate.dt.date().is_in(self.jours_feries)
+            indice = indice + non_ouvre.cast(pl.Int64) * n_mois_minutes
+        if self.profils_prm:
+            profil = (
+                pl.col('Identifiant PRM')
+                .cast(pl.String)
+                .replace_strict(
+                    list(self.profils_prm), list(self.profils_prm.values()),
+                    default=0, return_dtype=pl.Int64,
+                )
+            )
+            indice = indice + profil * 2 * n_mois_minutes
+        return indice
+
+    def expr_cadran(self) -> pl.Expr:
+        """
+        Expression Polars du cadran (pl.Enum de CADRANS) par lecture dans la table.
+
+        Utilise 'Horodate' et, si des profils par PRM existent, 'Identifiant PRM'.
+        """
+        table = pl.Series(np.array(self.CADRANS)[self.codes.ravel()], dtype=pl.Enum(self.CADRANS))
+        return pl.lit(table).gather(self._expr_indice())
+
+    @classmethod
+    def expr_masque_hc(cls, calendriers: list['CalendrierCadrans']) -> pl.Expr:
+        """
+        Expression Polars d'un masque UInt64 : bit k = heure creuse selon calendriers[k].
+
+        Les calendriers doivent partager les mêmes profils par PRM (mêmes plages spécifiques).
+
+        Raises:
+            ValueError: Si plus de 64 calendriers ou des profils par PRM différents
+        """
+        if len(calendriers) > 64:
+            raise ValueError("Au plus 64 jeux de plages HC par balayage")
+        if any(c.profils_prm != calendriers[0].profils_prm for c in calendriers):
+            raise ValueError("Les calendriers balayés doivent partager les mêmes profils par PRM")
+
+        codes_hc = np.array([cls.CADRANS.index('HCH'), cls.CADRANS.index('HCB')], dtype=np.uint8)
+        masques = np.zeros(calendriers[0].codes.shape, dtype=np.uint64)
+        for k, calendrier in enumerate(calendriers):
+            masques |= np.isin(calendrier.codes, codes_hc).astype(np.uint64) << np.uint64(k)
+
+        # Même indexation que les calendriers, jours non ouvrés distingués dès qu'un candidat le fait
+        support = cls(
+            masques,
+            calendriers[0].profils_prm,
+            sorted(set().union(*[c.jours_feries for c in calendriers])),
+        )
+        return pl.lit(pl.Series(masques.ravel(), dtype=pl.UInt64)).gather(support._expr_indice())
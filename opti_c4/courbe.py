@@ -0,0 +1,293 @@
+"""Lecture des courbes de charge R63, cache disque et pyramide des pics."""
+
+import hashlib
+import io
+import os
+from pathlib import Path
+
+import polars as pl
+
+from opti_c4.fichiers import ecrire_atomique
+
+# Version du format des courbes en cache (à incrémenter si le schéma change)
+VERSION_CACHE_COURBE = 1
+
+# Résolutions de la pyramide des pics (fenêtres de max / moyenne)
+RESOLUTIONS_PYRAMIDE = ('5m', '10m', '1h')
+
+# Règles de rééchantillonnage d'une courbe à pas mixtes sur une grille commune
+REGLES_REECHANTILLONNAGE = ('moyenne', 'pic')
+
+
+def expr_pas_heures() -> pl.Expr:
+    """
+    Expression Polars pour calculer le pas en heures à partir de la colonne 'Pas'.
+
+    Convertit 'PT5M' → 5/60 = 0.0833 heures
+
+    Returns:
+        Expression Polars du pas en heures
+    """
+    return (
+        pl.col('Pas')
+        .str.strip_prefix('PT')
+        .str.strip_suffix('M')
+        .cast(pl.Int32)
+        / 60.0
+    )
+
+
+def expr_volume() -> pl.Expr:
+    """
+    Expression Polars pour calculer le volume en kWh.
+
+    volume = Valeur (kW) × pas_heures (h)
+
+    Returns:
+        Expression Polars du volume en kWh
+    """
+    return pl.col('Valeur') * pl.col('pas_heures')
+
+
+def expr_pmax() -> pl.Expr:
+    """
+    Expression Polars pour estimer la puissance apparente en kVA.
+
+    pmax = Valeur (kW) × 1.10 (facteur de puissance supposé ≈ 0.91), arrondie au VA
+
+    Returns:
+        Expression Polars de la puissance apparente en kVA
+    """
+    return (pl.col('Valeur') * 1.10).round(3)
+
+
+def scanner_courbe_r63(source) -> pl.LazyFrame:
+    """
+    Scan lazy d'un export R63 : courbe PA typée, colonnes utiles uniquement.
+
+    Args:
+        source: Chemin, bytes ou flux binaire du CSV R63
+
+    Returns:
+        LazyFrame avec 'Identifiant PRM', 'Horodate' (Datetime), 'Valeur' (kW), 'Pas'
+    """
+    return (
+        pl.scan_csv(source, separator=';')
+        .filter(pl.col('Grandeur physique') == 'PA')
+        .select([
+            pl.col('Identifiant PRM'),
+            pl.col('Horodate').str.strptime(pl.Datetime, '%Y-%m-%d %H:%M:%S'),
+            (pl.col('Valeur') / 1000.0).alias('Valeur'),
+            pl.col('Pas'),
+        ])
+    )
+
+
+def reechantillonner_courbe(
+    courbe: pl.LazyFrame,
+    pas_minutes: int = 10,
+    regle: str = 'moyenne'
+) -> pl.LazyFrame:
+    """
+    Ramène une courbe à pas mixtes (ex: PT5M puis PT10M après un changement de compteur)
+    sur une grille commune de pas_minutes, en un seul group_by streaming.
+
+    Principe :
+    - Chaque mesure couvre [Horodate, Horodate + Pas) et est répartie sur les cellules de la
+      grille qu'elle recouvre (explode vectorisé), avec sa durée de recouvrement
+    - Le Pas d'une cellule est la durée réellement couverte : pleine, elle vaut pas_minutes ;
+      au bord d'un trou, elle n'en compte que la part mesurée (durées exactes en aval)
+    - Règle 'moyenne' : puissance moyenne pondérée par la durée (énergie conservée)
+    - Règle 'pic' : puissance maximale de la cellule (pics et dépassements conservés,
+      énergie majorée : à réserver à l'analyse des dépassements)
+
+    Args:
+        courbe: Courbe PA typée ('Identifiant PRM', 'Horodate', 'Valeur', 'Pas')
+        pas_minutes: Pas de la grille commune (minutes)
+        regle: 'moyenne' ou 'pic'
+
+    Returns:
+        LazyFrame ('Identifiant PRM', 'Horodate', 'Valeur', 'Pas'), trié par PRM et Horodate
+    """
+    if regle not in REGLES_REECHANTILLONNAGE:
+        raise ValueError(
+            f"Règle de rééchantillonnage inconnue : {regle!r} (attendu : {', '.join(REGLES_REECHANTILLONNAGE)})"
+        )
+
+    # Calculs entiers en microsecondes : début et fin de chaque mesure, taille de cellule
+    grille = pas_minutes * 60_000_000
+    debut = pl.col('Horodate').dt.epoch('us')
+    fin = debut + (pl.col('pas_heures') * 3_600_000_000).round().cast(pl.Int64)
+    debut_cellule = pl.col('cellule') * grille
+    recouvrement_us = (
+        pl.min_horizontal(pl.col('fin'), debut_cellule + grille)
+        - pl.max_horizontal(pl.col('debut'), debut_cellule)
+    )
+
+    if regle == 'moyenne':
+        # Une seule mesure dans la cellule (pas déjà sur la grille, ou plus long) : valeur inchangée
+        valeur = (
+            pl.when(pl.len() == 1)
+            .then(pl.col('Valeur').first())
+            .otherwise((pl.col('Valeur') * pl.col('recouvrement_us')).sum() / pl.col('recouvrement_us').sum())
+        )
+    else:
+        valeur = pl.col('Valeur').max()
+
+    return (
+        courbe
+        .select(['Identifiant PRM', 'Horodate', 'Valeur', expr_pas_heures().alias('pas_heures')])
+        .with_columns([debut.alias('debut'), fin.alias('fin')])
+        .with_columns(pl.int_ranges(pl.col('debut') // grille, (pl.col('fin') - 1) // grille + 1).alias('cellule'))
+        .explode('cellule')
+        .with_columns(recouvrement_us.alias('recouvrement_us'))
+        .group_by(['Identifiant PRM', 'cellule'])
+        .agg([
+            valeur.alias('Valeur'),
+            pl.col('recouvrement_us').sum(),
+        ])
+        .select([
+            'Identifiant PRM',
+            (pl.col('cellule') * grille).cast(pl.Datetime('us')).alias('Horodate'),
+            'Valeur',
+            pl.format('PT{}M', pl.col('recouvrement_us') // 60_000_000).alias('Pas'),
+        ])
+        .sort(['Identifiant PRM', 'Horodate'])
+    )
+
+
+def charger_courbe_avec_cache(
+    contenu: bytes,
+    dossier_cache: Path = Path.home() / '.cache' / 'opti-c4' / 'courbes',
+    taille_max_octets: int = 2 * 1024**3,
+) -> pl.LazyFrame:
+    """
+    Charge la courbe PA typée depuis un cache Arrow IPC adressé par contenu.
+
+    Principe :
+    - La clé est le SHA-256 des octets uploadés : un même fichier ré-uploadé
+      (ou une session redémarrée) ne repasse pas par le parsing CSV
+    - Le cache stocke la courbe déjà filtrée PA, Horodate parsée et Valeur en kW
+    - Les fichiers IPC non compressés sont relus en memory-map
+    - Éviction LRU (date de dernier accès) tant que le cache dépasse taille_max_octets
+
+    Args:
+        contenu: Octets du CSV R63
+        dossier_cache: Dossier du cache (créé si absent)
+        taille_max_octets: Taille totale maximale du cache (défaut: 2 Go)
+
+    Returns:
+        LazyFrame memory-mappé sur le fichier en cache
+    """
+
+    dossier_cache.mkdir(parents=True, exist_ok=True)
+    cle = hashlib.sha256(contenu).hexdigest()
+    fichier = dossier_cache / f"courbe_v{VERSION_CACHE_COURBE}_{cle}.arrow"
+
+    if fichier.exists():
+        # Cache hit : rafraîchir la date d'accès pour l'éviction LRU
+        os.utime(fichier)
+    else:
+        # Cache miss : écriture streaming dans un fichier temporaire puis rename atomique
+        courbe = scanner_courbe_r63(io.BytesIO(contenu))
+        ecrire_atomique(fichier, lambda chemin: courbe.sink_ipc(chemin, compression=None))
+        evincer_cache_lru(dossier_cache, taille_max_octets, proteger=fichier)
+
+    return pl.scan_ipc(fichier, memory_map=True)
+
+
+def evincer_cache_lru(
+    dossier_cache: Path,
+    taille_max_octets: int,
+    proteger: Path = None,
+    motif: str = 'courbe_*.arrow',
+) -> list[Path]:
+    """
+    Supprime les entrées les moins récemment utilisées jusqu'à repasser sous la taille max.
+
+    Args:
+        dossier_cache: Dossier du cache
+        taille_max_octets: Taille totale maximale autorisée
+        proteger: Fichier à ne jamais supprimer (entrée en cours d'utilisation)
+        motif: Motif glob des entrées du cache
+
+    Returns:
+        Liste des fichiers supprimés
+    """
+    # Plusieurs processus peuvent évincer en même temps (workers batch, sessions notebook) :
+    # une entrée supprimée par un autre entre le glob et le stat est simplement ignorée
+    entrees = []
+    for f in dossier_cache.glob(motif):
+        try:
+            stat = f.stat()
+        except FileNotFoundError:
+            continue
+        entrees.append((stat.st_mtime, stat.st_size, f))
+    entrees.sort(key=lambda entree: entree[0])
+    taille_totale = sum(taille for _, taille, _ in entrees)
+
+    supprimes = []
+    for _, taille, f in entrees:
+        if taille_totale <= taille_max_octets:
+            break
+        if proteger is not None and f == proteger:
+            continue
+        taille_totale -= taille
+        try:
+            f.unlink()
+        except FileNotFoundError:
+            continue
+        supprimes.append(f)
+
+    return supprimes
+
+
+def agreger_fenetres_pmax(cdc: pl.LazyFrame, resolution: str) -> pl.LazyFrame:
+    """
+    Niveau de la pyramide des pics : max et moyenne de pmax par fenêtre fixe, par PRM.
+
+    Les fenêtres sont des cases entières (Horodate tronquée à la résolution) : un simple
+    group_by, exécuté en streaming sans tri préalable de la courbe.
+
+    Args:
+        cdc: LazyFrame avec 'Identifiant PRM', 'Horodate', 'pmax' (kVA) et 'pas_heures'
+        resolution: Taille de fenêtre au format Polars ('5m', '10m', '1h')
+
+    Returns:
+        LazyFrame par fenêtre, dans un ordre quelconque : 'Horodate' (début), 'max',
+        'moyenne' et 'pas_heures' (durée couverte).
+        Indépendant des plages HC : le cadran est affecté ensuite sur l'horodate de début.
+    """
+    return (
+        cdc
+        .group_by([
+            'Identifiant PRM',
+            pl.col('Horodate').dt.truncate(resolution),
+        ])
+        .agg([
+            pl.col('pmax').max().alias('max'),
+            pl.col('pmax').mean().round(3).alias('moyenne'),
+            # Durée réellement couverte : une fenêtre plus fine que le pas vaut un pas
+            pl.col('pas_heures').sum(),
+        ])
+    )
+
+
+def compter_durees_par_pmax(cdc: pl.LazyFrame, colonne_pmax: str) -> pl.LazyFrame:
+    """
+    Durées par combinaison unique de (PRM, mois, cadran, pmax).
+
+    Args:
+        cdc: LazyFrame avec 'Identifiant PRM', 'Horodate', 'cadran', 'pas_heures' et colonne_pmax
+        colonne_pmax: Colonne utilisée comme pmax (ex: 'pmax', 'max', 'moyenne')
+
+    Returns:
+        LazyFrame ('Identifiant PRM', 'mois', 'cadran', 'pmax', 'duree_h')
+    """
+    return (
+        cdc
+        # Le mois est conservé pour la facturation mensuelle des dépassements
+        .with_columns(pl.col('Horodate').dt.truncate('1mo').dt.date().alias('mois'))
+        .group_by(['Identifiant PRM', 'mois', 'cadran', pl.col(colonne_pmax).alias('pmax')])
+        .agg(pl.col('pas_heures').sum().alias('duree_h'))
+    )
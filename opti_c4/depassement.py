@@ -0,0 +1,426 @@
+"""Index de dépassement : durées où la puissance excède un seuil, par PRM et cadran."""
+
+import numpy as np
+import polars as pl
+
+
+class IndexDepassement:
+    """
+    Index de dépassement trié (ExceedanceIndex) par (PRM, cadran).
+
+    Pour chaque couple (PRM, cadran), stocke en tableaux NumPy :
+    - pmax : valeurs de puissance distinctes, triées par ordre croissant
+    - depassement : heures cumulées où la puissance est ≥ pmax[i]
+      (colonne 'duree_depassement_h' de cdc)
+
+    La durée de dépassement pour un seuil P est alors la valeur de depassement
+    au premier indice i tel que pmax[i] > P, trouvé par searchsorted : un seul
+    appel vectorisé traite tous les seuils d'un (PRM, cadran) à la fois.
+    """
+
+    CADRANS = ('HPH', 'HCH', 'HPB', 'HCB')
+
+    def __init__(self, pmax: dict[tuple, np.ndarray], depassement: dict[tuple, np.ndarray]):
+        self._pmax = pmax
+        # Sentinelle 0.0 en fin de tableau : aucun pmax > seuil → aucun dépassement
+        self._depassement = {
+            cle: np.append(valeurs, 0.0) for cle, valeurs in depassement.items()
+        }
+
+    @classmethod
+    def depuis_cdc(cls, cdc: pl.DataFrame) -> 'IndexDepassement':
+        """
+        Construit l'index depuis le DataFrame cdc agrégé.
+
+        Args:
+            cdc: DataFrame avec colonnes 'Identifiant PRM', 'cadran', 'pmax', 'duree_depassement_h'
+
+        Returns:
+            IndexDepassement prêt pour les lookups
+        """
+        pmax = {}
+        depassement = {}
+        groupes = (
+            cdc
+            .select(['Identifiant PRM', 'cadran', 'pmax', 'duree_depassement_h'])
+            .sort(['Identifiant PRM', 'cadran', 'pmax'])
+            .partition_by(['Identifiant PRM', 'cadran'], as_dict=True)
+        )
+        for (prm, cadran), groupe in groupes.items():
+            pmax[(prm, cadran)] = groupe['pmax'].to_numpy()
+            depassement[(prm, cadran)] = groupe['duree_depassement_h'].to_numpy()
+        return cls(pmax, depassement)
+
+    def duree_depassement(self, pdl, cadran: str, seuils: np.ndarray) -> np.ndarray:
+        """
+        Heures de dépassement d'un (PRM, cadran) pour un tableau de seuils (kVA).
+
+        Sémantique identique au filtre historique : somme des durées où pmax > seuil.
+        """
+        seuils = np.asarray(seuils, dtype=np.float64)
+        pmax = self._pmax.get((pdl, cadran))
+        if pmax is None:
+            return np.zeros(seuils.shape)
+        return self._depassement[(pdl, cadran)][np.searchsorted(pmax, seuils, side='right')]
+
+    def duree_depassement_scenarios(self, scenarios: pl.DataFrame) -> pl.Series:
+        """
+        Durée totale de dépassement (somme des 4 cadrans) pour chaque scénario.
+
+        Args:
+            scenarios: DataFrame avec colonnes 'pdl' et 'puissance_{hph,hch,hpb,hcb}_kva'
+
+        Returns:
+            Série 'duree_depassement_h' alignée sur les lignes de scenarios
+        """
+        total = np.zeros(scenarios.height)
+        groupes = (
+            scenarios
+            .select(['pdl', *[f'puissance_{c.lower()}_kva' for c in self.CADRANS]])
+            .with_row_index('_ligne')
+            .partition_by('pdl', as_dict=True)
+        )
+        for (pdl,), groupe in groupes.items():
+            lignes = groupe['_ligne'].to_numpy()
+            for cadran in self.CADRANS:
+                seuils = groupe[f'puissance_{cadran.lower()}_kva'].to_numpy()
+                total[lignes] += self.duree_depassement(pdl, cadran, seuils)
+        return pl.Series('duree_depassement_h', total, dtype=pl.Float64)
+
+
+class IndexDepassementMensuel:
+    """
+    Index de dépassement trié par (PRM, mois, cadran).
+
+    Même structure que IndexDepassement avec une dimension mois en plus : la
+    CMDPS est facturée mois par mois, il faut donc les heures de dépassement
+    de chaque mois et non seulement leur total annuel.
+    """
+
+    CADRANS = ('HPH', 'HCH', 'HPB', 'HCB')
+
+    def __init__(self, mois: list, pmax: dict[tuple, np.ndarray], depassement: dict[tuple, np.ndarray]):
+        self.mois = mois
+        self._pmax = pmax
+        # Sentinelle 0.0 : aucun pmax > seuil → aucun dépassement
+        self._depassement = {
+            cle: np.append(valeurs, 0.0) for cle, valeurs in depassement.items()
+        }
+
+    @classmethod
+    def depuis_cdc_mensuelle(cls, cdc_mensuelle: pl.DataFrame) -> 'IndexDepassementMensuel':
+        """
+        Construit l'index depuis le DataFrame cdc_mensuelle agrégé.
+
+        Args:
+            cdc_mensuelle: DataFrame avec colonnes 'Identifiant PRM', 'mois', 'cadran', 'pmax',
+                'duree_depassement_h'
+
+        Returns:
+            IndexDepassementMensuel prêt pour les lookups
+        """
+        mois = cdc_mensuelle['mois'].unique().sort().to_list()
+        pmax = {}
+        depassement = {}
+        groupes = (
+            cdc_mensuelle
+            .select(['Identifiant PRM', 'mois', 'cadran', 'pmax', 'duree_depassement_h'])
+            .sort(['Identifiant PRM', 'mois', 'cadran', 'pmax'])
+            .partition_by(['Identifiant PRM', 'mois', 'cadran'], as_dict=True)
+        )
+        for (prm, m, cadran), groupe in groupes.items():
+            pmax[(prm, m, cadran)] = groupe['pmax'].to_numpy()
+            depassement[(prm, m, cadran)] = groupe['duree_depassement_h'].to_numpy()
+        return cls(mois, pmax, depassement)
+
+    def duree_depassement_mensuelle(self, scenarios: pl.DataFrame) -> np.ndarray:
+        """
+        Heures de dépassement par mois et par cadran pour chaque scénario.
+
+        Args:
+            scenarios: DataFrame avec colonnes 'pdl' et 'puissance_{hph,hch,hpb,hcb}_kva'
+
+        Returns:
+            Tableau [n_scenarios, n_mois, 4] aligné sur les lignes de scenarios,
+            mois dans l'ordre de self.mois et cadrans dans l'ordre de CADRANS
+        """
+        durees = np.zeros((scenarios.height, len(self.mois), len(self.CADRANS)))
+        groupes = (
+            scenarios
+            .select(['pdl', *[f'puissance_{c.lower()}_kva' for c in self.CADRANS]])
+            .with_row_index('_ligne')
+            .partition_by('pdl', as_dict=True)
+        )
+        for (pdl,), groupe in groupes.items():
+            lignes = groupe['_ligne'].to_numpy()
+            for k, cadran in enumerate(self.CADRANS):
+                seuils = groupe[f'puissance_{cadran.lower()}_kva'].cast(pl.Float64).to_numpy()
+                for m, mois in enumerate(self.mois):
+                    pmax = self._pmax.get((pdl, mois, cadran))
+                    if pmax is None:
+                        continue
+                    durees[lignes, m, k] = self._depassement[(pdl, mois, cadran)][
+                        np.searchsorted(pmax, seuils, side='right')
+                    ]
+        return durees
+
+
+class CubeDepassementMensuel:
+    """
+    Cube de dépassement (PRM, mois, cadran, kVA entier) pour le bilan mensuel.
+
+    Extension mensuelle de HistogrammeDepassement :
+    depassement[prm, mois, cadran, s] = heures du mois où pmax > s, pour s = 0..puissance_max_kva.
+    Construit depuis cdc_mensuelle (même scan que cdc), il donne le bilan mensuel
+    de n'importe quelle configuration, actuelle ou candidate, par simple indexage.
+
+    Taille fixe : les points au-delà de puissance_max_kva sont rangés dans la dernière
+    case, le cube reste exact pour tout seuil ≤ puissance_max_kva (cf. HistogrammeDepassement).
+
+    Mémoire : n_mois × 4 × (puissance_max_kva + 1) × 8 octets par PRM
+    (≈ 96 Ko pour 12 mois et 250 kVA).
+    """
+
+    CADRANS = ('HPH', 'HCH', 'HPB', 'HCB')
+
+    def __init__(self, pdls: list, mois: list, depassement: np.ndarray):
+        self._lignes = {pdl: i for i, pdl in enumerate(pdls)}
+        self.mois = mois
+        self._depassement = depassement
+
+    @property
+    def puissance_max_kva(self) -> int:
+        return self._depassement.shape[3] - 1
+
+    @classmethod
+    def depuis_cdc_mensuelle(
+        cls,
+        cdc_mensuelle: pl.DataFrame,
+        puissance_max_kva: int = 250
+    ) -> 'CubeDepassementMensuel':
+        """
+        Construit le cube depuis le DataFrame cdc_mensuelle agrégé.
+
+        Args:
+            cdc_mensuelle: DataFrame avec colonnes 'Identifiant PRM', 'mois', 'cadran', 'pmax', 'duree_h'
+            puissance_max_kva: Plus grand seuil entier exact (défaut: 250 kVA, plafond C4)
+
+        Returns:
+            CubeDepassementMensuel prêt pour les lookups
+        """
+        pdls = cdc_mensuelle['Identifiant PRM'].unique(maintain_order=True).to_list()
+        mois = cdc_mensuelle['mois'].unique().sort().to_list()
+
+        cases = (
+            cdc_mensuelle
+            .select([
+                pl.col('Identifiant PRM')
+                  .replace_strict(pdls, list(range(len(pdls))), return_dtype=pl.Int64)
+                  .alias('ligne'),
+                pl.col('mois')
+                  .replace_strict(mois, list(range(len(mois))), return_dtype=pl.Int64)
+                  .alias('mois'),
+                pl.col('cadran')
+                  .replace_strict(list(cls.CADRANS), list(range(len(cls.CADRANS))), return_dtype=pl.Int64)
+                  .alias('cadran'),
+                # Case ceil(pmax) - 1 : les pmax ≤ 0 ne dépassent aucun seuil ≥ 0
+                (pl.col('pmax').ceil() - 1).clip(upper_bound=puissance_max_kva).cast(pl.Int64).alias('case'),
+                pl.col('duree_h'),
+            ])
+            .filter(pl.col('case') >= 0)
+        )
+
+        histogramme = np.zeros((len(pdls), len(mois), len(cls.CADRANS), puissance_max_kva + 1))
+        np.add.at(
+            histogramme,
+            (
+                cases['ligne'].to_numpy(),
+                cases['mois'].to_numpy(),
+                cases['cadran'].to_numpy(),
+                cases['case'].to_numpy(),
+            ),
+            cases['duree_h'].to_numpy(),
+        )
+
+        # Cumul décroissant : depassement[..., s] = Σ durées des cases ≥ s
+        depassement = np.flip(np.flip(histogramme, axis=3).cumsum(axis=3), axis=3)
+        return cls(pdls, mois, depassement)
+
+    def duree_depassement_mensuelle(self, scenarios: pl.DataFrame) -> np.ndarray:
+        """
+        Heures de dépassement par mois et par cadran pour chaque scénario.
+
+        Args:
+            scenarios: DataFrame avec colonnes 'pdl' et 'puissance_{hph,hch,hpb,hcb}_kva' (kVA entiers)
+
+        Returns:
+            Tableau [n_scenarios, n_mois, 4] aligné sur les lignes de scenarios,
+            mois dans l'ordre de self.mois et cadrans dans l'ordre de CADRANS
+
+        Raises:
+            ValueError: Si une puissance n'est pas un kVA entier positif
+        """
+        lignes = (
+            scenarios['pdl']
+            .cast(pl.String)
+            .replace_strict(list(self._lignes), list(self._lignes.values()), default=-1, return_dtype=pl.Int64)
+            .to_numpy()
+        )
+        seuils = scenarios.select(
+            [f'puissance_{c.lower()}_kva' for c in self.CADRANS]
+        ).cast(pl.Float64).to_numpy()
+        if np.any(seuils != np.round(seuils)):
+            raise ValueError("Le cube de dépassement n'accepte que des puissances entières (kVA)")
+        if np.any(seuils < 0):
+            raise ValueError("Le cube de dépassement n'accepte pas de puissances négatives")
+        # Au-delà de la taille du cube : dernière case (heures au-delà de puissance_max_kva)
+        seuils = np.minimum(seuils, self.puissance_max_kva).astype(np.int64)
+
+        # Indexage avancé : [n, 1, 4] × [1, n_mois, 1] × [1, 1, 4] × [n, 1, 4] → [n, n_mois, 4]
+        durees = self._depassement[
+            np.maximum(lignes, 0)[:, None, None],
+            np.arange(len(self.mois))[None, :, None],
+            np.arange(len(self.CADRANS))[None, None, :],
+            seuils[:, None, :],
+        ]
+        durees[lignes < 0] = 0.0
+        return durees
+
+    def bilan_mensuel(self, scenarios: pl.DataFrame, cout_mensuel: np.ndarray = None) -> pl.DataFrame:
+        """
+        Bilan mensuel des dépassements au format long, un bloc par scénario.
+
+        Args:
+            scenarios: DataFrame avec colonnes 'pdl' et 'puissance_{hph,hch,hpb,hcb}_kva'
+            cout_mensuel: Coûts [n_scenarios, n_mois, 4] (cf. NoyauTurpe.cout_depassement_mensuel)
+
+        Returns:
+            DataFrame (scenario, mois, cadran, heures_depassement, cout_depassement_eur)
+        """
+        durees = self.duree_depassement_mensuelle(scenarios)
+        if cout_mensuel is None:
+            cout_mensuel = np.zeros(durees.shape)
+        n, n_mois, n_cadrans = durees.shape
+        return pl.DataFrame({
+            'scenario': np.repeat(np.arange(n), n_mois * n_cadrans),
+            'mois': pl.Series(self.mois, dtype=pl.Date).gather(np.tile(np.repeat(np.arange(n_mois), n_cadrans), n)),
+            'cadran': np.tile(np.array(self.CADRANS), n * n_mois),
+            'heures_depassement': durees.ravel(),
+            'cout_depassement_eur': cout_mensuel.ravel(),
+        })
+
+
+class HistogrammeDepassement:
+    """
+    Histogramme de dépassement quantifié au kVA entier, par (PRM, cadran).
+
+    Les puissances souscrites étant toujours des kVA entiers, on stocke pour chaque
+    PRM un tableau de taille fixe (4 cadrans × puissance_max_kva + 1) :
+    depassement[prm, cadran, s] = heures où pmax > s, pour s = 0..puissance_max_kva.
+
+    Exactitude : pour un seuil entier s, pmax > s ⟺ ceil(pmax) - 1 ≥ s. Chaque point
+    est donc rangé dans la case min(ceil(pmax) - 1, puissance_max_kva), puis un cumul
+    décroissant donne le tableau de dépassement : le lookup est un simple indexage,
+    exact pour tout seuil ≤ puissance_max_kva. Un seuil supérieur est ramené à la
+    dernière case (heures au-delà de puissance_max_kva, majorant) : la taille ne
+    dépend pas des pmax observés, un PRM aberrant n'agrandit pas les autres.
+
+    Mémoire : (puissance_max_kva + 1) × 4 × 8 octets par PRM (≈ 8 Ko pour 250 kVA),
+    indépendamment de la longueur ou du pas de la courbe.
+    """
+
+    CADRANS = ('HPH', 'HCH', 'HPB', 'HCB')
+
+    def __init__(self, pdls: list, depassement: np.ndarray):
+        self._lignes = {pdl: i for i, pdl in enumerate(pdls)}
+        self._depassement = depassement
+
+    @property
+    def puissance_max_kva(self) -> int:
+        return self._depassement.shape[2] - 1
+
+    @classmethod
+    def depuis_cdc(cls, cdc: pl.DataFrame, puissance_max_kva: int = 250) -> 'HistogrammeDepassement':
+        """
+        Construit l'histogramme depuis le DataFrame cdc agrégé.
+
+        Args:
+            cdc: DataFrame avec colonnes 'Identifiant PRM', 'cadran', 'pmax', 'duree_h'
+            puissance_max_kva: Plus grand seuil entier exact (défaut: 250 kVA, plafond C4)
+
+        Returns:
+            HistogrammeDepassement prêt pour les lookups
+        """
+        pdls = cdc['Identifiant PRM'].unique(maintain_order=True).to_list()
+
+        cases = (
+            cdc
+            .select([
+                pl.col('Identifiant PRM')
+                  .replace_strict(pdls, list(range(len(pdls))), return_dtype=pl.Int64)
+                  .alias('ligne'),
+                pl.col('cadran')
+                  .replace_strict(list(cls.CADRANS), list(range(len(cls.CADRANS))), return_dtype=pl.Int64)
+                  .alias('cadran'),
+                # Case ceil(pmax) - 1 : les pmax ≤ 0 ne dépassent aucun seuil ≥ 0
+                (pl.col('pmax').ceil() - 1).clip(upper_bound=puissance_max_kva).cast(pl.Int64).alias('case'),
+                pl.col('duree_h'),
+            ])
+            .filter(pl.col('case') >= 0)
+        )
+
+        histogramme = np.zeros((len(pdls), len(cls.CADRANS), puissance_max_kva + 1))
+        np.add.at(
+            histogramme,
+            (cases['ligne'].to_numpy(), cases['cadran'].to_numpy(), cases['case'].to_numpy()),
+            cases['duree_h'].to_numpy(),
+        )
+
+        # Cumul décroissant : depassement[..., s] = Σ durées des cases ≥ s
+        depassement = np.flip(np.flip(histogramme, axis=2).cumsum(axis=2), axis=2)
+        return cls(pdls, depassement)
+
+    def _verifier_seuils(self, seuils: np.ndarray) -> np.ndarray:
+        seuils = np.asarray(seuils, dtype=np.float64)
+        if np.any(seuils != np.round(seuils)):
+            raise ValueError("L'histogramme de dépassement n'accepte que des puissances entières (kVA)")
+        if np.any(seuils < 0):
+            raise ValueError("L'histogramme de dépassement n'accepte pas de puissances négatives")
+        # Au-delà de la taille de l'histogramme : dernière case (heures au-delà de puissance_max_kva)
+        return np.minimum(seuils, self.puissance_max_kva).astype(np.int64)
+
+    def duree_depassement(self, pdl, cadran: str, seuils: np.ndarray) -> np.ndarray:
+        """Heures de dépassement d'un (PRM, cadran) pour un tableau de seuils entiers (kVA)."""
+        seuils = self._verifier_seuils(seuils)
+        ligne = self._lignes.get(pdl)
+        if ligne is None:
+            return np.zeros(seuils.shape)
+        return self._depassement[ligne, self.CADRANS.index(cadran), seuils]
+
+    def duree_depassement_scenarios(self, scenarios: pl.DataFrame) -> pl.Series:
+        """
+        Durée totale de dépassement (somme des 4 cadrans) pour chaque scénario.
+
+        Args:
+            scenarios: DataFrame avec colonnes 'pdl' et 'puissance_{hph,hch,hpb,hcb}_kva'
+
+        Returns:
+            Série 'duree_depassement_h' alignée sur les lignes de scenarios
+        """
+        lignes = (
+            scenarios['pdl']
+            .replace_strict(list(self._lignes), list(self._lignes.values()), default=-1, return_dtype=pl.Int64)
+            .to_numpy()
+        )
+        seuils = self._verifier_seuils(
+            scenarios
+            .select([f'puissance_{c.lower()}_kva' for c in self.CADRANS])
+            .to_numpy()
+        )
+
+        connus = lignes >= 0
+        total = np.zeros(scenarios.height)
+        total[connus] = self._depassement[
+            lignes[connus, None], np.arange(len(self.CADRANS))[None, :], seuils[connus]
+        ].sum(axis=1)
+        return pl.Series('duree_depassement_h', total, dtype=pl.Float64)
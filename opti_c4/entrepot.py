@@ -0,0 +1,252 @@
+"""Entrepôt incrémental des courbes de charge : une tranche Parquet par (PRM, mois)."""
+
+import hashlib
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import polars as pl
+
+from opti_c4.agregats import construire_energies_agregees
+from opti_c4.calendrier import CalendrierCadrans
+from opti_c4.fichiers import ecrire_parquet_atomique
+from opti_c4.pipeline import ClassificationCourbe, preparer_courbe, requetes_par_cadran
+
+# Version du format des agrégats mensuels (à incrémenter si leur calcul change)
+VERSION_AGREGATS_MENSUELS = 2
+
+# Colonnes de la courbe PA typée conservées dans l'entrepôt
+COLONNES_COURBE = ['Identifiant PRM', 'Horodate', 'Valeur', 'Pas']
+
+
+class EntrepotCourbes:
+    """
+    Entrepôt append-only des courbes PA typées, partitionné par PRM et par mois.
+
+    Disposition :
+        racine/courbes/prm=<PRM>/<AAAA-MM>.parquet
+        racine/agregats/v<version>_<calendrier>/prm=<PRM>/<AAAA-MM>_{energies,durees,dates}.parquet
+
+    - Une livraison ne réécrit que les tranches (PRM, mois) qu'elle touche, dédoublonnées
+      sur (PRM, Horodate) : la livraison la plus récente l'emporte
+    - Les agrégats d'une tranche (énergies par cadran, durées par pmax de chaque
+      méthodologie, première et dernière mesure par PRM) sont mémorisés par calendrier et invalidés quand la tranche change
+    - La vue glissante de 12 mois ne lit que les tranches de la période ; seul le mois
+      de début, coupé par la fenêtre, est réagrégé à chaque fois
+    """
+
+    def __init__(self, racine: Path):
+        self.racine = Path(racine)
+
+    def _dossier_courbes(self, prm) -> Path:
+        return self.racine / 'courbes' / f'prm={prm}'
+
+    def _fichier_tranche(self, prm, mois: date) -> Path:
+        return self._dossier_courbes(prm) / f'{mois:%Y-%m}.parquet'
+
+    def _dossier_agregats(self, prm, calendrier: CalendrierCadrans) -> Path:
+        empreinte = hashlib.sha256(repr(calendrier.cle).encode()).hexdigest()[:16]
+        return self.racine / 'agregats' / f'v{VERSION_AGREGATS_MENSUELS}_{empreinte}' / f'prm={prm}'
+
+    def ingerer(self, courbe: pl.LazyFrame) -> pl.DataFrame:
+        """
+        Fusionne une livraison dans l'entrepôt.
+
+        Args:
+            courbe: Courbe PA typée (cf. scanner_courbe_r63), un ou plusieurs PRM
+
+        Returns:
+            DataFrame par tranche touchée : 'Identifiant PRM', 'mois', 'lignes_livrees',
+            'lignes_ajoutees' (nouveaux horodates) et 'modifiee' (tranche réécrite)
+        """
+        livraison = (
+            courbe
+            .select(COLONNES_COURBE)
+            .with_columns(pl.col('Horodate').dt.truncate('1mo').dt.date().alias('mois'))
+            .collect()
+        )
+
+        bilan = []
+        for (prm, mois), tranche in livraison.partition_by(['Identifiant PRM', 'mois'], as_dict=True).items():
+            tranche = tranche.drop('mois')
+            fichier = self._fichier_tranche(prm, mois)
+            existant = pl.read_parquet(fichier) if fichier.exists() else tranche.clear()
+
+            # Dédoublonnage (PRM, Horodate) : la livraison, placée en dernier, l'emporte
+            fusion = (
+                pl.concat([existant, tranche.cast(existant.schema)])
+                .unique(['Identifiant PRM', 'Horodate'], keep='last', maintain_order=True)
+                .sort('Horodate')
+            )
+            modifiee = not fusion.equals(existant)
+            if modifiee:
+                ecrire_parquet_atomique(fusion, fichier)
+                self._invalider_agregats(prm, mois)
+
+            bilan.append({
+                'Identifiant PRM': prm,
+                'mois': mois,
+                'lignes_livrees': tranche.height,
+                'lignes_ajoutees': fusion.height - existant.height,
+                'modifiee': modifiee,
+            })
+
+        return pl.DataFrame(bilan).sort(['Identifiant PRM', 'mois']) if bilan else pl.DataFrame()
+
+    def _invalider_agregats(self, prm, mois: date):
+        """Supprime les agrégats mémorisés d'une tranche, pour tous les calendriers."""
+        for dossier in (self.racine / 'agregats').glob(f'*/prm={prm}'):
+            for fichier in dossier.glob(f'{mois:%Y-%m}_*.parquet'):
+                fichier.unlink(missing_ok=True)
+
+    def prms(self) -> list[str]:
+        """PRM présents dans l'entrepôt."""
+        return sorted(d.name.removeprefix('prm=') for d in (self.racine / 'courbes').glob('prm=*'))
+
+    def mois(self, prm) -> list[date]:
+        """Mois disponibles pour un PRM, dans l'ordre chronologique."""
+        return sorted(
+            datetime.strptime(f.stem, '%Y-%m').date()
+            for f in self._dossier_courbes(prm).glob('*.parquet')
+        )
+
+    def scanner(self, prm, mois: list[date] = None) -> pl.LazyFrame:
+        """Scan lazy des tranches d'un PRM (toutes par défaut)."""
+        mois = self.mois(prm) if mois is None else mois
+        return pl.scan_parquet([self._fichier_tranche(prm, m) for m in mois])
+
+    def periode_glissante(self, prm, duree_analyse: timedelta = timedelta(days=365)) -> tuple:
+        """
+        Période d'analyse jusqu'à la dernière mesure, comme analyser_courbe.
+
+        Returns:
+            Tuple (date_debut, date_fin, mois couverts)
+        """
+        mois = self.mois(prm)
+        if not mois:
+            raise ValueError(f"PRM {prm} absent de l'entrepôt {self.racine}")
+        # Dernière mesure : seule la tranche la plus récente est lue
+        date_fin = self.scanner(prm, mois[-1:]).select(pl.col('Horodate').max()).collect().item()
+        date_debut = date_fin - duree_analyse
+        premier_mois = date_debut.date().replace(day=1)
+        return date_debut, date_fin, [m for m in mois if m >= premier_mois]
+
+    def vue_glissante(self, prm, duree_analyse: timedelta = timedelta(days=365)) -> pl.LazyFrame:
+        """Courbe des 12 derniers mois d'un PRM, sans lire les tranches antérieures."""
+        date_debut, date_fin, mois = self.periode_glissante(prm, duree_analyse)
+        return (
+            self.scanner(prm, mois)
+            .filter(
+                (pl.col('Horodate') >= date_debut) &
+                (pl.col('Horodate') <= date_fin)
+            )
+        )
+
+    def _agreger_tranche(self, courbe: pl.LazyFrame, calendrier: CalendrierCadrans) -> tuple:
+        """
+        Agrégats additifs d'une tranche d'au plus un mois, en un seul scan de la tranche.
+
+        Sans diagnostic de qualité ni détection des trous (cf. analyser_courbe) : seuls les
+        agrégats de la classification et les dates de mesure sont calculés.
+
+        Returns:
+            Tuple (énergies par cadran, durées par méthodologie, dates par PRM
+            ('Identifiant PRM', 'date_debut', 'date_fin'))
+        """
+        courbe, fenetres_pyramide = preparer_courbe(courbe)
+        lf_energies, lf_methodes = requetes_par_cadran(courbe, fenetres_pyramide, calendrier)
+        lf_dates = (
+            courbe
+            .group_by('Identifiant PRM')
+            .agg([
+                pl.col('Horodate').min().alias('date_debut'),
+                pl.col('Horodate').max().alias('date_fin'),
+            ])
+        )
+        dates, energies, *durees = pl.collect_all(
+            [lf_dates, lf_energies, *lf_methodes.values()],
+            engine='streaming',
+        )
+        return energies, dict(zip(lf_methodes, durees)), dates
+
+    def _agregats_tranche(self, prm, mois: date, calendrier: CalendrierCadrans) -> tuple:
+        """Agrégats d'une tranche complète, relus depuis l'entrepôt ou calculés puis mémorisés."""
+        dossier = self._dossier_agregats(prm, calendrier)
+        fichier_energies = dossier / f'{mois:%Y-%m}_energies.parquet'
+        fichier_durees = dossier / f'{mois:%Y-%m}_durees.parquet'
+        fichier_dates = dossier / f'{mois:%Y-%m}_dates.parquet'
+
+        if fichier_energies.exists() and fichier_durees.exists() and fichier_dates.exists():
+            durees = pl.read_parquet(fichier_durees)
+            return pl.read_parquet(fichier_energies), {
+                methode: df.drop('methode')
+                for (methode,), df in durees.partition_by('methode', as_dict=True).items()
+            }, pl.read_parquet(fichier_dates)
+
+        energies, durees_par_methode, dates = self._agreger_tranche(self.scanner(prm, [mois]), calendrier)
+        ecrire_parquet_atomique(energies, fichier_energies)
+        ecrire_parquet_atomique(dates, fichier_dates)
+        ecrire_parquet_atomique(
+            pl.concat([
+                df.with_columns(pl.lit(methode).alias('methode'))
+                for methode, df in durees_par_methode.items()
+            ]),
+            fichier_durees,
+        )
+        return energies, durees_par_methode, dates
+
+    def classifier(
+        self,
+        prm,
+        calendrier: CalendrierCadrans,
+        duree_analyse: timedelta = timedelta(days=365)
+    ) -> ClassificationCourbe:
+        """
+        Agrégats de la vue glissante, équivalents à classifier_courbe(analyser_courbe(...)).
+
+        Les mois complets de la période sont relus depuis les agrégats mémorisés ; seul le
+        premier mois, coupé par la fenêtre, est réagrégé depuis la courbe. Les dates de
+        mesure par PRM se déduisent des dates de chaque tranche, sans relire la vue glissante.
+
+        Args:
+            prm: PRM de l'entrepôt
+            calendrier: Calendrier des cadrans (plages HC)
+            duree_analyse: Durée de la période analysée, jusqu'à la dernière mesure
+
+        Returns:
+            ClassificationCourbe
+        """
+        date_debut, date_fin, mois = self.periode_glissante(prm, duree_analyse)
+
+        tranches = []
+        for m in mois:
+            if datetime.combine(m, datetime.min.time()) < date_debut:
+                # Mois coupé par la fenêtre glissante : agrégé à la volée, jamais mémorisé
+                tranches.append(self._agreger_tranche(
+                    self.scanner(prm, [m]).filter(pl.col('Horodate') >= date_debut),
+                    calendrier,
+                ))
+            else:
+                tranches.append(self._agregats_tranche(prm, m, calendrier))
+
+        # Énergies additives par (PRM, cadran) ; durées déjà ventilées par mois
+        energies_par_cadran = (
+            pl.concat([energies for energies, _, _ in tranches])
+            .group_by(['Identifiant PRM', 'cadran'])
+            .agg(pl.col('energie_kwh').sum())
+        )
+        durees_par_methode = {
+            methode: pl.concat([durees[methode] for _, durees, _ in tranches])
+            for methode in tranches[0][1]
+        }
+        dates_par_pdl = (
+            pl.concat([dates for _, _, dates in tranches])
+            .group_by('Identifiant PRM')
+            .agg([
+                pl.col('date_debut').min(),
+                pl.col('date_fin').max(),
+            ])
+        )
+        return ClassificationCourbe(
+            energies_agregees=construire_energies_agregees(energies_par_cadran, dates_par_pdl),
+            durees_par_methode=durees_par_methode,
+        )
@@ -0,0 +1,191 @@
+"""Exports des flux M-2 et M-6 : partitions CSV et Parquet, consolidation du plus récent par PRM."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import polars as pl
+
+from opti_c4.archives import scanner_extraction
+from opti_c4.fichiers import ecrire_atomique, ecrire_parquet_atomique
+
+# Formats d'export : CSV attendu par les outils en aval, Parquet zstd compact et typé
+FORMATS_EXPORT = ('csv', 'parquet')
+
+
+def _ecrire_partition(df: pl.DataFrame, fichier: Path, format_export: str, separateur: str):
+    """Écrit une partition de façon atomique (cf. ecrire_atomique)."""
+    if format_export == 'csv':
+        ecrire_atomique(fichier, lambda chemin: df.write_csv(chemin, separator=separateur))
+    else:
+        ecrire_parquet_atomique(df, fichier)
+
+
+def exporter_partitions(
+    df: pl.DataFrame,
+    colonne: str,
+    dossier: Path,
+    prefixe: str,
+    formats: tuple[str, ...] = ('csv',),
+    separateur: str = ';',
+    nb_threads: int = None
+) -> pl.DataFrame:
+    """
+    Exporte un fichier <prefixe>_<valeur>.<format> par valeur de colonne, en une passe.
+
+    Principe :
+    - partition_by découpe les données en une seule passe (au lieu d'un filtre
+      par valeur, qui relit toutes les lignes à chaque partition)
+    - Les partitions sont écrites en parallèle sur un pool de threads : les écritures
+      Polars libèrent le GIL
+    - Chaque fichier est écrit dans un fichier temporaire puis renommé : un export
+      interrompu ne laisse pas de fichier tronqué
+
+    Args:
+        df: Données à exporter (la colonne de partition est conservée dans les fichiers)
+        colonne: Colonne de partition, ex: 'mois'
+        dossier: Dossier des exports
+        prefixe: Préfixe des fichiers, ex: 'export_M2'
+        formats: Formats parmi FORMATS_EXPORT ('csv' et/ou 'parquet' compressé en zstd)
+        separateur: Séparateur des CSV
+        nb_threads: Taille du pool (défaut: cœurs disponibles)
+
+    Returns:
+        DataFrame ('partition', 'format', 'fichier', 'nb_lignes'), trié par partition et format
+    """
+    inconnus = set(formats) - set(FORMATS_EXPORT)
+    if inconnus:
+        raise ValueError(f"Format(s) inconnu(s) : {', '.join(sorted(inconnus))} (attendu : {', '.join(FORMATS_EXPORT)})")
+
+    dossier = Path(dossier)
+    taches = [
+        (valeur, partition, dossier / f"{prefixe}_{valeur}.{format_export}", format_export)
+        for (valeur,), partition in df.partition_by(colonne, as_dict=True).items()
+        for format_export in formats
+    ]
+    with ThreadPoolExecutor(max_workers=nb_threads or os.process_cpu_count()) as pool:
+        ecritures = [
+            pool.submit(_ecrire_partition, partition, fichier, format_export, separateur)
+            for _, partition, fichier, format_export in taches
+        ]
+        for ecriture in ecritures:
+            ecriture.result()
+
+    return pl.DataFrame(
+        [
+            (str(valeur), format_export, str(fichier), len(partition))
+            for valeur, partition, fichier, format_export in taches
+        ],
+        schema={'partition': pl.String, 'format': pl.String, 'fichier': pl.String, 'nb_lignes': pl.Int64},
+        orient='row',
+    ).sort(['partition', 'format'])
+
+
+@dataclass
+class Consolidation:
+    """Ligne la plus récente par PRM client, et fichiers lus pour la mettre à jour."""
+
+    lignes: pl.DataFrame
+    fichiers_lus: list[str] = field(default_factory=list)
+    reconstruite: bool = False
+
+
+def dedoublonner_plus_recent(
+    lignes: pl.LazyFrame,
+    cle: str = 'PRM',
+    horodatage: str = '_source_timestamp'
+) -> pl.LazyFrame:
+    """
+    Garde la ligne la plus récente par clé, sans tri global.
+
+    Arg-max par agrégation de hachage : l'horodatage maximal de chaque clé (group_by),
+    puis une semi-jointure sur (clé, horodatage) ; les ex æquo (même fichier) sont
+    départagés arbitrairement. Chaque étape s'exécute sur le moteur streaming, qui n'a
+    jamais à matérialiser toutes les lignes ; la source est lue deux fois.
+
+    Args:
+        lignes: Lignes à dédoublonner (ex: cf. scanner_extraction)
+        cle: Colonne identifiant une ligne
+        horodatage: Colonne ordonnant les versions d'une même clé (texte trié ou date)
+
+    Returns:
+        LazyFrame d'une ligne par clé (ordre quelconque)
+    """
+    plus_recents = lignes.group_by(cle).agg(pl.col(horodatage).max())
+    return (
+        lignes
+        .join(plus_recents, on=[cle, horodatage], how='semi')
+        .unique(subset=cle, keep='any')
+    )
+
+
+def consolider_plus_recent(
+    extraction: pl.DataFrame,
+    flux: str,
+    clients: pl.DataFrame,
+    fichier_etat: Path,
+    colonne_prm: str = 'PRM'
+) -> Consolidation:
+    """
+    Ligne la plus récente par PRM client d'un flux (M-6), mise à jour de façon incrémentale.
+
+    Principe :
+    - L'état (Parquet) conserve une ligne par PRM client avec sa provenance
+      (_source_timestamp, _source_file) : le CSV consolidé, sans provenance, ne permet
+      pas de savoir si une nouvelle ligne est plus récente
+    - Seuls les fichiers extraits depuis l'écriture de l'état sont lus : ils ne mettent
+      à jour que les PRM qu'ils contiennent, et seulement s'ils sont plus récents
+    - L'état est reconstruit depuis tous les fichiers s'il est absent, si un client
+      n'y figure pas, ou si l'un de ses fichiers sources a disparu de l'extraction
+    - Les clients sans ligne y figurent avec des valeurs nulles
+
+    Args:
+        extraction: Membres extraits (cf. extraire_dossier)
+        flux: Type de flux, ex: 'M-6'
+        clients: Table contenant colonne_prm
+        fichier_etat: Parquet de l'état, réécrit à chaque appel
+        colonne_prm: Colonne du PRM
+
+    Returns:
+        Consolidation : une ligne par PRM client (colonnes du flux et provenance),
+        fichiers lus et reconstruction éventuelle de l'état
+    """
+    fichier_etat = Path(fichier_etat)
+    membres = extraction.filter((pl.col('type') == flux) & pl.col('membre').is_not_null())
+    prms_clients = clients.select(pl.col(colonne_prm).cast(pl.String)).unique()
+
+    etat = pl.read_parquet(fichier_etat) if fichier_etat.exists() else None
+    reconstruite = etat is None
+    if not reconstruite:
+        # Membres (ré)extraits depuis l'écriture de l'état : Parquet plus récent que lui
+        ecriture_etat = fichier_etat.stat().st_mtime_ns
+        nouveaux = membres.filter(pl.Series([
+            Path(fichier).stat().st_mtime_ns >= ecriture_etat for fichier in membres['fichier']
+        ], dtype=pl.Boolean))
+        sources_etat = set(etat['_source_file'].drop_nulls())
+        reconstruite = (
+            not prms_clients.join(etat, on=colonne_prm, how='anti').is_empty()
+            or not sources_etat <= set(membres['membre'])
+            # Fichier déjà consolidé puis remplacé : ses anciennes lignes ne sont plus valables
+            or not sources_etat.isdisjoint(nouveaux['membre'])
+        )
+    if reconstruite:
+        nouveaux = membres
+
+    candidats = []
+    if not reconstruite:
+        candidats.append(etat.lazy().filter(pl.col('_source_timestamp').is_not_null()))
+    if not nouveaux.is_empty():
+        candidats.append(scanner_extraction(nouveaux, flux, prms_clients, colonne_prm))
+
+    if candidats:
+        plus_recents = dedoublonner_plus_recent(
+            pl.concat(candidats, how='diagonal_relaxed'), colonne_prm
+        ).collect(engine='streaming')
+    else:
+        plus_recents = pl.DataFrame(schema={colonne_prm: pl.String, '_source_timestamp': pl.String, '_source_file': pl.String})
+
+    lignes = prms_clients.join(plus_recents, on=colonne_prm, how='left').sort(colonne_prm)
+    ecrire_parquet_atomique(lignes, fichier_etat)
+    return Consolidation(lignes=lignes, fichiers_lus=nouveaux['membre'].to_list(), reconstruite=reconstruite)
@@ -0,0 +1,50 @@
+"""Écritures atomiques et initialisation des processus de travail, partagées par les modules du paquet."""
+
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+import polars as pl
+
+
+def fichier_temporaire(fichier: Path) -> Path:
+    """Fichier temporaire du processus courant, à côté de fichier (même système de fichiers)."""
+    return fichier.with_name(f"{fichier.name}.{os.getpid()}.tmp")
+
+
+def ecrire_atomique(fichier: Path, ecrire: Callable[[Path], object]):
+    """
+    Écrit fichier par ecrire(chemin temporaire), puis rename atomique.
+
+    Un lecteur ne voit jamais de fichier tronqué, et le temporaire porte le PID :
+    deux processus qui écrivent la même entrée ne s'écrasent pas en cours d'écriture.
+    Le dossier de fichier est créé si besoin ; en cas d'échec, le temporaire est supprimé.
+
+    Args:
+        fichier: Fichier final
+        ecrire: Écriture du contenu dans le chemin reçu, ex: lambda chemin: df.write_csv(chemin)
+    """
+    fichier = Path(fichier)
+    fichier.parent.mkdir(parents=True, exist_ok=True)
+    fichier_tmp = fichier_temporaire(fichier)
+    try:
+        ecrire(fichier_tmp)
+        fichier_tmp.replace(fichier)
+    except BaseException:
+        # Disque plein, erreur Polars, interruption : pas de temporaire orphelin
+        fichier_tmp.unlink(missing_ok=True)
+        raise
+
+
+def ecrire_parquet_atomique(df: pl.DataFrame, fichier: Path):
+    """Écrit df en Parquet (zstd, défaut de Polars) dans un temporaire puis rename atomique."""
+    ecrire_atomique(fichier, df.write_parquet)
+
+
+def limiter_threads_polars(threads_polars: int):
+    """
+    Initialiseur de processus de travail : limite les threads Polars (le parallélisme est entre processus).
+
+    Le pool de threads Polars est créé au premier calcul : la variable est encore prise en compte.
+    """
+    os.environ['POLARS_MAX_THREADS'] = str(threads_polars)
@@ -0,0 +1,148 @@
+"""Fusion d'exports R63 qui se recouvrent : tri-fusion, dédoublonnage et rapport."""
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import polars as pl
+
+from opti_c4.courbe import scanner_courbe_r63
+
+# Règles de priorité entre fichiers qui se recouvrent
+PRIORITES_FUSION = ('ordre', 'recente')
+
+# Colonnes de la courbe PA typée (cf. scanner_courbe_r63)
+COLONNES_COURBE = ['Identifiant PRM', 'Horodate', 'Valeur', 'Pas']
+
+
+@dataclass
+class FusionCourbes:
+    """Courbe dédoublonnée et rapport des recouvrements, tous deux lazy sur la même fusion."""
+    courbe: pl.LazyFrame
+    recouvrements: pl.LazyFrame
+
+
+def ordonner_sources(sources: list[Path], priorite: str = 'ordre') -> list[Path]:
+    """
+    Ordonne des fichiers par priorité croissante : le dernier l'emporte en cas de recouvrement.
+
+    Args:
+        sources: Fichiers R63, dans l'ordre fourni
+        priorite: 'ordre' (le dernier fichier fourni l'emporte) ou
+            'recente' (le fichier modifié le plus récemment l'emporte, puis l'ordre fourni)
+
+    Returns:
+        Fichiers par priorité croissante
+    """
+    if priorite not in PRIORITES_FUSION:
+        raise ValueError(f"Priorité inconnue : {priorite!r} (attendu : {', '.join(PRIORITES_FUSION)})")
+    if priorite == 'recente':
+        # Tri stable : à date égale, l'ordre fourni départage
+        return sorted(sources, key=lambda source: Path(source).stat().st_mtime)
+    return list(sources)
+
+
+def _fusion_triee(courbes: list[pl.LazyFrame]) -> pl.LazyFrame:
+    """Fusion par paires (arbre de merge_sorted) de courbes triées sur 'cle' : linéaire par niveau."""
+    while len(courbes) > 1:
+        paires = [a.merge_sorted(b, key='cle') for a, b in zip(courbes[::2], courbes[1::2])]
+        courbes = paires + courbes[len(paires) * 2:]
+    return courbes[0]
+
+
+def fusionner_courbes(courbes: list[pl.LazyFrame], noms: list[str] = None) -> FusionCourbes:
+    """
+    Fusionne des courbes PA typées qui se recouvrent, sans doublon (PRM, Horodate) entre courbes.
+
+    Principe :
+    - Chaque courbe est triée sur (PRM, Horodate, rang) ; le rang vaut 0 pour la courbe
+      prioritaire, de sorte que la mesure retenue arrive en tête de chaque doublon
+    - Les courbes triées sont fusionnées par merge_sorted, sans tri global
+    - Une seule passe sur la fusion : pour chaque clé (PRM, Horodate), les lignes de la
+      courbe la plus prioritaire qui la contient sont retenues, celles des autres courbes
+      sont des recouvrements. Une clé répétée dans une même courbe (heure du passage à
+      l'heure d'hiver, en heure locale naïve) n'est donc pas un doublon : elle est conservée
+    - Un recouvrement est un conflit si sa Valeur ou son Pas diffèrent de la dernière
+      mesure retenue de la clé
+
+    Args:
+        courbes: Courbes PA typées (cf. scanner_courbe_r63), par priorité croissante :
+            la dernière l'emporte (cf. ordonner_sources)
+        noms: Nom de chaque courbe dans le rapport (défaut : 'source_<i>')
+
+    Returns:
+        FusionCourbes : courbe triée par (PRM, Horodate) et recouvrements par
+        ('Identifiant PRM', 'source_retenue', 'source_ecartee') avec 'horodate_debut',
+        'horodate_fin', 'mesures_en_double', 'conflits' et 'ecart_max_kw'
+    """
+    if not courbes:
+        raise ValueError("Aucune courbe à fusionner")
+    noms = noms or [f'source_{i}' for i in range(len(courbes))]
+    schema = courbes[0].select(COLONNES_COURBE).collect_schema()
+
+    triees = [
+        courbe
+        .select(COLONNES_COURBE)
+        .cast(schema)
+        .with_columns(
+            pl.lit(nom).alias('source'),
+            pl.lit(len(courbes) - 1 - i, dtype=pl.UInt32).alias('rang'),
+        )
+        # Tri stable : les mesures répétées d'une même courbe gardent leur ordre
+        .sort(['Identifiant PRM', 'Horodate', 'rang'], maintain_order=True)
+        .with_columns(pl.struct(['Identifiant PRM', 'Horodate', 'rang']).alias('cle'))
+        for i, (courbe, nom) in enumerate(zip(courbes, noms))
+    ]
+
+    nouvelle_cle = (
+        (pl.col('Identifiant PRM') != pl.col('Identifiant PRM').shift())
+        | (pl.col('Horodate') != pl.col('Horodate').shift())
+    ).fill_null(True)
+    fusion = (
+        _fusion_triee(triees)
+        .drop('cle')
+        # Rang de la courbe prioritaire de chaque clé (première ligne de la clé), propagé
+        .with_columns(pl.when(nouvelle_cle).then(pl.col('rang')).forward_fill().alias('rang_retenu'))
+        .with_columns((pl.col('rang') == pl.col('rang_retenu')).alias('retenue'))
+        # Mesure retenue de chaque clé, propagée sur ses doublons qui la suivent
+        .with_columns([
+            pl.when('retenue').then(pl.col(c)).forward_fill().alias(f'{c}_retenue')
+            for c in ['Valeur', 'Pas', 'source']
+        ])
+    )
+
+    courbe = fusion.filter('retenue').select(COLONNES_COURBE)
+    recouvrements = (
+        fusion
+        .filter(~pl.col('retenue'))
+        .group_by(['Identifiant PRM', 'source_retenue', pl.col('source').alias('source_ecartee')])
+        .agg([
+            pl.col('Horodate').min().alias('horodate_debut'),
+            pl.col('Horodate').max().alias('horodate_fin'),
+            pl.len().alias('mesures_en_double'),
+            (
+                (pl.col('Valeur') != pl.col('Valeur_retenue'))
+                | (pl.col('Pas') != pl.col('Pas_retenue'))
+            ).sum().alias('conflits'),
+            (pl.col('Valeur') - pl.col('Valeur_retenue')).abs().max().alias('ecart_max_kw'),
+        ])
+        .sort(['Identifiant PRM', 'source_retenue', 'source_ecartee'])
+    )
+    return FusionCourbes(courbe=courbe, recouvrements=recouvrements)
+
+
+def fusionner_courbes_r63(sources: list[Path], priorite: str = 'ordre') -> FusionCourbes:
+    """
+    Fusionne des exports R63 qui se recouvrent (ex: exports mensuels et export annuel).
+
+    Args:
+        sources: Fichiers CSV R63
+        priorite: Règle de priorité entre fichiers (cf. ordonner_sources)
+
+    Returns:
+        FusionCourbes (cf. fusionner_courbes), sources désignées par leur nom de fichier
+    """
+    sources = ordonner_sources([Path(source) for source in sources], priorite)
+    return fusionner_courbes(
+        [scanner_courbe_r63(source) for source in sources],
+        [source.name for source in sources],
+    )
@@ -0,0 +1,557 @@
+"""Chaîne complète : courbe de charge → agrégats → index de dépassement → scénarios → coûts TURPE."""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from opti_c4.agregats import agreger_depassements, construire_energies_agregees
+from opti_c4.calendrier import CalendrierCadrans, parser_plages_horaires
+from opti_c4.courbe import (
+    RESOLUTIONS_PYRAMIDE,
+    agreger_fenetres_pmax,
+    compter_durees_par_pmax,
+    expr_pas_heures,
+    expr_pmax,
+    expr_volume,
+    reechantillonner_courbe,
+)
+from opti_c4.depassement import (
+    CubeDepassementMensuel,
+    HistogrammeDepassement,
+    IndexDepassement,
+    IndexDepassementMensuel,
+)
+from opti_c4.qualite import detecter_trous, diagnostiquer_qualite, exprs_statistiques_qualite
+from opti_c4.scenarios import (
+    generer_scenarios_btinf,
+    generer_scenarios_optimaux_btsup,
+    generer_scenarios_reduction_proportionnelle,
+)
+from opti_c4.turpe import NoyauTurpe, extraire_regles_turpe
+
+logger = logging.getLogger(__name__)
+
+# Colonnes des scénarios transmises au calcul TURPE
+COLONNES_SCENARIOS = [
+    'pdl', 'energie_hph_kwh', 'energie_hch_kwh', 'energie_hpb_kwh', 'energie_hcb_kwh',
+    'date_debut', 'date_fin', 'nb_jours',
+    'puissance_souscrite_kva', 'formule_tarifaire_acheminement', 'duree_depassement_h',
+    'puissance_hph_kva', 'puissance_hch_kva', 'puissance_hpb_kva', 'puissance_hcb_kva',
+    'est_scenario_actuel'
+]
+
+# Colonnes des résultats après calcul TURPE
+COLONNES_RESULTATS = [
+    'pdl',
+    'formule_tarifaire_acheminement',
+    'puissance_souscrite_kva',
+    'puissance_hph_kva',
+    'puissance_hch_kva',
+    'puissance_hpb_kva',
+    'puissance_hcb_kva',
+    'turpe_fixe_eur',
+    'turpe_variable_eur',
+    'turpe_depassement_eur',
+    'turpe_total_eur',
+    'est_scenario_actuel'
+]
+
+
+@dataclass
+class AnalyseCourbe:
+    """Étape 1 : courbe typée sur la période d'analyse, indépendante des plages HC."""
+
+    courbe: pl.LazyFrame
+    date_debut: datetime
+    date_fin: datetime
+    dates_par_pdl: pl.DataFrame
+    fenetres_pyramide: dict[str, pl.LazyFrame]
+    qualite: pl.DataFrame
+    trous: pl.DataFrame
+
+
+@dataclass
+class ClassificationCourbe:
+    """Étape 2 : énergies par cadran et durées par pmax de chaque méthodologie, pour un calendrier."""
+
+    energies_agregees: pl.DataFrame
+    durees_par_methode: dict[str, pl.DataFrame]
+
+
+@dataclass(frozen=True)
+class ParametresOptimisation:
+    """Paramètres d'une optimisation sans interface (batch, services)."""
+
+    plages_hc: str = "22h00-06h00"
+    plages_hc_saison_basse: str = None
+    hc_jours_non_ouvres: bool = False
+    methode_pmax: str = 'brut'
+    mode_index: str = 'exact'
+    p_min: int = 3
+    p_max: int = 250
+    date_reference_turpe: datetime = datetime(2025, 8, 1)
+    # Grille commune des courbes à pas mixtes (None : pas natif de chaque mesure)
+    pas_commun_minutes: int = None
+    regle_reechantillonnage: str = 'moyenne'
+
+    def calendrier(self) -> CalendrierCadrans:
+        """Calendrier des cadrans correspondant aux plages HC."""
+        return CalendrierCadrans.depuis_plages(
+            parser_plages_horaires(self.plages_hc),
+            plages_hc_saison_basse=(
+                parser_plages_horaires(self.plages_hc_saison_basse) if self.plages_hc_saison_basse else None
+            ),
+            hc_jours_non_ouvres=self.hc_jours_non_ouvres,
+        )
+
+
+def preparer_courbe(courbe_pa: pl.LazyFrame) -> tuple[pl.LazyFrame, dict[str, pl.LazyFrame]]:
+    """
+    Colonnes dérivées de la courbe et niveaux de la pyramide des pics, sans rien collecter.
+
+    Args:
+        courbe_pa: Courbe PA typée, déjà restreinte à la période voulue
+
+    Returns:
+        Tuple (courbe avec 'pas_heures', 'volume' et 'pmax', niveaux lazy de la pyramide
+        par résolution)
+    """
+    courbe = (
+        courbe_pa
+        .with_columns([
+            expr_pas_heures().alias('pas_heures')
+        ])
+        .with_columns([
+            expr_volume().alias('volume'),
+            expr_pmax().alias('pmax'),
+        ])
+    )
+    # Niveaux de la pyramide des pics (max / moyenne par fenêtre), laissés lazy
+    fenetres_pyramide = {
+        resolution: agreger_fenetres_pmax(courbe, resolution) for resolution in RESOLUTIONS_PYRAMIDE
+    }
+    return courbe, fenetres_pyramide
+
+
+def analyser_courbe(courbe_pa: pl.LazyFrame, duree_analyse: timedelta = timedelta(days=365)) -> AnalyseCourbe:
+    """
+    Étape 1 : restreint la courbe aux 12 derniers mois et prépare la pyramide des pics.
+
+    Deux scans de la courbe ici, puis un par classification :
+    - Le premier ne lit que la colonne Horodate : la date de fin borne la période, elle
+      doit être connue avant de filtrer
+    - Le second, un collect_all streaming, calcule les dates par PRM et les compteurs de
+      qualité (un group_by), et les trous de mesure sur le niveau 5 min de la pyramide
+      (un group_by suivi d'un tri des fenêtres)
+    - Les énergies et durées par pmax sont un scan distinct, à chaque classification
+      (cf. agreger_par_cadran) : elles dépendent des plages HC, contrairement au
+      diagnostic, calculé une seule fois par courbe et disponible avant tout choix de
+      plages. Les niveaux de la pyramide restent lazy : chaque classification les
+      recalcule en streaming depuis la courbe, sans en garder de copie.
+
+    Mémoire : la courbe n'est jamais matérialisée, mais la détection des trous trie les
+    fenêtres 5 min (PRM, Horodate, pas) : quelques dizaines d'octets par fenêtre, soit une mémoire
+    proportionnelle à la courbe pour un pas de 5 min.
+
+    Args:
+        courbe_pa: Courbe PA typée (cf. scanner_courbe_r63, charger_courbe_avec_cache)
+        duree_analyse: Durée de la période analysée, jusqu'à la dernière mesure
+
+    Returns:
+        AnalyseCourbe
+    """
+    # Période d'analyse (12 derniers mois) : agrégat streaming sur la seule colonne Horodate
+    date_fin = (
+        courbe_pa
+        .select(pl.col('Horodate').max())
+        .collect(engine='streaming')
+        .item()
+    )
+    date_debut = date_fin - duree_analyse
+
+    # Filtrage sur 12 derniers mois disponibles (poussé dans le scan)
+    courbe, fenetres_pyramide = preparer_courbe(
+        courbe_pa.filter(
+            (pl.col('Horodate') >= date_debut) &
+            (pl.col('Horodate') <= date_fin)
+        )
+    )
+
+    # Dates par PDL et compteurs de qualité, dans le même group_by
+    lf_statistiques = (
+        courbe
+        .group_by('Identifiant PRM')
+        .agg([
+            pl.col('Horodate').min().alias('date_debut'),
+            pl.col('Horodate').max().alias('date_fin'),
+            *exprs_statistiques_qualite(),
+        ])
+    )
+
+    statistiques, trous = pl.collect_all(
+        [lf_statistiques, detecter_trous(fenetres_pyramide['5m'])],
+        engine='streaming',
+    )
+    return AnalyseCourbe(
+        courbe=courbe,
+        date_debut=date_debut,
+        date_fin=date_fin,
+        dates_par_pdl=statistiques.select(['Identifiant PRM', 'date_debut', 'date_fin']),
+        fenetres_pyramide=fenetres_pyramide,
+        qualite=diagnostiquer_qualite(statistiques, trous, duree_analyse),
+        trous=trous,
+    )
+
+
+def requetes_par_cadran(
+    courbe: pl.LazyFrame,
+    fenetres_pyramide: dict[str, pl.LazyFrame],
+    calendrier: CalendrierCadrans
+) -> tuple[pl.LazyFrame, dict[str, pl.LazyFrame]]:
+    """
+    Requêtes lazy des énergies par (PRM, cadran) et des durées par pmax de chaque méthodologie.
+
+    Args:
+        courbe: Courbe avec 'pas_heures', 'volume' et 'pmax' (cf. preparer_courbe)
+        fenetres_pyramide: Niveaux de la pyramide des pics de cette courbe
+        calendrier: Calendrier des cadrans (plages HC)
+
+    Returns:
+        Tuple (requête des énergies, requêtes des durées par méthodologie), à collecter
+        ensemble pour partager le scan de la courbe
+    """
+    # Cadran par lecture dans la table calendrier (un seul gather entier par ligne)
+    cdc_temp = courbe.with_columns(calendrier.expr_cadran().alias('cadran'))
+
+    # Agrégation des énergies par PDL et cadran
+    lf_energies_par_cadran = (
+        cdc_temp
+        .group_by(['Identifiant PRM', 'cadran'])
+        .agg([
+            pl.col('volume').sum().alias('energie_kwh'),
+        ])
+    )
+
+    # Pyramide des pics : durées par (PRM, mois, cadran, pmax) pour chaque méthodologie
+    # - 'brut' : valeurs au pas natif de la courbe (méthode historique)
+    # - '{max,moyenne}_{5m,10m,1h}' : max / moyenne de la puissance par fenêtre
+    lf_methodes = {'brut': compter_durees_par_pmax(cdc_temp, 'pmax')}
+    for resolution, fenetres in fenetres_pyramide.items():
+        lf_fenetres = fenetres.with_columns(calendrier.expr_cadran().alias('cadran'))
+        for statistique in ('max', 'moyenne'):
+            lf_methodes[f'{statistique}_{resolution}'] = compter_durees_par_pmax(lf_fenetres, statistique)
+
+    return lf_energies_par_cadran, lf_methodes
+
+
+def agreger_par_cadran(
+    analyse: AnalyseCourbe,
+    calendrier: CalendrierCadrans
+) -> tuple[pl.DataFrame, dict[str, pl.DataFrame]]:
+    """
+    Énergies par (PRM, cadran) et durées par pmax de chaque méthodologie, en un seul scan.
+
+    Ce scan est distinct de celui du diagnostic de qualité de analyser_courbe, qui ne
+    dépend pas des plages HC et n'est pas refait à chaque calendrier. Les deux résultats sont additifs par période : les agrégats de tranches disjointes
+    de la courbe se cumulent (cf. EntrepotCourbes).
+
+    Args:
+        analyse: Résultat de analyser_courbe
+        calendrier: Calendrier des cadrans (plages HC)
+
+    Returns:
+        Tuple (energies_par_cadran ('Identifiant PRM', 'cadran', 'energie_kwh'),
+        durées par méthodologie ('Identifiant PRM', 'mois', 'cadran', 'pmax', 'duree_h'))
+    """
+    lf_energies_par_cadran, lf_methodes = requetes_par_cadran(
+        analyse.courbe, analyse.fenetres_pyramide, calendrier
+    )
+
+    # Un seul scan de la courbe : toutes les requêtes partagent le sous-plan commun (CSE)
+    # et sont exécutées par le moteur streaming, sans matérialiser la courbe brute
+    energies_par_cadran, *durees = pl.collect_all(
+        [lf_energies_par_cadran, *lf_methodes.values()],
+        engine='streaming',
+    )
+    return energies_par_cadran, dict(zip(lf_methodes, durees))
+
+
+def classifier_courbe(analyse: AnalyseCourbe, calendrier: CalendrierCadrans) -> ClassificationCourbe:
+    """
+    Étape 2 : classification en cadrans et agrégats de toutes les méthodologies de pmax.
+
+    Args:
+        analyse: Résultat de analyser_courbe
+        calendrier: Calendrier des cadrans (plages HC)
+
+    Returns:
+        ClassificationCourbe
+    """
+    energies_par_cadran, durees_par_methode = agreger_par_cadran(analyse, calendrier)
+    return ClassificationCourbe(
+        # Énergies par cadran et période, indépendantes de la méthodologie de pmax
+        energies_agregees=construire_energies_agregees(energies_par_cadran, analyse.dates_par_pdl),
+        durees_par_methode=durees_par_methode,
+    )
+
+
+def selectionner_source_pmax(analyse: AnalyseCourbe, methode_pmax: str) -> tuple[pl.LazyFrame, str]:
+    """
+    Source des pmax d'une méthodologie : courbe au pas natif ou niveau de la pyramide.
+
+    Returns:
+        Tuple (LazyFrame avec 'Horodate' et 'pas_heures', colonne de pmax)
+    """
+    if methode_pmax == 'brut':
+        return analyse.courbe, 'pmax'
+    statistique, resolution = methode_pmax.split('_')
+    return analyse.fenetres_pyramide[resolution], statistique
+
+
+def construire_index_depassement(cdc: pl.DataFrame, mode: str = 'exact', puissance_max_kva: int = 250):
+    """
+    Index de dépassement annuel par (PRM, cadran).
+
+    Args:
+        cdc: Agrégat de dépassement (cf. agreger_depassements)
+        mode: 'exact' (pmax triés) ou 'entier' (histogramme par kVA entier)
+        puissance_max_kva: Plus grand seuil exact en mode 'entier' (taille fixe de l'histogramme)
+
+    Returns:
+        IndexDepassement ou HistogrammeDepassement
+    """
+    if mode == 'entier':
+        # Histogramme 0..P_max kVA : lookup O(1), taille fixe par PRM
+        return HistogrammeDepassement.depuis_cdc(cdc, puissance_max_kva=puissance_max_kva)
+    # Index trié exact : lookup par searchsorted
+    return IndexDepassement.depuis_cdc(cdc)
+
+
+def construire_index_mensuel(cdc_mensuelle: pl.DataFrame, mode: str = 'exact', puissance_max_kva: int = 250):
+    """
+    Index de dépassement par (PRM, mois, cadran) pour la facturation mensuelle.
+
+    Returns:
+        IndexDepassementMensuel ou CubeDepassementMensuel (mode 'entier')
+    """
+    if mode == 'entier':
+        # Cube (PRM, mois, cadran, kVA) : bilan mensuel de toute configuration par lookup
+        return CubeDepassementMensuel.depuis_cdc_mensuelle(cdc_mensuelle, puissance_max_kva=puissance_max_kva)
+    return IndexDepassementMensuel.depuis_cdc_mensuelle(cdc_mensuelle)
+
+
+def generer_scenarios(
+    consos_agregees: pl.DataFrame,
+    cdc: pl.DataFrame,
+    index_depassement,
+    regles_turpe: pl.DataFrame,
+    p_min: int = 3,
+    p_max: int = 250,
+    config_actuelle_btinf: dict = None,
+    config_actuelle_btsup: dict = None,
+    balayage: bool = False,
+    date_turpe: datetime = datetime(2025, 8, 1)
+) -> pl.DataFrame:
+    """
+    Scénarios BTINF (< 36 kVA) et optimum exact BTSUP, avec leur durée de dépassement.
+
+    Args:
+        consos_agregees: Consommations par PDL (cf. agreger_depassements)
+        cdc: Agrégat de dépassement par (PRM, cadran, pmax)
+        index_depassement: IndexDepassement ou HistogrammeDepassement
+        regles_turpe: Règles applicables (cf. extraire_regles_turpe)
+        p_min, p_max: Plage de puissances (kVA)
+        config_actuelle_btinf: {'fta', 'puissance'} si la configuration actuelle est BTINF
+        config_actuelle_btsup: {'fta', 'p_hph', 'p_hch', 'p_hpb', 'p_hcb'} si elle est BTSUP
+        balayage: Ajouter le balayage heuristique BTSUP (réduction proportionnelle)
+        date_turpe: Date de référence de regles_turpe et début de la période simulée (un an) ;
+            sans règle BTSUP à cette date, les scénarios BTSUP sont omis (avertissement journalisé)
+
+    Returns:
+        DataFrame des scénarios (colonnes COLONNES_SCENARIOS)
+    """
+    # Étape 1: Scénarios BTINF mono-puissance (< 36 kVA) si nécessaire
+    scenarios_btinf = None
+    if p_min < 36:
+        scenarios_btinf = generer_scenarios_btinf(
+            consos_agregees,
+            list(range(p_min, min(36, p_max + 1))),
+            config_actuelle=config_actuelle_btinf,
+            date_turpe=date_turpe
+        )
+        # Calculer durée dépassement avec les 4 puissances par cadran (lookup vectorisé)
+        scenarios_btinf = scenarios_btinf.with_columns(
+            index_depassement.duree_depassement_scenarios(scenarios_btinf)
+        )
+
+    # Étape 2: Optimum exact des 4 puissances par programmation dynamique (une ligne par PDL × FTA)
+    try:
+        scenarios_btsup = generer_scenarios_optimaux_btsup(
+            consos_agregees,
+            index_depassement,
+            regles_turpe,
+            p_min=p_min,
+            p_max=p_max,
+            config_actuelle=config_actuelle_btsup,
+            date_turpe=date_turpe
+        )
+        btsup_disponible = True
+    except ValueError as erreur:
+        # Période sans règle BTSUP (avant le 01/08/2025) : scénarios BTINF seuls
+        logger.warning("Scénarios BTSUP omis : %s", erreur)
+        scenarios_btsup = generer_scenarios_optimaux_btsup(
+            consos_agregees.clear(), index_depassement, regles_turpe, formules=()
+        )
+        btsup_disponible = False
+
+    # Option : balayage heuristique depuis un seuil de dépassement
+    if balayage and btsup_disponible:
+        scenarios_balayage = generer_scenarios_reduction_proportionnelle(
+            consos_agregees,
+            cdc,
+            seuil_depassement_h=10.0,
+            config_actuelle=config_actuelle_btsup,
+            date_turpe=date_turpe
+        )
+        scenarios_btsup = pl.concat([
+            scenarios_btsup,
+            scenarios_balayage.select(scenarios_btsup.columns)
+        ])
+
+    # Calculer dépassements pour BTSUP (lookup vectorisé)
+    scenarios_btsup = scenarios_btsup.with_columns(
+        index_depassement.duree_depassement_scenarios(scenarios_btsup)
+    ).select(COLONNES_SCENARIOS)
+
+    # Concaténer BTINF et BTSUP
+    if scenarios_btinf is not None:
+        return pl.concat([scenarios_btinf.select(COLONNES_SCENARIOS), scenarios_btsup])
+    return scenarios_btsup
+
+
+def preparer_scenarios_turpe(scenarios: pl.DataFrame) -> pl.DataFrame:
+    """
+    Ajoute aux scénarios les colonnes au format electricore (debut/fin, énergies HP/HC/Base,
+    puissance_souscrite_*_kva), partagées par le noyau TURPE et la vérification.
+    """
+    return (
+        scenarios
+        .rename({
+            'date_debut': 'debut',
+            'date_fin': 'fin'
+        })
+        .with_columns([
+            # Ajouter timezone Europe/Paris pour compatibilité avec electricore
+            pl.col('debut').dt.replace_time_zone('Europe/Paris').alias('debut'),
+            pl.col('fin').dt.replace_time_zone('Europe/Paris').alias('fin'),
+        ])
+        .with_columns([
+            # Ajouter les colonnes agrégées pour formules C5 (HP/HC/Base)
+            (pl.col('energie_hph_kwh') + pl.col('energie_hpb_kwh')).alias('energie_hp_kwh'),
+            (pl.col('energie_hch_kwh') + pl.col('energie_hcb_kwh')).alias('energie_hc_kwh'),
+            (pl.col('energie_hph_kwh') + pl.col('energie_hch_kwh') +
+             pl.col('energie_hpb_kwh') + pl.col('energie_hcb_kwh')).alias('energie_base_kwh'),
+            # Pour C4 : les colonnes puissance_*_kva existent toujours maintenant
+            # On les renomme juste en puissance_souscrite_*_kva pour electricore
+            pl.col('puissance_hph_kva').alias('puissance_souscrite_hph_kva'),
+            pl.col('puissance_hch_kva').alias('puissance_souscrite_hch_kva'),
+            pl.col('puissance_hpb_kva').alias('puissance_souscrite_hpb_kva'),
+            pl.col('puissance_hcb_kva').alias('puissance_souscrite_hcb_kva'),
+        ])
+    )
+
+
+def calculer_couts(
+    scenarios_prepares: pl.DataFrame,
+    noyau: NoyauTurpe,
+    index_mensuel
+) -> pl.DataFrame:
+    """
+    Coûts TURPE de tous les scénarios : fixe, variable, dépassements mensuels et total.
+
+    Args:
+        scenarios_prepares: Scénarios au format electricore (cf. preparer_scenarios_turpe)
+        noyau: Noyau TURPE de la période tarifaire
+        index_mensuel: IndexDepassementMensuel ou CubeDepassementMensuel
+
+    Returns:
+        DataFrame des scénarios avec turpe_{fixe,variable,depassement,total}_eur
+    """
+    return (
+        noyau.calculer(scenarios_prepares, index_mensuel)
+        .with_columns([
+            (
+                pl.col('turpe_fixe_eur') + pl.col('turpe_variable_eur') + pl.col('turpe_depassement_eur')
+            ).alias('turpe_total_eur')
+        ])
+    )
+
+
+def optimiser_courbe(
+    courbe_pa: pl.LazyFrame,
+    regles_turpe: pl.LazyFrame,
+    parametres: ParametresOptimisation = ParametresOptimisation()
+) -> pl.DataFrame:
+    """
+    Chaîne complète sans interface : courbe PA → coûts TURPE de tous les scénarios.
+
+    Args:
+        courbe_pa: Courbe PA typée (cf. scanner_courbe_r63)
+        regles_turpe: LazyFrame issu de load_turpe_rules()
+        parametres: Plages HC, méthodologie de pmax, plage de puissances, période tarifaire,
+            grille commune éventuelle
+
+    Returns:
+        DataFrame des résultats (colonnes COLONNES_RESULTATS), trié par PDL puis coût total
+    """
+    if parametres.pas_commun_minutes is not None:
+        courbe_pa = reechantillonner_courbe(
+            courbe_pa, parametres.pas_commun_minutes, parametres.regle_reechantillonnage
+        )
+    return optimiser_classification(
+        classifier_courbe(analyser_courbe(courbe_pa), parametres.calendrier()),
+        regles_turpe,
+        parametres,
+    )
+
+
+def optimiser_classification(
+    classification: ClassificationCourbe,
+    regles_turpe: pl.LazyFrame,
+    parametres: ParametresOptimisation = ParametresOptimisation()
+) -> pl.DataFrame:
+    """
+    Fin de chaîne à partir des agrégats : index de dépassement → scénarios → coûts TURPE.
+
+    Args:
+        classification: Agrégats de la courbe pour les plages HC de parametres
+        regles_turpe: LazyFrame issu de load_turpe_rules()
+        parametres: Méthodologie de pmax, plage de puissances, période tarifaire
+
+    Returns:
+        DataFrame des résultats (colonnes COLONNES_RESULTATS), trié par PDL puis coût total
+    """
+    cdc, cdc_mensuelle, consos_agregees = agreger_depassements(
+        classification.durees_par_methode[parametres.methode_pmax],
+        classification.energies_agregees,
+    )
+    # Mode 'entier' : taille fixe couvrant au moins le plafond C4 (250 kVA), la configuration
+    # actuelle et les balayages restent exacts même au-delà de p_max
+    puissance_max_kva = max(parametres.p_max, 250)
+    index_depassement = construire_index_depassement(cdc, parametres.mode_index, puissance_max_kva)
+
+    index_mensuel = construire_index_mensuel(cdc_mensuelle, parametres.mode_index, puissance_max_kva)
+
+    regles = extraire_regles_turpe(regles_turpe, parametres.date_reference_turpe)
+    scenarios = generer_scenarios(
+        consos_agregees, cdc, index_depassement, regles,
+        p_min=parametres.p_min, p_max=parametres.p_max,
+        date_turpe=parametres.date_reference_turpe,
+    )
+    return (
+        calculer_couts(preparer_scenarios_turpe(scenarios), NoyauTurpe(regles), index_mensuel)
+        .select(COLONNES_RESULTATS)
+        .sort(['pdl', 'turpe_total_eur'])
+    )
@@ -0,0 +1,149 @@
+"""
+Qualité des courbes de charge : complétude, trous de mesure, valeurs invalides.
+
+Le diagnostic est calculé à l'étape 1 (analyser_courbe), dans le scan des dates de mesure
+par PRM, et non dans celui des agrégats par cadran de l'étape 2, refait pour chaque
+calendrier.
+"""
+
+from datetime import timedelta
+
+import polars as pl
+
+# Seuils de complétude (%) : avertissement en dessous de 95 %, erreur en dessous de 80 %
+SEUIL_COMPLETUDE_AVERTISSEMENT = 95.0
+SEUIL_COMPLETUDE_ERREUR = 80.0
+
+# Un trou est une période de plus d'une heure sans mesure
+DUREE_TROU_MIN = timedelta(hours=1)
+
+# Avertissement si les trous couvrent plus de 1 % de la période mesurée
+PART_TROUS_AVERTISSEMENT = 1.0
+
+
+def _expr_fin_mesure() -> pl.Expr:
+    """Fin de la période couverte par une mesure : Horodate + pas."""
+    return pl.col('Horodate') + pl.duration(microseconds=(pl.col('pas_heures') * 3.6e9).round().cast(pl.Int64))
+
+
+def exprs_statistiques_qualite() -> list[pl.Expr]:
+    """
+    Agrégats de qualité par PRM, à évaluer dans le même group_by que les dates de mesure.
+
+    Utilise 'Horodate', 'Valeur', 'Pas' et 'pas_heures'.
+    """
+    valeur_valide = pl.col('Valeur').is_not_null() & pl.col('Valeur').is_not_nan()
+    return [
+        pl.len().alias('nb_mesures'),
+        (pl.col('Valeur').is_null().sum() + pl.col('Valeur').is_nan().sum()).alias('nb_valeurs_manquantes'),
+        (pl.col('Valeur') < 0).sum().alias('nb_valeurs_negatives'),
+        # Pas mixtes (ex: PT5M puis PT10M après un changement de compteur)
+        pl.col('Pas').n_unique().alias('nb_pas_distincts'),
+        # Durée couverte par des mesures valides, et fin de la dernière mesure
+        pl.col('pas_heures').filter(valeur_valide).sum().alias('duree_mesuree_h'),
+        _expr_fin_mesure().max().alias('fin_mesures'),
+    ]
+
+
+def detecter_trous(fenetres: pl.LazyFrame, duree_min: timedelta = DUREE_TROU_MIN) -> pl.LazyFrame:
+    """
+    Périodes sans mesure de plus de duree_min, par PRM.
+
+    Lit un niveau de la pyramide des pics (fenêtres non vides) plutôt que la courbe.
+    Les fenêtres consécutives sont comparées après un tri sur (PRM, Horodate) des seules
+    colonnes utiles : ce tri n'est pas streaming, sa mémoire est proportionnelle au
+    nombre de fenêtres.
+
+    Args:
+        fenetres: Niveau de la pyramide ('Identifiant PRM', 'Horodate', 'pas_heures'),
+            cf. AnalyseCourbe.fenetres_pyramide['5m'] (LazyFrame ou DataFrame)
+        duree_min: Durée au-delà de laquelle une absence de mesure est un trou
+
+    Returns:
+        ('Identifiant PRM', 'debut', 'fin', 'duree_h'), du même type que fenetres
+    """
+    return (
+        fenetres
+        .select(['Identifiant PRM', 'Horodate', 'pas_heures'])
+        .sort(['Identifiant PRM', 'Horodate'])
+        .select([
+            'Identifiant PRM',
+            _expr_fin_mesure().alias('debut'),
+            pl.col('Horodate').shift(-1).over('Identifiant PRM').alias('fin'),
+        ])
+        .filter((pl.col('fin') - pl.col('debut')) > duree_min)
+        .with_columns(((pl.col('fin') - pl.col('debut')).dt.total_seconds() / 3600).alias('duree_h'))
+    )
+
+
+def diagnostiquer_qualite(
+    statistiques: pl.DataFrame,
+    trous: pl.DataFrame,
+    duree_analyse: timedelta = timedelta(days=365)
+) -> pl.DataFrame:
+    """
+    Diagnostic de qualité par PRM selon les seuils de SPECIFICATIONS.md.
+
+    Taux de complétude = durée couverte par des mesures valides / durée de la période mesurée
+    (de la première mesure à la fin de la dernière) : pour un pas fixe, c'est le rapport
+    entre mesures réelles et mesures attendues.
+
+    Args:
+        statistiques: Agrégats par PRM ('Identifiant PRM', 'date_debut', cf. exprs_statistiques_qualite)
+        trous: Trous de mesure (cf. detecter_trous)
+        duree_analyse: Durée attendue de la période analysée
+
+    Returns:
+        DataFrame par PRM : 'taux_completude_pct', 'periode_couverte_j', 'nb_trous', 'duree_trous_h',
+        'part_trous_pct', 'nb_valeurs_manquantes', 'nb_valeurs_negatives', 'nb_pas_distincts',
+        'niveau' ('ok', 'avertissement', 'erreur') et 'alertes' (messages)
+    """
+    duree_periode_h = (pl.col('fin_mesures') - pl.col('date_debut')).dt.total_seconds() / 3600
+    taux = pl.col('taux_completude_pct')
+
+    alertes = [
+        pl.when(taux < SEUIL_COMPLETUDE_ERREUR)
+        .then(pl.lit("Données insuffisantes pour une analyse fiable"))
+        .when(taux < SEUIL_COMPLETUDE_AVERTISSEMENT)
+        .then(pl.lit("Attention : données incomplètes, résultats potentiellement biaisés")),
+        pl.when(pl.col('part_trous_pct') > PART_TROUS_AVERTISSEMENT)
+        .then(pl.format("{} trou(s) de plus d'une heure ({} % de la période)",
+                        'nb_trous', pl.col('part_trous_pct').round(1))),
+        pl.when(pl.col('periode_couverte_j') < duree_analyse.days)
+        .then(pl.format("Moins d'un an de données ({} jours)", pl.col('periode_couverte_j').floor().cast(pl.Int64))),
+        pl.when(pl.col('nb_valeurs_manquantes') > 0)
+        .then(pl.format("{} valeur(s) manquante(s) (NaN)", 'nb_valeurs_manquantes')),
+        pl.when(pl.col('nb_valeurs_negatives') > 0)
+        .then(pl.format("{} valeur(s) négative(s)", 'nb_valeurs_negatives')),
+        pl.when(pl.col('nb_pas_distincts') > 1)
+        .then(pl.format("{} pas de mesure différents (cf. pas commun)", 'nb_pas_distincts')),
+    ]
+
+    trous_par_prm = trous.group_by('Identifiant PRM').agg([
+        pl.len().alias('nb_trous'),
+        pl.col('duree_h').sum().alias('duree_trous_h'),
+    ])
+    return (
+        statistiques
+        .join(trous_par_prm, on='Identifiant PRM', how='left')
+        .with_columns([
+            (100 * pl.col('duree_mesuree_h') / duree_periode_h).round(2).alias('taux_completude_pct'),
+            (duree_periode_h / 24).round(1).alias('periode_couverte_j'),
+            pl.col('nb_trous').fill_null(0),
+            pl.col('duree_trous_h').fill_null(0.0),
+        ])
+        .with_columns((100 * pl.col('duree_trous_h') / duree_periode_h).round(2).alias('part_trous_pct'))
+        .with_columns(pl.concat_list(alertes).list.drop_nulls().alias('alertes'))
+        .with_columns(
+            pl.when(taux < SEUIL_COMPLETUDE_ERREUR).then(pl.lit('erreur'))
+            .when(pl.col('alertes').list.len() > 0).then(pl.lit('avertissement'))
+            .otherwise(pl.lit('ok'))
+            .alias('niveau')
+        )
+        .select([
+            'Identifiant PRM', 'taux_completude_pct', 'periode_couverte_j', 'nb_trous', 'duree_trous_h',
+            'part_trous_pct', 'nb_valeurs_manquantes', 'nb_valeurs_negatives', 'nb_pas_distincts',
+            'niveau', 'alertes',
+        ])
+        .sort('Identifiant PRM')
+    )
@@ -0,0 +1,643 @@
+"""Génération des scénarios (FTA × puissances souscrites) et optimum exact BTSUP."""
+
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+
+def _colonnes_periode(date_turpe: datetime) -> list[pl.Expr]:
+    """Colonnes 'date_debut', 'date_fin' et 'nb_jours' de la période tarifaire simulée (un an)."""
+    return [
+        pl.lit(date_turpe).dt.replace_time_zone('Europe/Paris').alias('date_debut'),
+        pl.lit(date_turpe + timedelta(days=364)).dt.replace_time_zone('Europe/Paris').alias('date_fin'),
+        pl.lit(365).alias('nb_jours'),
+    ]
+
+
+def _deplier_intervalles(df: pl.DataFrame, debut: pl.Expr, fin: pl.Expr, nom: str) -> pl.DataFrame:
+    """
+    Une ligne par entier de [debut, fin] pour chaque ligne de df (aucune si fin < debut), dans l'ordre de df.
+
+    Équivalent de int_ranges + explode + drop_nulls, sans dépendre du défaut
+    empty_as_null d'explode (déprécié, il change en Polars 2.0).
+    """
+    bornes = df.select(debut.alias('debut'), fin.alias('fin'))
+    debuts = bornes['debut'].to_numpy()
+    longueurs = np.maximum(bornes['fin'].to_numpy() - debuts + 1, 0)
+    lignes = np.repeat(np.arange(df.height), longueurs)
+    decalages = np.arange(len(lignes)) - np.repeat(np.cumsum(longueurs) - longueurs, longueurs)
+    return df.gather(lignes).with_columns(pl.Series(nom, debuts[lignes] + decalages, dtype=pl.Int64))
+
+
+def generer_scenarios_btinf(
+    consos_agregees: pl.DataFrame,
+    puissances: list[int],
+    formules: tuple[str, ...] = ('BTINFCU4', 'BTINFMU4', 'BTINFLU'),
+    config_actuelle: dict = None,
+    date_turpe: datetime = datetime(2025, 8, 1)
+) -> pl.DataFrame:
+    """
+    Génère les scénarios BTINF mono-puissance (< 36 kVA) : PDL × puissances × FTA.
+
+    Les puissances inférieures à la pmax du PDL sont écartées (sauf scénario actuel).
+
+    Args:
+        consos_agregees: DataFrame avec énergies et 'pmax_moyenne_kva' par PDL
+        puissances: Puissances souscrites à tester (kVA)
+        formules: FTA BTINF à tester
+        config_actuelle: {'fta', 'puissance'} si la configuration actuelle est BTINF (optionnel)
+        date_turpe: Début de la période tarifaire simulée (un an)
+
+    Returns:
+        DataFrame des scénarios, puissance mono recopiée sur les 4 cadrans
+    """
+    df_scenarios = (
+        consos_agregees
+        .select(['pdl', 'energie_hph_kwh', 'energie_hch_kwh',
+                 'energie_hpb_kwh', 'energie_hcb_kwh', 'pmax_moyenne_kva'])
+        .with_columns(_colonnes_periode(date_turpe))
+        # Produit PDL × puissances × FTA, dans cet ordre
+        .join(pl.DataFrame({'puissance_souscrite_kva': pl.Series(puissances, dtype=pl.Int64)}), how='cross')
+        .join(pl.DataFrame({'formule_tarifaire_acheminement': pl.Series(formules, dtype=pl.String)}), how='cross')
+    )
+
+    # Marquer le scénario actuel si applicable
+    if config_actuelle:
+        df_scenarios = df_scenarios.with_columns([
+            (
+                (pl.col('puissance_souscrite_kva') == config_actuelle['puissance']) &
+                (pl.col('formule_tarifaire_acheminement') == config_actuelle['fta'])
+            ).alias('est_scenario_actuel')
+        ])
+    else:
+        df_scenarios = df_scenarios.with_columns([
+            pl.lit(False).alias('est_scenario_actuel')
+        ])
+
+    return (
+        df_scenarios
+        .filter(
+            # Garder soit les scénarios valides, soit le scénario actuel
+            (pl.col('puissance_souscrite_kva') >= pl.col('pmax_moyenne_kva')) |
+            pl.col('est_scenario_actuel')
+        )
+        .with_columns([
+            # Remplir les 4 colonnes avec la puissance mono pour BTINF
+            pl.col('puissance_souscrite_kva').alias('puissance_hph_kva'),
+            pl.col('puissance_souscrite_kva').alias('puissance_hch_kva'),
+            pl.col('puissance_souscrite_kva').alias('puissance_hpb_kva'),
+            pl.col('puissance_souscrite_kva').alias('puissance_hcb_kva'),
+        ])
+    )
+
+
+def _optimiser_puissances_btsup_lot(
+    depassement_par_cadran: dict[str, np.ndarray],
+    b_hph: float,
+    b_hch: float,
+    b_hpb: float,
+    b_hcb: float,
+    cmdps: float,
+    p_min: int = 36,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Programmation dynamique de optimiser_puissances_btsup pour plusieurs PDL à la fois.
+
+    Args:
+        depassement_par_cadran: Heures de dépassement par cadran, tableaux [n_pdl, plage]
+        b_hph, b_hch, b_hpb, b_hcb, cmdps, p_min: cf. optimiser_puissances_btsup
+
+    Returns:
+        Tuple (puissances [n_pdl, 4] dans l'ordre HPH, HCH, HPB, HCB, coûts [n_pdl])
+    """
+    coefficients = {
+        'HPH': b_hph - b_hch,
+        'HCH': b_hch - b_hpb,
+        'HPB': b_hpb - b_hcb,
+        'HCB': b_hcb,
+    }
+
+    puissances = p_min + np.arange(depassement_par_cadran['HPH'].shape[1])
+    indices = np.arange(len(puissances))
+
+    f_precedent = None
+    arg_precedents = []
+    for cadran in ('HPH', 'HCH', 'HPB', 'HCB'):
+        f = coefficients[cadran] * puissances + cmdps * depassement_par_cadran[cadran]
+        if f_precedent is not None:
+            # Minimum préfixe de f_{k-1} et indice (premier) où il est atteint, par PDL
+            min_prefixe = np.minimum.accumulate(f_precedent, axis=1)
+            nouveau_min = np.c_[
+                np.ones(len(f_precedent), dtype=bool), f_precedent[:, 1:] < min_prefixe[:, :-1]
+            ]
+            arg_precedents.append(np.maximum.accumulate(np.where(nouveau_min, indices, 0), axis=1))
+            f = f + min_prefixe
+        f_precedent = f
+
+    # Remontée : P_hcb optimal puis prédécesseurs
+    lignes = np.arange(len(f_precedent))
+    i = np.argmin(f_precedent, axis=1)
+    couts = f_precedent[lignes, i]
+    optimum = [i]
+    for arg in reversed(arg_precedents):
+        i = arg[lignes, i]
+        optimum.append(i)
+
+    return puissances[np.column_stack(optimum[::-1])], couts
+
+
+def optimiser_puissances_btsup(
+    depassement_par_cadran: dict[str, np.ndarray],
+    b_hph: float,
+    b_hch: float,
+    b_hpb: float,
+    b_hcb: float,
+    cmdps: float,
+    p_min: int = 36,
+) -> tuple[tuple[int, int, int, int], float]:
+    """
+    Optimum exact des 4 puissances BTSUP sous la contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb.
+
+    Le coût dépendant des puissances est séparable par cadran :
+    - part fixe : b_hph×P₁ + b_hch×(P₂-P₁) + b_hpb×(P₃-P₂) + b_hcb×(P₄-P₃)
+      = (b_hph-b_hch)×P₁ + (b_hch-b_hpb)×P₂ + (b_hpb-b_hcb)×P₃ + b_hcb×P₄
+    - dépassements : cmdps × Σ h_cadran(P_cadran)
+    La seule dépendance entre cadrans est la contrainte d'ordre, traitée par
+    programmation dynamique : f_k(p) = g_k(p) + min_{q ≤ p} f_{k-1}(q).
+    Le minimum préfixe se calcule en O(plage), soit O(4 × plage) au total.
+
+    Args:
+        depassement_par_cadran: Heures de dépassement par cadran ('HPH', 'HCH', 'HPB', 'HCB'),
+            tableau indexé par puissance - p_min (p_min, p_min+1, ..., p_max)
+        b_hph, b_hch, b_hpb, b_hcb: Coefficients de puissance TURPE (€/kVA/an)
+        cmdps: Composante mensuelle de dépassement (€/h)
+        p_min: Puissance correspondant à l'indice 0 des tableaux (kVA)
+
+    Returns:
+        Tuple ((P_hph, P_hch, P_hpb, P_hcb), coût annuel fixe puissance + dépassements hors cg/cc)
+    """
+    puissances, couts = _optimiser_puissances_btsup_lot(
+        {cadran: np.asarray(heures)[None, :] for cadran, heures in depassement_par_cadran.items()},
+        b_hph, b_hch, b_hpb, b_hcb, cmdps, p_min=p_min,
+    )
+    p_hph, p_hch, p_hpb, p_hcb = (int(p) for p in puissances[0])
+    return (p_hph, p_hch, p_hpb, p_hcb), float(couts[0])
+
+
+def generer_scenarios_optimaux_btsup(
+    consos_agregees: pl.DataFrame,
+    index_depassement,
+    regles_turpe: pl.DataFrame,
+    p_min: int = 36,
+    p_max: int = 250,
+    formules: tuple[str, ...] = ('BTSUPCU', 'BTSUPLU'),
+    config_actuelle: dict = None,
+    date_turpe: datetime = datetime(2025, 8, 1)
+) -> pl.DataFrame:
+    """
+    Génère un scénario par (PDL, FTA BTSUP) : l'optimum exact des 4 puissances.
+
+    Les heures de dépassement de tous les PDL sont réunies en tableaux [n_pdl, plage]
+    par cadran : la programmation dynamique traite tous les PDL d'une FTA en une fois.
+
+    Args:
+        consos_agregees: DataFrame avec énergies par PDL
+        index_depassement: IndexDepassement ou HistogrammeDepassement
+        regles_turpe: Règles applicables à date_turpe (cf. extraire_regles_turpe)
+        p_min, p_max: Plage de puissances autorisée (kVA)
+        formules: FTA BTSUP à optimiser
+        config_actuelle: Config actuelle pour marquage (optionnel)
+        date_turpe: Début de la période tarifaire simulée (un an)
+
+    Returns:
+        DataFrame avec une ligne par (PDL, FTA), au format des autres générateurs
+
+    Raises:
+        ValueError: Si regles_turpe n'a pas de règle pour l'une des formules
+            (electricore ne définit les FTA BTSUP qu'à partir du 01/08/2025)
+    """
+    p_min = max(36, p_min)
+    seuils = np.arange(p_min, p_max + 1)
+
+    regles_par_fta = {
+        row['Formule_Tarifaire_Acheminement']: row
+        for row in regles_turpe.filter(
+            pl.col('Formule_Tarifaire_Acheminement').is_in(list(formules))
+        ).iter_rows(named=True)
+    }
+    manquantes = [fta for fta in formules if fta not in regles_par_fta]
+    if manquantes:
+        raise ValueError(
+            f"Aucune règle TURPE pour la FTA {', '.join(manquantes)} au {date_turpe:%d/%m/%Y}"
+        )
+
+    if len(seuils) == 0 or len(formules) == 0 or consos_agregees.is_empty():
+        return pl.DataFrame(schema={
+            'pdl': consos_agregees.schema['pdl'],
+            'energie_hph_kwh': pl.Float64,
+            'energie_hch_kwh': pl.Float64,
+            'energie_hpb_kwh': pl.Float64,
+            'energie_hcb_kwh': pl.Float64,
+            'formule_tarifaire_acheminement': pl.String,
+            'puissance_hph_kva': pl.Int64,
+            'puissance_hch_kva': pl.Int64,
+            'puissance_hpb_kva': pl.Int64,
+            'puissance_hcb_kva': pl.Int64,
+            'date_debut': pl.Datetime(time_zone='Europe/Paris'),
+            'date_fin': pl.Datetime(time_zone='Europe/Paris'),
+            'nb_jours': pl.Int32,
+            'puissance_souscrite_kva': pl.Int64,
+            'est_scenario_actuel': pl.Boolean,
+        })
+
+    pdls = consos_agregees['pdl'].to_list()
+    depassement_par_cadran = {
+        cadran: np.stack([index_depassement.duree_depassement(pdl, cadran, seuils) for pdl in pdls])
+        for cadran in ('HPH', 'HCH', 'HPB', 'HCB')
+    }
+
+    # Puissances optimales [n_pdl, n_fta, 4]
+    puissances = np.stack([
+        _optimiser_puissances_btsup_lot(
+            depassement_par_cadran,
+            regles_par_fta[fta]['b_hph'], regles_par_fta[fta]['b_hch'],
+            regles_par_fta[fta]['b_hpb'], regles_par_fta[fta]['b_hcb'],
+            regles_par_fta[fta]['cmdps'] or 0.0,
+            p_min=p_min,
+        )[0]
+        for fta in formules
+    ], axis=1).reshape(-1, 4)
+
+    # Une ligne par (PDL, FTA), PDL par PDL
+    df_scenarios = (
+        consos_agregees
+        .select(['pdl', 'energie_hph_kwh', 'energie_hch_kwh', 'energie_hpb_kwh', 'energie_hcb_kwh'])
+        .select(pl.all().gather(np.repeat(np.arange(len(pdls)), len(formules))))
+        .with_columns([
+            pl.Series('formule_tarifaire_acheminement', list(formules) * len(pdls), dtype=pl.String),
+            *[
+                pl.Series(f'puissance_{cadran}_kva', puissances[:, i], dtype=pl.Int64)
+                for i, cadran in enumerate(('hph', 'hch', 'hpb', 'hcb'))
+            ],
+        ])
+        .with_columns([
+            *_colonnes_periode(date_turpe),
+            pl.col('puissance_hcb_kva').alias('puissance_souscrite_kva'),
+        ])
+    )
+
+    # Marquer scénario actuel si fourni
+    if config_actuelle is not None:
+        df_scenarios = df_scenarios.with_columns([
+            (
+                (pl.col('formule_tarifaire_acheminement') == config_actuelle['fta']) &
+                (pl.col('puissance_hph_kva') == config_actuelle['p_hph']) &
+                (pl.col('puissance_hch_kva') == config_actuelle['p_hch']) &
+                (pl.col('puissance_hpb_kva') == config_actuelle['p_hpb']) &
+                (pl.col('puissance_hcb_kva') == config_actuelle['p_hcb'])
+            ).alias('est_scenario_actuel')
+        ])
+    else:
+        df_scenarios = df_scenarios.with_columns([
+            pl.lit(False).alias('est_scenario_actuel')
+        ])
+
+    return df_scenarios
+
+
+def generer_scenarios_reduction_proportionnelle(
+    consos_agregees: pl.DataFrame,
+    cdc: pl.DataFrame,
+    seuil_depassement_h: float = 10.0,
+    config_actuelle: dict = None,
+    date_turpe: datetime = datetime(2025, 8, 1)
+) -> pl.DataFrame:
+    """
+    Génère les scénarios multi-cadrans par réduction proportionnelle simultanée.
+
+    Principe :
+    - Part de la puissance donnant ~seuil_depassement_h heures de dépassement pour chaque cadran
+    - Applique la contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb
+    - Réduit toutes les puissances de 1 kVA simultanément jusqu'à ce que le min atteigne 36
+
+    Args:
+        consos_agregees: DataFrame avec les consommations agrégées
+        config_actuelle: Dict optionnel avec les clés:
+            - 'fta': formule tarifaire actuelle (ex: 'BTSUPCU')
+            - 'p_hph', 'p_hch', 'p_hpb', 'p_hcb': puissances actuelles par cadran
+        date_turpe: Début de la période tarifaire simulée (un an)
+
+    Hypothèse : Le profil de charge est similaire entre cadrans (seule l'amplitude diffère)
+    """
+    # Étapes 1-2 : puissances initiales par PDL (seuil de dépassement + cascade)
+    puissances_initiales = calculer_puissances_initiales(consos_agregees, cdc, seuil_depassement_h)
+
+    # Étapes 3-4 : grille de réduction simultanée, une ligne par itération
+    grille = construire_grille_reduction(puissances_initiales)
+
+    return finaliser_scenarios_btsup(grille, consos_agregees, config_actuelle, date_turpe)
+
+
+def puissances_pour_depassement(
+    cdc: pl.DataFrame,
+    seuil_depassement_h: float
+) -> pl.DataFrame:
+    """
+    Puissance donnant environ seuil_depassement_h heures de dépassement, par PDL et cadran.
+
+    Args:
+        cdc: DataFrame avec colonnes 'Identifiant PRM', 'cadran', 'pmax', 'duree_depassement_h'
+        seuil_depassement_h: Heures de dépassement cibles (ex: 10h)
+
+    Returns:
+        DataFrame avec 'pdl', 'cadran' ('hph', 'hch', 'hpb', 'hcb'), 'puissance_kva'
+        (arrondie à l'entier supérieur) et 'pmax_observee_kva'
+    """
+    return (
+        cdc
+        .group_by(['Identifiant PRM', 'cadran'])
+        .agg([
+            # Le cumul de dépassement décroît avec pmax : plus grande pmax atteignant le seuil,
+            # sinon (aucune puissance ne donne ≥ seuil) la max observée
+            pl.col('pmax')
+              .filter(pl.col('duree_depassement_h') >= seuil_depassement_h)
+              .max()
+              .fill_null(pl.col('pmax').max())
+              .ceil()
+              .cast(pl.Int64)
+              .alias('puissance_kva'),
+            pl.col('pmax').max().ceil().cast(pl.Int64).alias('pmax_observee_kva'),
+        ])
+        .select([
+            pl.col('Identifiant PRM').alias('pdl'),
+            pl.col('cadran').cast(pl.String).str.to_lowercase(),
+            'puissance_kva',
+            'pmax_observee_kva',
+        ])
+    )
+
+
+def elargir_par_cadran(pdls: pl.DataFrame, par_cadran: pl.DataFrame, colonnes: dict[str, str]) -> pl.DataFrame:
+    """
+    Joint des valeurs par (PDL, cadran) en colonnes par cadran, une ligne par PDL.
+
+    Args:
+        pdls: DataFrame avec 'pdl'
+        par_cadran: DataFrame avec 'pdl', 'cadran' (minuscules) et les colonnes à élargir
+        colonnes: Colonne source → gabarit du nom cible (ex: {'puissance_kva': 'p_{}_base'})
+
+    Returns:
+        pdls complété des colonnes par cadran (null si le cadran est absent de la courbe)
+    """
+    for cadran in ('hph', 'hch', 'hpb', 'hcb'):
+        pdls = pdls.join(
+            par_cadran
+            .filter(pl.col('cadran') == cadran)
+            .select(['pdl', *[pl.col(source).alias(cible.format(cadran)) for source, cible in colonnes.items()]]),
+            on='pdl',
+            how='left'
+        )
+    return pdls
+
+
+def calculer_puissances_initiales(
+    consos_agregees: pl.DataFrame,
+    cdc: pl.DataFrame,
+    seuil_depassement_h: float
+) -> pl.DataFrame:
+    """
+    Puissances de départ par PDL pour les balayages par réduction simultanée.
+
+    1. Trouver puissance donnant ~seuil_depassement_h pour chaque PDL et cadran
+    2. Forcer contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb (cascade, plancher 36 kVA)
+
+    Returns:
+        DataFrame avec 'pdl' et 'p_{hph,hch,hpb,hcb}_initial' (une ligne par PDL)
+    """
+    # Au lieu de partir de pmax (qui peut avoir des pics isolés),
+    # partir de la puissance donnant ~seuil_depassement_h heures de dépassement
+    return (
+        elargir_par_cadran(
+            consos_agregees.select('pdl'),
+            puissances_pour_depassement(cdc, seuil_depassement_h),
+            {'puissance_kva': 'p_{}_base'},
+        )
+        # Cadran sans mesure : aucun dépassement possible, plancher BTSUP
+        .with_columns(pl.col('^p_.*_base$').fill_null(36))
+        .with_columns(pl.col('p_hph_base').clip(lower_bound=36).alias('p_hph_initial'))
+        .with_columns(pl.max_horizontal('p_hph_initial', 'p_hch_base').alias('p_hch_initial'))
+        .with_columns(pl.max_horizontal('p_hch_initial', 'p_hpb_base').alias('p_hpb_initial'))
+        .with_columns(pl.max_horizontal('p_hpb_initial', 'p_hcb_base').alias('p_hcb_initial'))
+    )
+
+
+def construire_grille_reduction(puissances_initiales: pl.DataFrame) -> pl.DataFrame:
+    """
+    Grille de réduction simultanée de 1 kVA depuis les puissances initiales jusqu'à 36 kVA.
+
+    Le minimum des puissances initiales détermine le nombre d'itérations.
+
+    Returns:
+        DataFrame avec 'pdl', 'puissance_{hph,hch,hpb,hcb}_kva' et 'iteration'
+    """
+    return (
+        _deplier_intervalles(
+            puissances_initiales,
+            pl.lit(0),
+            pl.min_horizontal('p_hph_initial', 'p_hch_initial', 'p_hpb_initial', 'p_hcb_initial') - 36,
+            'iteration',
+        )
+        .select([
+            'pdl',
+            *[
+                (pl.col(f'p_{cadran}_initial') - pl.col('iteration'))
+                  .clip(lower_bound=36)
+                  .alias(f'puissance_{cadran}_kva')
+                for cadran in ('hph', 'hch', 'hpb', 'hcb')
+            ],
+            'iteration',
+        ])
+    )
+
+
+def finaliser_scenarios_btsup(
+    grille: pl.DataFrame,
+    consos_agregees: pl.DataFrame,
+    config_actuelle: dict = None,
+    date_turpe: datetime = datetime(2025, 8, 1)
+) -> pl.DataFrame:
+    """
+    Complète une grille de puissances BTSUP en scénarios prêts pour electricore.
+
+    Les énergies par PDL ne sont jointes qu'à la fin (au lieu d'être recopiées dans
+    chaque scénario), puis la grille est croisée avec les FTA BTSUPCU/BTSUPLU.
+
+    Args:
+        grille: DataFrame avec 'pdl' et 'puissance_{hph,hch,hpb,hcb}_kva'
+        consos_agregees: DataFrame avec énergies par PDL
+        config_actuelle: Config actuelle pour marquage (optionnel)
+        date_turpe: Début de la période tarifaire simulée (un an)
+
+    Returns:
+        DataFrame de scénarios (une ligne par puissance × FTA)
+    """
+    df_scenarios = (
+        grille
+        .join(
+            consos_agregees.select([
+                'pdl', 'energie_hph_kwh', 'energie_hch_kwh', 'energie_hpb_kwh', 'energie_hcb_kwh'
+            ]),
+            on='pdl',
+            how='left'
+        )
+        .join(
+            pl.DataFrame({'formule_tarifaire_acheminement': ['BTSUPCU', 'BTSUPLU']}),
+            how='cross'
+        )
+        .with_columns([
+            *_colonnes_periode(date_turpe),
+            pl.col('puissance_hcb_kva').alias('puissance_souscrite_kva'),  # Max pour compatibilité
+        ])
+    )
+
+    # Marquer le scénario actuel si fourni
+    if config_actuelle is not None:
+        df_scenarios = df_scenarios.with_columns([
+            (
+                (pl.col('formule_tarifaire_acheminement') == config_actuelle['fta']) &
+                (pl.col('puissance_hph_kva') == config_actuelle['p_hph']) &
+                (pl.col('puissance_hch_kva') == config_actuelle['p_hch']) &
+                (pl.col('puissance_hpb_kva') == config_actuelle['p_hpb']) &
+                (pl.col('puissance_hcb_kva') == config_actuelle['p_hcb'])
+            ).alias('est_scenario_actuel')
+        ])
+    else:
+        df_scenarios = df_scenarios.with_columns([
+            pl.lit(False).alias('est_scenario_actuel')
+        ])
+
+    return df_scenarios
+
+
+def generer_scenarios_reduction_depuis_seuil(
+    consos_agregees: pl.DataFrame,
+    cdc: pl.DataFrame,
+    seuil_depassement_h: float = 10.0,
+    config_actuelle: dict = None,
+    date_turpe: datetime = datetime(2025, 8, 1)
+) -> pl.DataFrame:
+    """
+    Génère scénarios par réduction simultanée depuis un seuil de dépassement constant.
+
+    Principe :
+    1. Trouver puissance donnant ~seuil_depassement_h pour chaque cadran
+    2. Forcer contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb (cascade)
+    3. Réduire simultanément de 1 kVA jusqu'à 36 kVA
+
+    Args:
+        consos_agregees: DataFrame avec énergies par PDL
+        cdc: DataFrame avec colonnes 'cadran', 'pmax', 'duree_depassement_h'
+        seuil_depassement_h: Heures de dépassement initial (défaut: 10h)
+        config_actuelle: Config actuelle pour marquage (optionnel)
+        date_turpe: Début de la période tarifaire simulée (un an)
+
+    Returns:
+        DataFrame avec scénarios générés
+    """
+    puissances_initiales = calculer_puissances_initiales(consos_agregees, cdc, seuil_depassement_h)
+
+    for row in puissances_initiales.iter_rows(named=True):
+        logger.info(
+            "PDL %s : initialisation depuis %sh de dépassement, "
+            "base HPH %s, HCH %s, HPB %s, HCB %s, après contrainte HPH %s, HCH %s, HPB %s, HCB %s",
+            row['pdl'], seuil_depassement_h,
+            row['p_hph_base'], row['p_hch_base'], row['p_hpb_base'], row['p_hcb_base'],
+            row['p_hph_initial'], row['p_hch_initial'], row['p_hpb_initial'], row['p_hcb_initial'],
+        )
+
+    grille = construire_grille_reduction(puissances_initiales).drop('iteration')
+    logger.info("%d scénarios de réduction générés", len(grille))
+
+    return finaliser_scenarios_btsup(grille, consos_agregees, config_actuelle, date_turpe)
+
+
+def calculer_plages_optimisation(
+    cdc: pl.DataFrame,
+    seuil_depassement_max_h: float = 200.0
+) -> pl.DataFrame:
+    """
+    Plage réaliste de puissances à explorer, par PDL et cadran.
+
+    - Borne basse : puissance donnant ~seuil_depassement_max_h heures de dépassement
+      (au-delà, augmenter la puissance souscrite devient rentable), plancher 36 kVA
+    - Borne haute : pmax observée du cadran (aucun dépassement)
+
+    Returns:
+        DataFrame avec 'pdl', 'cadran', 'p_min' et 'p_max' (kVA)
+    """
+    return (
+        puissances_pour_depassement(cdc, seuil_depassement_max_h)
+        .with_columns(pl.col('puissance_kva').clip(lower_bound=36).alias('p_min'))
+        .with_columns(pl.max_horizontal('p_min', 'pmax_observee_kva').alias('p_max'))
+        .select(['pdl', 'cadran', 'p_min', 'p_max'])
+    )
+
+
+def generer_scenarios_exhaustifs(
+    consos_agregees: pl.DataFrame,
+    cdc: pl.DataFrame,
+    config_actuelle: dict = None,
+    date_turpe: datetime = datetime(2025, 8, 1)
+) -> pl.DataFrame:
+    """
+    Génère TOUS les scénarios valides avec contrainte P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb.
+
+    Les combinaisons croissantes sont construites colonne par colonne, par intervalles :
+    P_hch part de max(P_hph, min_hch), P_hpb de max(P_hch, min_hpb), etc. On obtient
+    exactement les combinaisons croissantes dans les plages réalistes par cadran,
+    sans énumérer puis filtrer le produit cartésien.
+
+    Args:
+        consos_agregees: DataFrame avec énergies par PDL et cadran
+        cdc: DataFrame avec colonnes 'cadran', 'pmax', 'duree_depassement_h'
+        config_actuelle: Config actuelle pour marquage (optionnel)
+        date_turpe: Début de la période tarifaire simulée (un an)
+
+    Returns:
+        DataFrame avec tous les scénarios valides
+    """
+    # Calculer plages réalistes par PDL et cadran
+    plages = elargir_par_cadran(
+        consos_agregees.select('pdl'),
+        calculer_plages_optimisation(cdc),
+        {'p_min': 'p_{}_min', 'p_max': 'p_{}_max'},
+    ).drop_nulls()
+
+    # Grille croissante : chaque cadran démarre au max(cadran précédent, borne basse)
+    grille = plages
+    precedent = None
+    for cadran in ('hph', 'hch', 'hpb', 'hcb'):
+        debut = pl.col(f'p_{cadran}_min')
+        if precedent is not None:
+            debut = pl.max_horizontal(pl.col(precedent), debut)
+        grille = _deplier_intervalles(grille, debut, pl.col(f'p_{cadran}_max'), f'puissance_{cadran}_kva')
+        precedent = f'puissance_{cadran}_kva'
+    grille = grille.select(['pdl', *[f'puissance_{cadran}_kva' for cadran in ('hph', 'hch', 'hpb', 'hcb')]])
+
+    for row in plages.join(grille.group_by('pdl').len(), on='pdl', how='left').iter_rows(named=True):
+        logger.info(
+            "PDL %s : %d scénarios, plages HPH [%s-%s], HCH [%s-%s], HPB [%s-%s], HCB [%s-%s]",
+            row['pdl'], row['len'] or 0,
+            row['p_hph_min'], row['p_hph_max'], row['p_hch_min'], row['p_hch_max'],
+            row['p_hpb_min'], row['p_hpb_max'], row['p_hcb_min'], row['p_hcb_max'],
+        )
+
+    # Protection : Gérer le cas 0 scénarios générés (profil < 36 kVA partout)
+    if len(grille) == 0:
+        logger.warning("Aucun scénario exhaustif généré (profil probablement < 36 kVA)")
+
+    return finaliser_scenarios_btsup(grille, consos_agregees, config_actuelle, date_turpe)
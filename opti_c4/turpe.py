@@ -0,0 +1,245 @@
+"""Calcul TURPE : noyau en forme fermée par FTA et contrôle contre electricore."""
+
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+from opti_c4.depassement import CubeDepassementMensuel, IndexDepassementMensuel
+
+
+def extraire_regles_turpe(regles: pl.LazyFrame, date_reference: datetime) -> pl.DataFrame:
+    """
+    Sélectionne la règle TURPE applicable à une date pour chaque FTA.
+
+    Même filtre temporel qu'electricore : start <= date_reference < end (end nul = sans fin).
+
+    Args:
+        regles: LazyFrame issu de load_turpe_rules()
+        date_reference: Date de début de la période tarifaire simulée
+
+    Returns:
+        DataFrame avec une ligne par FTA ('Formule_Tarifaire_Acheminement', cg, cc, b, b_*, c_*, cmdps)
+    """
+    date_reference = pl.lit(date_reference).dt.replace_time_zone('Europe/Paris')
+    return (
+        regles
+        .filter(
+            (pl.col('start') <= date_reference) &
+            (pl.col('end').is_null() | (date_reference < pl.col('end')))
+        )
+        .collect()
+    )
+
+
+class NoyauTurpe:
+    """
+    Noyau TURPE en forme fermée : coefficients par FTA extraits une fois, scénarios évalués en NumPy.
+
+    Pour une FTA et une période tarifaire données, les formules electricore sont linéaires :
+    - fixe annuel = cg + cc + b×P (C5)
+                  ou cg + cc + (b_hph-b_hch)×P₁ + (b_hch-b_hpb)×P₂ + (b_hpb-b_hcb)×P₃ + b_hcb×P₄ (C4)
+    - variable = Σ energie_cadran × c_cadran / 100
+    - dépassement = Σ_mois Σ_cadran heures_dépassement × cmdps (C4 uniquement)
+
+    Chaque FTA devient donc un vecteur de coefficients ; les scénarios sont une matrice de
+    variables (puissances, énergies) et le coût est un produit ligne à ligne avec le vecteur
+    de leur FTA. Les arrondis d'electricore (2 décimales sur le fixe et la somme des cadrans)
+    sont reproduits.
+    """
+
+    VARIABLES_FIXE = (
+        'puissance_souscrite_kva',
+        'puissance_hph_kva', 'puissance_hch_kva', 'puissance_hpb_kva', 'puissance_hcb_kva',
+    )
+    CADRANS_ENERGIE = ('hph', 'hch', 'hpb', 'hcb', 'hp', 'hc', 'base')
+
+    def __init__(self, regles: pl.DataFrame):
+        """
+        Args:
+            regles: Une règle par FTA (cf. extraire_regles_turpe)
+        """
+        self.formules = regles['Formule_Tarifaire_Acheminement'].to_list()
+
+        def colonne(nom: str) -> np.ndarray:
+            return regles[nom].fill_null(0.0).to_numpy()
+
+        est_c4 = (
+            regles.select(
+                pl.all_horizontal([pl.col(f'b_{c}').is_not_null() for c in ('hph', 'hch', 'hpb', 'hcb')])
+            )
+            .to_series()
+            .to_numpy()
+        )
+        b, b_hph, b_hch, b_hpb, b_hcb = (colonne(n) for n in ('b', 'b_hph', 'b_hch', 'b_hpb', 'b_hcb'))
+
+        # Coefficients fixes (€/an) : [constante, P, P₁, P₂, P₃, P₄]
+        self.coefficients_fixe = np.column_stack([
+            colonne('cg') + colonne('cc'),
+            np.where(est_c4, 0.0, b),
+            np.where(est_c4, b_hph - b_hch, 0.0),
+            np.where(est_c4, b_hch - b_hpb, 0.0),
+            np.where(est_c4, b_hpb - b_hcb, 0.0),
+            np.where(est_c4, b_hcb, 0.0),
+        ])
+        # Coefficients énergie (€/kWh) par cadran
+        self.coefficients_energie = np.column_stack([
+            colonne(f'c_{cadran}') / 100 for cadran in self.CADRANS_ENERGIE
+        ])
+        # Composante de dépassement (€/h), 0 pour C5
+        self.cmdps = colonne('cmdps')
+
+    @classmethod
+    def depuis_regles(cls, regles: pl.LazyFrame, date_reference: datetime) -> 'NoyauTurpe':
+        """Construit le noyau depuis load_turpe_rules() pour la période débutant à date_reference."""
+        return cls(extraire_regles_turpe(regles, date_reference))
+
+    def _indices_fta(self, scenarios: pl.DataFrame) -> np.ndarray:
+        """Indice de la règle de chaque scénario dans self.formules (-1 si FTA inconnue)."""
+        return (
+            scenarios['formule_tarifaire_acheminement']
+            .cast(pl.String)
+            .replace_strict(self.formules, list(range(len(self.formules))), default=-1, return_dtype=pl.Int64)
+            .to_numpy()
+        )
+
+    def cout_depassement_mensuel(
+        self,
+        scenarios: pl.DataFrame,
+        index_mensuel: 'IndexDepassementMensuel | CubeDepassementMensuel'
+    ) -> np.ndarray:
+        """
+        Coût des dépassements par mois et par cadran (€) : heures × cmdps de la FTA.
+
+        Args:
+            scenarios: DataFrame avec 'pdl', 'formule_tarifaire_acheminement'
+                et 'puissance_{hph,hch,hpb,hcb}_kva'
+            index_mensuel: Heures de dépassement par (PRM, mois, cadran)
+
+        Returns:
+            Tableau [n_scenarios, n_mois, 4] (0 pour les FTA sans cmdps)
+        """
+        indices_fta = self._indices_fta(scenarios)
+        cmdps = np.where(indices_fta >= 0, self.cmdps[indices_fta], 0.0)
+        return index_mensuel.duree_depassement_mensuelle(scenarios) * cmdps[:, None, None]
+
+    def calculer(
+        self,
+        scenarios: pl.DataFrame,
+        index_mensuel: 'IndexDepassementMensuel | CubeDepassementMensuel'
+    ) -> pl.DataFrame:
+        """
+        Ajoute turpe_fixe_eur, turpe_variable_eur et turpe_depassement_eur à tous les scénarios.
+
+        Args:
+            scenarios: DataFrame avec 'pdl', 'formule_tarifaire_acheminement', 'nb_jours',
+                les puissances et 'energie_{hph,hch,hpb,hcb}_kwh'
+            index_mensuel: Heures de dépassement par (PRM, mois, cadran)
+
+        Returns:
+            DataFrame des scénarios dont la FTA a une règle (comme electricore),
+            avec les colonnes turpe_fixe_eur, turpe_variable_eur et turpe_depassement_eur
+        """
+        indices_fta = self._indices_fta(scenarios)
+        connus = indices_fta >= 0
+        scenarios = scenarios.filter(pl.Series(connus))
+        indices_fta = indices_fta[connus]
+
+        variables_fixe = np.column_stack([
+            np.ones(scenarios.height),
+            scenarios.select(self.VARIABLES_FIXE).cast(pl.Float64).fill_null(0.0).to_numpy(),
+        ])
+        energies = (
+            scenarios
+            .select([
+                pl.col('energie_hph_kwh'), pl.col('energie_hch_kwh'),
+                pl.col('energie_hpb_kwh'), pl.col('energie_hcb_kwh'),
+                # Colonnes agrégées pour formules C5 (HP/HC/Base)
+                (pl.col('energie_hph_kwh') + pl.col('energie_hpb_kwh')).alias('energie_hp_kwh'),
+                (pl.col('energie_hch_kwh') + pl.col('energie_hcb_kwh')).alias('energie_hc_kwh'),
+                pl.sum_horizontal(
+                    'energie_hph_kwh', 'energie_hch_kwh', 'energie_hpb_kwh', 'energie_hcb_kwh'
+                ).alias('energie_base_kwh'),
+            ])
+            .cast(pl.Float64)
+            .fill_null(0.0)
+            .to_numpy()
+        )
+        nb_jours = scenarios['nb_jours'].cast(pl.Float64).to_numpy()
+        depassement = self.cout_depassement_mensuel(scenarios, index_mensuel).sum(axis=(1, 2))
+
+        fixe_annuel = np.einsum('ij,ij->i', variables_fixe, self.coefficients_fixe[indices_fta])
+        variable_cadrans = np.einsum('ij,ij->i', energies, self.coefficients_energie[indices_fta])
+
+        return scenarios.with_columns([
+            pl.Series('turpe_fixe_eur', fixe_annuel / 365 * nb_jours).round(2),
+            pl.Series('turpe_variable_eur', variable_cadrans).round(2),
+            pl.Series('turpe_depassement_eur', depassement),
+        ])
+
+
+def verifier_noyau_turpe(
+    resultats_noyau: pl.DataFrame,
+    regles: pl.LazyFrame,
+    taille_echantillon: int = 200,
+    graine: int = 0,
+    tolerance_eur: float = 0.01
+) -> tuple[int, float]:
+    """
+    Vérifie le noyau TURPE contre electricore sur un échantillon de scénarios.
+
+    Args:
+        resultats_noyau: Scénarios préparés pour electricore (debut, fin, puissance_souscrite_*_kva,
+            duree_depassement_h) avec turpe_fixe_eur / turpe_variable_eur / turpe_depassement_eur
+            calculés par NoyauTurpe. electricore intègre duree_depassement_h × cmdps dans sa part
+            variable : elle est comparée à variable + dépassement mensuel.
+        regles: LazyFrame issu de load_turpe_rules()
+        taille_echantillon: Nombre de lignes recalculées par electricore
+        graine: Graine de l'échantillonnage
+        tolerance_eur: Écart maximal toléré (€)
+
+    Returns:
+        Tuple (nombre de lignes vérifiées, écart maximal en €)
+
+    Raises:
+        ValueError: Si un écart dépasse tolerance_eur
+    """
+    # Import différé : electricore n'est chargé que pour ce contrôle, pas par le moteur
+    from electricore.core.pipelines.turpe import ajouter_turpe_fixe, ajouter_turpe_variable
+
+    echantillon = (
+        resultats_noyau
+        .with_row_index('_ligne')
+        .sample(n=min(taille_echantillon, resultats_noyau.height), seed=graine)
+    )
+    reference = (
+        echantillon
+        .drop(['turpe_fixe_eur', 'turpe_variable_eur', 'turpe_depassement_eur'])
+        .lazy()
+        .pipe(ajouter_turpe_fixe, regles=regles)
+        .pipe(ajouter_turpe_variable, regles=regles)
+        .select(['_ligne', 'turpe_fixe_eur', 'turpe_variable_eur'])
+        .collect()
+    )
+    ecarts = (
+        echantillon
+        .select([
+            '_ligne',
+            'turpe_fixe_eur',
+            (pl.col('turpe_variable_eur') + pl.col('turpe_depassement_eur')).alias('turpe_variable_eur'),
+        ])
+        .join(reference, on='_ligne', suffix='_electricore')
+        .select(
+            pl.max_horizontal(
+                (pl.col('turpe_fixe_eur') - pl.col('turpe_fixe_eur_electricore')).abs(),
+                (pl.col('turpe_variable_eur') - pl.col('turpe_variable_eur_electricore')).abs(),
+            ).alias('ecart')
+        )
+    )
+    ecart_max = ecarts['ecart'].max() or 0.0
+    if ecart_max > tolerance_eur:
+        raise ValueError(
+            f"Noyau TURPE non équivalent à electricore : écart max {ecart_max:.4f} € "
+            f"sur {len(ecarts)} scénarios échantillonnés"
+        )
+    return len(ecarts), ecart_max
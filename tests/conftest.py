@@ -0,0 +1,30 @@
+"""Données synthétiques partagées : courbe PA typée de deux PRM."""
+
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+import pytest
+
+
+@pytest.fixture
+def courbe() -> pl.DataFrame:
+    """
+    Courbe PA typée (cf. scanner_courbe_r63) de deux PRM au pas de 10 min, d'octobre 2024 à janvier 2025.
+
+    Puissances apparentes (cf. expr_pmax) multiples de 1/8 kVA : leurs sommes sont exactes
+    quel que soit l'ordre de sommation du moteur streaming, les moyennes sont reproductibles.
+    """
+    horodates = pl.datetime_range(
+        datetime(2024, 10, 1), datetime(2025, 1, 31, 23, 50), '10m', eager=True
+    )
+    rng = np.random.default_rng(3)
+    return pl.concat([
+        pl.DataFrame({
+            'Identifiant PRM': np.full(len(horodates), prm),
+            'Horodate': horodates,
+            'Valeur': np.round(rng.gamma(4.0, echelle, len(horodates)) * 8) / 8 / 1.10,
+            'Pas': 'PT10M',
+        })
+        for prm, echelle in ((30000000000001, 8.0), (30000000000002, 3.0))
+    ])
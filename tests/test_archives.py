@@ -0,0 +1,96 @@
+"""Extraction incrémentale des archives : le manifeste évite de ré-extraire les archives inchangées."""
+
+import os
+import zipfile
+from pathlib import Path
+
+import polars as pl
+
+from opti_c4.archives import extraire_dossier, lire_manifeste, scanner_extraction
+
+MOT_DE_PASSE = 'secret'
+
+
+def _archive(dossier: Path, nom: str, membres: dict[str, pl.DataFrame]) -> Path:
+    """Archive ZIP de CSV ';' (non chiffrée : zipfile n'écrit pas ZipCrypto)."""
+    archive = dossier / nom
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for membre, df in membres.items():
+            zf.writestr(membre, df.write_csv(separator=';'))
+    return archive
+
+
+def _extraire(dossier: Path, **kwargs) -> pl.DataFrame:
+    return extraire_dossier(dossier, MOT_DE_PASSE, nb_processus=1, dechiffrer_par_7z=False, **kwargs)
+
+
+def test_manifeste_evite_la_reextraction(tmp_path):
+    m2 = _archive(tmp_path, 'ENEDIS_TURPE7HC_M-2_GRD-F091_001.zip', {
+        'ENEDIS_M-2_001_20250901000000.csv': pl.DataFrame({'PRM': ['1', '2'], 'mois': ['2025-08', '2025-08']}),
+    })
+    _archive(tmp_path, 'ENEDIS_TURPE7HC_M-6_GRD-F091_001.zip', {
+        'ENEDIS_M-6_001_20250901000000.csv': pl.DataFrame({'PRM': ['1'], 'FTA': ['BTSUPCU']}),
+    })
+
+    premiere = _extraire(tmp_path)
+    assert premiere.select(['type', 'lignes', 'depuis_manifeste']).rows() == [('M-2', 2, False), ('M-6', 1, False)]
+    assert premiere['erreur'].is_null().all()
+    manifeste = lire_manifeste(tmp_path / '.extraction' / 'manifeste.json')
+    assert sorted(manifeste) == sorted(premiere['archive'])
+
+    # Relance : tout est servi par le manifeste, même une archive seulement touchée
+    os.utime(m2, (0, 0))
+    relance = _extraire(tmp_path)
+    assert relance['depuis_manifeste'].all()
+    assert relance.drop('depuis_manifeste').equals(premiere.drop('depuis_manifeste'))
+
+    # Archive remplacée : seule elle est ré-extraite, son ancien Parquet est supprimé
+    _archive(tmp_path, m2.name, {
+        'ENEDIS_M-2_001_20251001000000.csv': pl.DataFrame({'PRM': ['1', '2', '3'], 'mois': ['2025-09'] * 3}),
+    })
+    remplacee = _extraire(tmp_path)
+    assert remplacee.select(['type', 'lignes', 'depuis_manifeste']).rows() == [('M-2', 3, False), ('M-6', 1, True)]
+    assert sorted(p.name for p in (tmp_path / '.extraction').glob('*.parquet')) == sorted(
+        Path(f).name for f in remplacee['fichier']
+    )
+
+    # Filtrage par type de flux
+    assert _extraire(tmp_path, types=['M-6'])['type'].to_list() == ['M-6']
+
+
+def test_extraction_tronquee_reextraite(tmp_path):
+    _archive(tmp_path, 'ENEDIS_TURPE7HC_M-2_GRD-F091_001.zip', {
+        'ENEDIS_M-2_001_20250901000000.csv': pl.DataFrame({'PRM': ['1', '2'], 'mois': ['2025-08', '2025-08']}),
+    })
+    fichier = Path(_extraire(tmp_path)['fichier'][0])
+    fichier.write_bytes(fichier.read_bytes()[:10])
+
+    relance = _extraire(tmp_path)
+    assert not relance['depuis_manifeste'][0]
+    assert pl.read_parquet(relance['fichier'][0]).height == 2
+
+
+def test_archive_illisible_non_consignee(tmp_path):
+    (tmp_path / 'ENEDIS_TURPE7HC_M-2_GRD-F091_001.zip').write_bytes(b'pas une archive')
+
+    extraction = _extraire(tmp_path)
+    assert extraction['membre'].is_null().all()
+    assert extraction['erreur'][0].startswith('BadZipFile')
+    assert lire_manifeste(tmp_path / '.extraction' / 'manifeste.json') == {}
+
+
+def test_scanner_extraction_restreint_aux_clients(tmp_path):
+    _archive(tmp_path, 'ENEDIS_TURPE7HC_M-6_GRD-F091_001.zip', {
+        'ENEDIS_M-6_001_20250901000000.csv': pl.DataFrame({'PRM': [1, 2, 3], 'FTA': ['BTINFCU4'] * 3}),
+        'ENEDIS_M-6_002_20251001000000.csv': pl.DataFrame({'PRM': [2], 'FTA': ['BTSUPCU'], 'NOUVELLE': ['x']}),
+    })
+    lignes = (
+        scanner_extraction(_extraire(tmp_path), 'M-6', pl.DataFrame({'PRM': ['2', '3']}))
+        .collect(engine='streaming')
+        .sort(['PRM', '_source_timestamp'])
+    )
+    assert lignes.rows() == [
+        ('2', 'BTINFCU4', '20250901000000', 'ENEDIS_M-6_001_20250901000000.csv', None),
+        ('2', 'BTSUPCU', '20251001000000', 'ENEDIS_M-6_002_20251001000000.csv', 'x'),
+        ('3', 'BTINFCU4', '20250901000000', 'ENEDIS_M-6_001_20250901000000.csv', None),
+    ]
@@ -0,0 +1,34 @@
+"""Batch : un processus de travail perdu n'impute l'échec qu'au PRM qui l'a provoqué."""
+
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from opti_c4.batch import executer_par_prm
+from opti_c4.fichiers import limiter_threads_polars
+
+PRM_FATAL = 7
+
+
+def _traiter(prm: int) -> int:
+    """Double le PRM ; le processus meurt sans exception sur PRM_FATAL (comme un OOM kill)."""
+    if prm == PRM_FATAL:
+        os._exit(1)
+    if prm == 3:
+        raise ValueError("donnée invalide")
+    return 2 * prm
+
+
+def test_processus_perdu_n_echoue_que_son_prm():
+    prms = list(range(12))
+    execution = list(executer_par_prm(
+        _traiter, prms, nb_processus=2, initializer=limiter_threads_polars, initargs=(1,), fenetre=4,
+    ))
+
+    # Chaque PRM une seule fois, y compris ceux en cours quand le pool a été rompu
+    assert sorted(prm for prm, _, _ in execution) == prms
+    retours = {prm: (resultat, exc) for prm, resultat, exc in execution}
+    assert isinstance(retours[PRM_FATAL][1], BrokenProcessPool)
+    assert isinstance(retours[3][1], ValueError)
+    assert {prm: resultat for prm, (resultat, exc) in retours.items() if exc is None} == {
+        prm: 2 * prm for prm in prms if prm not in (3, PRM_FATAL)
+    }
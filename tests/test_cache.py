@@ -0,0 +1,99 @@
+"""Caches sur disque : adressage par contenu et éviction LRU concurrente."""
+
+import os
+from pathlib import Path
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from opti_c4.cache_resultats import optimiser_courbe_avec_cache
+from opti_c4.courbe import charger_courbe_avec_cache, evincer_cache_lru
+from opti_c4.pipeline import ParametresOptimisation
+
+
+def _remplir_cache(dossier: Path, n: int, taille: int = 100) -> list[Path]:
+    """n entrées de taille octets, de la moins à la plus récemment utilisée."""
+    entrees = []
+    for i in range(n):
+        fichier = dossier / f'courbe_{i}.arrow'
+        fichier.write_bytes(b'x' * taille)
+        os.utime(fichier, (i, i))
+        entrees.append(fichier)
+    return entrees
+
+
+def test_eviction_lru_supprime_les_plus_anciennes(tmp_path):
+    entrees = _remplir_cache(tmp_path, 5)
+    supprimes = evincer_cache_lru(tmp_path, 250, proteger=entrees[0])
+    assert supprimes == entrees[1:4]
+    assert sorted(tmp_path.iterdir()) == [entrees[0], entrees[4]]
+
+
+def test_eviction_lru_ignore_les_entrees_supprimees_par_un_autre_processus(tmp_path, monkeypatch):
+    entrees = _remplir_cache(tmp_path, 5)
+
+    # Un autre worker supprime chaque entrée juste avant nous
+    unlink = Path.unlink
+
+    def unlink_concurrent(self, *args, **kwargs):
+        unlink(self)
+        return unlink(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, 'unlink', unlink_concurrent)
+    assert evincer_cache_lru(tmp_path, 250) == []
+    assert sorted(tmp_path.iterdir()) == entrees[3:]
+
+
+def _r63(courbe: pl.DataFrame) -> bytes:
+    """Export R63 (CSV, puissances en W) d'une courbe PA typée."""
+    return (
+        courbe
+        .select([
+            'Identifiant PRM',
+            pl.lit('PA').alias('Grandeur physique'),
+            pl.col('Horodate').dt.strftime('%Y-%m-%d %H:%M:%S'),
+            (pl.col('Valeur') * 1000).round().cast(pl.Int64).alias('Valeur'),
+            'Pas',
+        ])
+        .write_csv(separator=';')
+        .encode()
+    )
+
+
+def test_cache_courbe_adresse_par_contenu(tmp_path, courbe):
+    contenu = _r63(courbe)
+    premiere = charger_courbe_avec_cache(contenu, tmp_path).collect()
+    # R63 en W entiers : au watt près
+    assert_frame_equal(premiere, courbe, check_dtypes=False, abs_tol=1e-3)
+    (entree,) = tmp_path.glob('courbe_*.arrow')
+
+    # Même contenu : relu depuis la même entrée ; autre contenu : nouvelle entrée
+    os.utime(entree, (0, 0))
+    assert charger_courbe_avec_cache(contenu, tmp_path).collect().equals(premiere)
+    assert entree.stat().st_mtime > 0
+    charger_courbe_avec_cache(_r63(courbe.head(10)), tmp_path)
+    assert len(list(tmp_path.glob('courbe_*.arrow'))) == 2
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_cache_resultats_reutilise_les_resultats(tmp_path, courbe):
+    calculs = []
+
+    def calculer():
+        calculs.append(1)
+        return pl.DataFrame({'pdl': ['1'], 'turpe_total_eur': [float(len(calculs))]})
+
+    def optimiser(courbe, parametres=ParametresOptimisation()):
+        return optimiser_courbe_avec_cache(
+            courbe, None, parametres, empreinte_regles='regles', dossier_cache=tmp_path, calculer=calculer
+        )
+
+    resultats, depuis_cache = optimiser(courbe)
+    assert not depuis_cache
+    # Lignes dans un autre ordre : même empreinte
+    relus, depuis_cache = optimiser(courbe.reverse())
+    assert depuis_cache
+    assert relus.equals(resultats)
+    assert not optimiser(courbe, ParametresOptimisation(p_max=100))[1]
+    assert not optimiser(courbe.with_columns(pl.col('Valeur') + 1))[1]
+    assert len(calculs) == 3
@@ -0,0 +1,120 @@
+"""Index de dépassement : index exacts par searchsorted, et index par kVA entier concordants."""
+
+import numpy as np
+import polars as pl
+import pytest
+
+from opti_c4.agregats import cumuler_depassement
+from opti_c4.depassement import (
+    CubeDepassementMensuel,
+    HistogrammeDepassement,
+    IndexDepassement,
+    IndexDepassementMensuel,
+)
+
+CADRANS = ['HPH', 'HCH', 'HPB', 'HCB']
+
+
+@pytest.fixture
+def durees() -> pl.DataFrame:
+    """Durées par (PRM, mois, cadran, pmax), pmax jusqu'à 120 kVA, entiers et non entiers."""
+    rng = np.random.default_rng(0)
+    n = 2000
+    return (
+        pl.DataFrame({
+            'Identifiant PRM': rng.choice(['PRM_A', 'PRM_B', 'PRM_C'], n),
+            'mois': pl.Series(rng.choice(['2025-01-01', '2025-02-01'], n)).str.to_date(),
+            'cadran': rng.choice(CADRANS, n),
+            'pmax': np.round(rng.uniform(0, 120, n), 1),
+            'duree_h': np.full(n, 1 / 6),
+        })
+        .group_by(['Identifiant PRM', 'mois', 'cadran', 'pmax'])
+        .agg(pl.col('duree_h').sum())
+    )
+
+
+@pytest.fixture
+def cdc(durees) -> pl.DataFrame:
+    """Agrégat annuel par (PRM, cadran, pmax), comme agreger_depassements."""
+    return cumuler_depassement(
+        durees.group_by(['Identifiant PRM', 'cadran', 'pmax']).agg(pl.col('duree_h').sum()),
+        ['Identifiant PRM', 'cadran'],
+    )
+
+
+def _scenarios(prms: list[str], seuils: np.ndarray) -> pl.DataFrame:
+    """Un scénario par (PRM, seuil), même puissance dans les 4 cadrans."""
+    return pl.DataFrame({
+        'pdl': np.repeat(prms, len(seuils)),
+        **{f'puissance_{c.lower()}_kva': np.tile(seuils, len(prms)) for c in CADRANS},
+    })
+
+
+def test_index_exact_egal_somme_des_durees(durees, cdc):
+    index = IndexDepassement.depuis_cdc(cdc)
+    annuel = durees.group_by(['Identifiant PRM', 'cadran', 'pmax']).agg(pl.col('duree_h').sum())
+
+    # Seuils entiers, non entiers, égaux à un pmax et hors plage
+    seuils = np.r_[-1.0, np.arange(0, 125, 0.5), annuel['pmax'].sample(20, seed=0).to_numpy()]
+    for (prm, cadran), groupe in annuel.partition_by(['Identifiant PRM', 'cadran'], as_dict=True).items():
+        pmax, duree = groupe['pmax'].to_numpy(), groupe['duree_h'].to_numpy()
+        attendu = np.array([duree[pmax > seuil].sum() for seuil in seuils])
+        np.testing.assert_allclose(index.duree_depassement(prm, cadran, seuils), attendu)
+    np.testing.assert_array_equal(index.duree_depassement('PRM_INCONNU', 'HPH', seuils), 0.0)
+
+
+def test_histogramme_egal_index_exact_jusqu_a_sa_taille(cdc):
+    # Histogramme de 60 kVA, pmax jusqu'à 120 kVA : les points au-delà vont dans la dernière case
+    histogramme = HistogrammeDepassement.depuis_cdc(cdc, puissance_max_kva=60)
+    exact = IndexDepassement.depuis_cdc(cdc)
+    assert histogramme.puissance_max_kva == 60
+
+    scenarios = _scenarios(['PRM_A', 'PRM_B', 'PRM_C', 'PRM_INCONNU'], np.arange(0, 61))
+    np.testing.assert_allclose(
+        histogramme.duree_depassement_scenarios(scenarios).to_numpy(),
+        exact.duree_depassement_scenarios(scenarios).to_numpy(),
+    )
+    # Seuil au-delà de la taille : heures au-delà de 60 kVA (majorant)
+    np.testing.assert_allclose(
+        histogramme.duree_depassement('PRM_A', 'HPH', np.array([59, 60, 61, 250])),
+        exact.duree_depassement('PRM_A', 'HPH', np.array([59, 60, 60, 60])),
+    )
+
+
+def test_taille_independante_des_pmax(durees):
+    # Un PRM au pmax aberrant n'agrandit pas l'histogramme des autres
+    aberrant = durees.head(1).with_columns(pl.lit('PRM_D').alias('Identifiant PRM'), pl.lit(5000.0).alias('pmax'))
+    cdc = cumuler_depassement(
+        pl.concat([durees, aberrant]).group_by(['Identifiant PRM', 'cadran', 'pmax']).agg(pl.col('duree_h').sum()),
+        ['Identifiant PRM', 'cadran'],
+    )
+    histogramme = HistogrammeDepassement.depuis_cdc(cdc)
+    exact = IndexDepassement.depuis_cdc(cdc)
+    assert histogramme.puissance_max_kva == 250
+
+    scenarios = _scenarios(['PRM_A', 'PRM_D'], np.arange(0, 251))
+    np.testing.assert_allclose(
+        histogramme.duree_depassement_scenarios(scenarios).to_numpy(),
+        exact.duree_depassement_scenarios(scenarios).to_numpy(),
+    )
+
+
+def test_histogramme_refuse_puissances_negatives_ou_non_entieres(cdc):
+    histogramme = HistogrammeDepassement.depuis_cdc(cdc, puissance_max_kva=60)
+    with pytest.raises(ValueError):
+        histogramme.duree_depassement('PRM_A', 'HPH', np.array([-1]))
+    with pytest.raises(ValueError):
+        histogramme.duree_depassement('PRM_A', 'HPH', np.array([10.5]))
+
+
+def test_cube_egal_index_mensuel_exact(durees):
+    cdc_mensuelle = cumuler_depassement(durees, ['Identifiant PRM', 'mois', 'cadran'])
+    cube = CubeDepassementMensuel.depuis_cdc_mensuelle(cdc_mensuelle, puissance_max_kva=60)
+    exact = IndexDepassementMensuel.depuis_cdc_mensuelle(cdc_mensuelle)
+    assert cube.puissance_max_kva == 60
+
+    scenarios = _scenarios(['PRM_A', 'PRM_B', 'PRM_C', 'PRM_INCONNU'], np.arange(0, 61))
+    np.testing.assert_allclose(
+        cube.duree_depassement_mensuelle(scenarios),
+        exact.duree_depassement_mensuelle(scenarios),
+    )
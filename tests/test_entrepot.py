@@ -0,0 +1,72 @@
+"""Entrepôt de courbes : agrégats mensuels mémorisés identiques au calcul sur la courbe complète."""
+
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from opti_c4.calendrier import CalendrierCadrans, parser_plages_horaires
+from opti_c4.entrepot import EntrepotCourbes
+from opti_c4.pipeline import analyser_courbe, classifier_courbe
+
+PRM = 30000000000001
+# Fenêtre glissante coupant décembre : un mois réagrégé, un mois relu depuis les agrégats
+DUREE_ANALYSE = timedelta(days=60)
+
+
+@pytest.fixture
+def calendrier() -> CalendrierCadrans:
+    return CalendrierCadrans.depuis_plages(
+        parser_plages_horaires('02h00-07h00;13h00-16h00'), hc_jours_non_ouvres=True
+    )
+
+
+def _trier(df: pl.DataFrame) -> pl.DataFrame:
+    return df.sort(df.columns)
+
+
+def _assert_classifications_egales(resultat, attendu):
+    assert_frame_equal(_trier(resultat.energies_agregees), _trier(attendu.energies_agregees), check_exact=False)
+    assert resultat.durees_par_methode.keys() == attendu.durees_par_methode.keys()
+    for methode, durees in attendu.durees_par_methode.items():
+        assert_frame_equal(
+            _trier(resultat.durees_par_methode[methode]), _trier(durees), check_column_order=False,
+        )
+
+
+def test_classifier_egal_classifier_courbe(tmp_path, courbe, calendrier):
+    courbe = courbe.filter(pl.col('Identifiant PRM') == PRM)
+    entrepot = EntrepotCourbes(tmp_path)
+
+    # Deux livraisons qui se recouvrent sur la seconde quinzaine de décembre
+    entrepot.ingerer(courbe.filter(pl.col('Horodate') < datetime(2025, 1, 1)).lazy())
+    bilan = entrepot.ingerer(courbe.filter(pl.col('Horodate') >= datetime(2024, 12, 15)).lazy())
+    assert bilan.select(['mois', 'lignes_ajoutees']).rows() == [
+        (datetime(2024, 12, 1).date(), 0),
+        (datetime(2025, 1, 1).date(), 31 * 144),
+    ]
+    assert bilan['modifiee'].to_list() == [False, True]
+
+    attendu = classifier_courbe(analyser_courbe(courbe.lazy(), DUREE_ANALYSE), calendrier)
+    # Premier appel : agrégats calculés et mémorisés ; second : relus
+    for _ in range(2):
+        _assert_classifications_egales(entrepot.classifier(PRM, calendrier, DUREE_ANALYSE), attendu)
+
+    # Dates de mesure mémorisées avec les agrégats du seul mois complet
+    assert [f.name for f in (tmp_path / 'agregats').rglob('*_dates.parquet')] == ['2025-01_dates.parquet']
+
+
+def test_livraison_corrigee_invalide_les_agregats(tmp_path, courbe, calendrier):
+    courbe = courbe.filter(pl.col('Identifiant PRM') == PRM)
+    entrepot = EntrepotCourbes(tmp_path)
+    entrepot.ingerer(courbe.lazy())
+    entrepot.classifier(PRM, calendrier, DUREE_ANALYSE)
+
+    # Correction de janvier : la nouvelle livraison l'emporte et les agrégats sont recalculés
+    correction = courbe.filter(pl.col('Horodate').dt.month() == 1).with_columns(pl.col('Valeur') * 2)
+    entrepot.ingerer(correction.lazy())
+    corrigee = pl.concat([courbe.filter(pl.col('Horodate').dt.month() != 1), correction])
+
+    attendu = classifier_courbe(analyser_courbe(corrigee.lazy(), DUREE_ANALYSE), calendrier)
+    _assert_classifications_egales(entrepot.classifier(PRM, calendrier, DUREE_ANALYSE), attendu)
@@ -0,0 +1,97 @@
+"""Exports M-2 / M-6 : partitions et consolidation incrémentale du plus récent par PRM."""
+
+import zipfile
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from opti_c4.archives import extraire_dossier
+from opti_c4.exports import consolider_plus_recent, dedoublonner_plus_recent, exporter_partitions
+
+CLIENTS = pl.DataFrame({'PRM': ['1', '2', '3', '4']})
+
+
+def _livrer_m6(dossier: Path, numero: int, horodatage: str, lignes: dict) -> pl.DataFrame:
+    """Dépose une archive M-6 d'un CSV puis relance l'extraction du dossier."""
+    with zipfile.ZipFile(dossier / f'ENEDIS_TURPE7HC_M-6_GRD-F091_{numero:03d}.zip', 'w') as zf:
+        zf.writestr(f'ENEDIS_M-6_{numero:03d}_{horodatage}.csv', pl.DataFrame(lignes).write_csv(separator=';'))
+    return extraire_dossier(dossier, 'secret', nb_processus=1, dechiffrer_par_7z=False)
+
+
+def test_dedoublonner_plus_recent():
+    lignes = pl.LazyFrame({
+        'PRM': ['1', '1', '2', '2'],
+        'FTA': ['BTINFCU4', 'BTSUPCU', 'BTSUPLU', 'BTINFLU'],
+        '_source_timestamp': ['20250101000000', '20250201000000', '20250301000000', '20250101000000'],
+    })
+    assert dedoublonner_plus_recent(lignes).collect().sort('PRM')['FTA'].to_list() == ['BTSUPCU', 'BTSUPLU']
+
+
+def test_consolidation_incrementale_egale_reconstruction(tmp_path):
+    etat = tmp_path / '.etat_M-6.parquet'
+
+    extraction = _livrer_m6(tmp_path, 1, '20250901000000', {'PRM': [1, 2, 5], 'FTA': ['BTINFCU4'] * 3})
+    initiale = consolider_plus_recent(extraction, 'M-6', CLIENTS, etat)
+    assert initiale.reconstruite
+    assert initiale.lignes.select(['PRM', 'FTA']).rows() == [
+        ('1', 'BTINFCU4'), ('2', 'BTINFCU4'), ('3', None), ('4', None),
+    ]
+
+    # Nouvelle livraison : seul son fichier est lu, il ne remplace que les PRM qu'il contient
+    extraction = _livrer_m6(tmp_path, 2, '20251001000000', {'PRM': [2, 3], 'FTA': ['BTSUPCU', 'BTSUPLU']})
+    incrementale = consolider_plus_recent(extraction, 'M-6', CLIENTS, etat)
+    assert not incrementale.reconstruite
+    assert incrementale.fichiers_lus == ['ENEDIS_M-6_002_20251001000000.csv']
+
+    reconstruite = consolider_plus_recent(extraction, 'M-6', CLIENTS, tmp_path / 'etat_complet.parquet')
+    assert reconstruite.reconstruite
+    assert incrementale.lignes.equals(reconstruite.lignes)
+    assert incrementale.lignes.select(['PRM', 'FTA']).rows() == [
+        ('1', 'BTINFCU4'), ('2', 'BTSUPCU'), ('3', 'BTSUPLU'), ('4', None),
+    ]
+
+    # Sans nouveau fichier : rien n'est relu
+    assert consolider_plus_recent(extraction, 'M-6', CLIENTS, etat).fichiers_lus == []
+
+
+@pytest.mark.parametrize('modification', ['client_ajoute', 'source_disparue', 'source_remplacee'])
+def test_consolidation_reconstruite(tmp_path, modification):
+    etat = tmp_path / '.etat_M-6.parquet'
+    _livrer_m6(tmp_path, 1, '20250901000000', {'PRM': [1, 2], 'FTA': ['BTINFCU4'] * 2})
+    extraction = _livrer_m6(tmp_path, 2, '20251001000000', {'PRM': [2], 'FTA': ['BTSUPCU']})
+    consolider_plus_recent(extraction, 'M-6', CLIENTS, etat)
+
+    clients = CLIENTS
+    if modification == 'client_ajoute':
+        clients = pl.concat([CLIENTS, pl.DataFrame({'PRM': ['6']})])
+    elif modification == 'source_disparue':
+        (tmp_path / 'ENEDIS_TURPE7HC_M-6_GRD-F091_002.zip').unlink()
+        extraction = extraire_dossier(tmp_path, 'secret', nb_processus=1, dechiffrer_par_7z=False)
+    else:
+        # Même fichier corrigé : ses anciennes lignes ne doivent pas survivre dans l'état
+        extraction = _livrer_m6(tmp_path, 2, '20251001000000', {'PRM': [1], 'FTA': ['BTSUPLU']})
+
+    consolidation = consolider_plus_recent(extraction, 'M-6', clients, etat)
+    assert consolidation.reconstruite
+    if modification == 'source_remplacee':
+        assert consolidation.lignes.select(['PRM', 'FTA']).rows()[:2] == [('1', 'BTSUPLU'), ('2', 'BTINFCU4')]
+    assert consolidation.lignes.equals(
+        consolider_plus_recent(extraction, 'M-6', clients, tmp_path / 'etat_complet.parquet').lignes
+    )
+
+
+def test_exporter_partitions(tmp_path):
+    df = pl.DataFrame({'mois': ['2025-08', '2025-09', '2025-08'], 'PRM': ['1', '2', '3']})
+    exports = exporter_partitions(df, 'mois', tmp_path, 'export_M2', formats=('csv', 'parquet'), nb_threads=2)
+
+    assert exports.select(['partition', 'format', 'nb_lignes']).rows() == [
+        ('2025-08', 'csv', 2), ('2025-08', 'parquet', 2), ('2025-09', 'csv', 1), ('2025-09', 'parquet', 1),
+    ]
+    assert pl.read_parquet(tmp_path / 'export_M2_2025-08.parquet').equals(df.filter(pl.col('mois') == '2025-08'))
+    assert pl.read_csv(tmp_path / 'export_M2_2025-09.csv', separator=';', schema=df.schema).equals(
+        df.filter(pl.col('mois') == '2025-09')
+    )
+    assert not list(tmp_path.glob('*.tmp'))
+    with pytest.raises(ValueError, match='Format'):
+        exporter_partitions(df, 'mois', tmp_path, 'export_M2', formats=('xlsx',))
@@ -0,0 +1,28 @@
+"""Écritures atomiques : pas de fichier tronqué ni de temporaire orphelin."""
+
+import polars as pl
+import pytest
+
+from opti_c4.fichiers import ecrire_atomique, ecrire_parquet_atomique
+
+
+def test_ecriture_atomique(tmp_path):
+    fichier = tmp_path / 'sous_dossier' / 'df.parquet'
+    df = pl.DataFrame({'a': [1, 2]})
+    ecrire_parquet_atomique(df, fichier)
+    assert pl.read_parquet(fichier).equals(df)
+    assert not list(fichier.parent.glob('*.tmp'))
+
+
+def test_echec_supprime_le_temporaire(tmp_path):
+    fichier = tmp_path / 'etat.json'
+    fichier.write_text('ancien')
+
+    def ecrire(chemin):
+        chemin.write_text('tronqu')
+        raise OSError('disque plein')
+
+    with pytest.raises(OSError, match='disque plein'):
+        ecrire_atomique(fichier, ecrire)
+    assert fichier.read_text() == 'ancien'
+    assert [p.name for p in tmp_path.iterdir()] == ['etat.json']
@@ -0,0 +1,85 @@
+"""Fusion d'exports R63 : priorité entre fichiers qui se recouvrent et rapport des recouvrements."""
+
+import os
+
+import polars as pl
+import pytest
+
+from opti_c4.fusion import fusionner_courbes, ordonner_sources
+
+
+def test_fusion_la_derniere_courbe_l_emporte(courbe):
+    courbe = courbe.filter(pl.col('Identifiant PRM') == 30000000000001)
+    annuel = courbe
+    # Export mensuel de novembre, recouvert par l'annuel : 10 valeurs corrigées
+    mensuel = (
+        courbe
+        .filter(pl.col('Horodate').dt.month() == 11)
+        .with_row_index()
+        .with_columns(pl.when(pl.col('index') < 10).then(pl.col('Valeur') + 1.5).otherwise('Valeur').alias('Valeur'))
+        .drop('index')
+    )
+
+    fusion = fusionner_courbes([annuel.lazy(), mensuel.lazy()], ['annuel.csv', 'novembre.csv'])
+    resultat = fusion.courbe.collect()
+
+    # Sans doublon, triée, et la courbe prioritaire (la dernière) l'emporte
+    assert resultat.height == courbe.height
+    assert resultat['Horodate'].is_sorted()
+    attendu = pl.concat([courbe.filter(pl.col('Horodate').dt.month() != 11), mensuel]).sort('Horodate')
+    assert resultat.equals(attendu)
+
+    recouvrements = fusion.recouvrements.collect()
+    assert recouvrements.rows(named=True) == [{
+        'Identifiant PRM': 30000000000001,
+        'source_retenue': 'novembre.csv',
+        'source_ecartee': 'annuel.csv',
+        'horodate_debut': mensuel['Horodate'].min(),
+        'horodate_fin': mensuel['Horodate'].max(),
+        'mesures_en_double': mensuel.height,
+        'conflits': 10,
+        'ecart_max_kw': pytest.approx(1.5),
+    }]
+
+
+def test_fusion_sans_recouvrement(courbe):
+    prm_1, prm_2 = courbe.partition_by('Identifiant PRM')
+    fusion = fusionner_courbes([prm_2.lazy(), prm_1.lazy()])
+    assert fusion.courbe.collect().equals(courbe.sort(['Identifiant PRM', 'Horodate']))
+    assert fusion.recouvrements.collect().is_empty()
+
+
+def test_ordonner_sources(tmp_path):
+    ancien, recent = tmp_path / 'ancien.csv', tmp_path / 'recent.csv'
+    for i, fichier in enumerate((ancien, recent)):
+        fichier.touch()
+        os.utime(fichier, (i, i))
+
+    assert ordonner_sources([recent, ancien]) == [recent, ancien]
+    assert ordonner_sources([recent, ancien], 'recente') == [ancien, recent]
+    with pytest.raises(ValueError, match='Priorité inconnue'):
+        ordonner_sources([recent, ancien], 'alphabetique')
+
+
+def test_fusion_conserve_les_horodates_repetees_d_une_source():
+    # Passage à l'heure d'hiver en heure locale naïve : 02:10 apparaît deux fois dans chaque export
+    horodates = ['2024-10-27 01:50', '2024-10-27 02:10', '2024-10-27 02:10', '2024-10-27 03:10']
+
+    def export(valeurs):
+        return pl.LazyFrame({
+            'Identifiant PRM': [1] * len(horodates),
+            'Horodate': pl.Series(horodates).str.to_datetime(),
+            'Valeur': valeurs,
+            'Pas': ['PT10M'] * len(horodates),
+        })
+
+    seul = fusionner_courbes([export([1.0, 2.0, 3.0, 4.0])], ['a'])
+    assert seul.courbe.collect()['Valeur'].to_list() == [1.0, 2.0, 3.0, 4.0]
+    assert seul.recouvrements.collect().is_empty()
+
+    # Deux exports recouvrants : les deux mesures de 02:10 de la source prioritaire sont retenues
+    fusion = fusionner_courbes([export([1.0, 2.0, 3.0, 4.0]), export([1.0, 2.5, 3.5, 4.0])], ['a', 'b'])
+    assert fusion.courbe.collect()['Valeur'].to_list() == [1.0, 2.5, 3.5, 4.0]
+    assert fusion.recouvrements.collect().select(
+        ['source_retenue', 'source_ecartee', 'mesures_en_double', 'conflits']
+    ).rows() == [('b', 'a', 4, 2)]
@@ -0,0 +1,143 @@
+"""Scénarios BTSUP : optimum par programmation dynamique et règles TURPE manquantes."""
+
+import logging
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+import pytest
+
+from opti_c4.agregats import cumuler_depassement
+from opti_c4.depassement import HistogrammeDepassement
+from opti_c4.pipeline import generer_scenarios
+from opti_c4.scenarios import generer_scenarios_optimaux_btsup, optimiser_puissances_btsup
+
+CADRANS = ['HPH', 'HCH', 'HPB', 'HCB']
+PRMS = ['PRM_A', 'PRM_B', 'PRM_C']
+
+
+@pytest.fixture
+def regles() -> pl.DataFrame:
+    """Une règle par FTA, coefficients de l'ordre de ceux du TURPE 7."""
+    return pl.DataFrame({
+        'Formule_Tarifaire_Acheminement': ['BTINFCU4', 'BTSUPCU', 'BTSUPLU'],
+        'b': [10.11, None, None],
+        'b_hph': [None, 17.61, 30.16],
+        'b_hch': [None, 15.96, 21.18],
+        'b_hpb': [None, 14.56, 16.64],
+        'b_hcb': [None, 11.87, 12.37],
+        'cmdps': [None, 12.41, 12.41],
+    })
+
+
+@pytest.fixture
+def cdc() -> pl.DataFrame:
+    """Agrégat par (PRM, cadran, pmax) d'une courbe synthétique, pmax jusqu'à 90 kVA."""
+    rng = np.random.default_rng(1)
+    n = 3000
+    return cumuler_depassement(
+        pl.DataFrame({
+            'Identifiant PRM': rng.choice(PRMS, n),
+            'cadran': rng.choice(CADRANS, n),
+            'pmax': np.round(rng.gamma(4.0, 10.0, n).clip(0, 90), 1),
+            'duree_h': np.full(n, 1 / 6),
+        })
+        .group_by(['Identifiant PRM', 'cadran', 'pmax'])
+        .agg(pl.col('duree_h').sum()),
+        ['Identifiant PRM', 'cadran'],
+    )
+
+
+@pytest.fixture
+def consos() -> pl.DataFrame:
+    return pl.DataFrame({
+        'pdl': PRMS,
+        'energie_hph_kwh': [1200.0, 800.0, 0.0],
+        'energie_hch_kwh': [600.0, 400.0, 0.0],
+        'energie_hpb_kwh': [3000.0, 2500.0, 100.0],
+        'energie_hcb_kwh': [1500.0, 1000.0, 50.0],
+        'pmax_moyenne_kva': [90.0, 85.0, 32.0],
+    })
+
+
+@pytest.mark.parametrize('graine', range(5))
+def test_optimum_btsup_egal_force_brute(graine):
+    rng = np.random.default_rng(graine)
+    p_min, plage = 36, 15
+    # Heures de dépassement décroissantes avec la puissance, comme un index réel
+    depassement = {
+        cadran: np.sort(rng.exponential(40.0, plage).cumsum())[::-1] * rng.uniform(0, 1)
+        for cadran in CADRANS
+    }
+    b = np.sort(rng.uniform(5, 30, 4))[::-1]
+    cmdps = rng.uniform(5, 20)
+
+    optimum, cout = optimiser_puissances_btsup(depassement, *b, cmdps, p_min=p_min)
+
+    # Toutes les combinaisons P_hph ≤ P_hch ≤ P_hpb ≤ P_hcb
+    i = np.stack(np.meshgrid(*[np.arange(plage)] * 4, indexing='ij'), axis=-1).reshape(-1, 4)
+    i = i[np.all(np.diff(i, axis=1) >= 0, axis=1)]
+    p = p_min + i
+    couts = (
+        b[0] * p[:, 0] + b[1] * (p[:, 1] - p[:, 0]) + b[2] * (p[:, 2] - p[:, 1]) + b[3] * (p[:, 3] - p[:, 2])
+        + cmdps * sum(depassement[cadran][i[:, k]] for k, cadran in enumerate(CADRANS))
+    )
+    assert cout == pytest.approx(couts.min())
+    assert couts[np.all(p == optimum, axis=1)][0] == pytest.approx(couts.min())
+
+
+def test_scenarios_optimaux_egaux_optimum_par_pdl(consos, cdc, regles):
+    index = HistogrammeDepassement.depuis_cdc(cdc)
+    scenarios = generer_scenarios_optimaux_btsup(consos, index, regles, p_min=36, p_max=120)
+
+    assert scenarios.select(['pdl', 'formule_tarifaire_acheminement']).rows() == [
+        (pdl, fta) for pdl in PRMS for fta in ('BTSUPCU', 'BTSUPLU')
+    ]
+    seuils = np.arange(36, 121)
+    for pdl, fta, *puissances in scenarios.select([
+        'pdl', 'formule_tarifaire_acheminement',
+        'puissance_hph_kva', 'puissance_hch_kva', 'puissance_hpb_kva', 'puissance_hcb_kva',
+    ]).iter_rows():
+        regle = regles.row(by_predicate=pl.col('Formule_Tarifaire_Acheminement') == fta, named=True)
+        optimum, _ = optimiser_puissances_btsup(
+            {cadran: index.duree_depassement(pdl, cadran, seuils) for cadran in CADRANS},
+            regle['b_hph'], regle['b_hch'], regle['b_hpb'], regle['b_hcb'], regle['cmdps'],
+        )
+        assert tuple(puissances) == optimum
+
+
+def test_regle_btsup_absente_leve_valueerror(consos, cdc, regles):
+    index = HistogrammeDepassement.depuis_cdc(cdc)
+    regles_btinf = regles.filter(pl.col('Formule_Tarifaire_Acheminement') != 'BTSUPLU')
+    with pytest.raises(ValueError, match=r'BTSUPLU.*01/01/2025'):
+        generer_scenarios_optimaux_btsup(consos, index, regles_btinf, date_turpe=datetime(2025, 1, 1))
+
+
+def test_generer_scenarios_omet_btsup_sans_regle(consos, cdc, regles, caplog):
+    index = HistogrammeDepassement.depuis_cdc(cdc)
+    regles_btinf = regles.filter(pl.col('Formule_Tarifaire_Acheminement') == 'BTINFCU4')
+
+    with caplog.at_level(logging.WARNING, logger='opti_c4.pipeline'):
+        scenarios = generer_scenarios(
+            consos, cdc, index, regles_btinf, p_min=30, p_max=120,
+            balayage=True, date_turpe=datetime(2025, 1, 1),
+        )
+
+    assert not scenarios.is_empty()
+    assert not scenarios['formule_tarifaire_acheminement'].str.starts_with('BTSUP').any()
+    assert 'BTSUPCU' in caplog.text
+
+
+def test_scenarios_dates_de_la_periode_simulee(consos, cdc, regles):
+    index = HistogrammeDepassement.depuis_cdc(cdc)
+    scenarios = generer_scenarios(
+        consos, cdc, index, regles, p_min=30, p_max=120, balayage=True, date_turpe=datetime(2026, 8, 1),
+    )
+
+    # BTINF, optimum BTSUP et balayage : même période que les règles de tarification
+    assert scenarios['formule_tarifaire_acheminement'].unique().sort().to_list() == [
+        'BTINFCU4', 'BTINFLU', 'BTINFMU4', 'BTSUPCU', 'BTSUPLU',
+    ]
+    assert scenarios.select(
+        pl.col('date_debut').dt.date(), pl.col('date_fin').dt.date(), 'nb_jours'
+    ).unique().rows() == [(datetime(2026, 8, 1).date(), datetime(2027, 7, 31).date(), 365)]
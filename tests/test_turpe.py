@@ -0,0 +1,92 @@
+"""Noyau TURPE : coûts en forme fermée identiques à ceux d'electricore."""
+
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+import pytest
+
+from opti_c4.agregats import agreger_depassements
+from opti_c4.depassement import HistogrammeDepassement, IndexDepassementMensuel
+from opti_c4.pipeline import calculer_couts, generer_scenarios, preparer_scenarios_turpe
+from opti_c4.turpe import NoyauTurpe, extraire_regles_turpe, verifier_noyau_turpe
+
+CADRANS = ['HPH', 'HCH', 'HPB', 'HCB']
+DATE_TURPE = datetime(2025, 8, 1)
+
+# Contrôle contre electricore : seul module de tests qui en dépend
+load_turpe_rules = pytest.importorskip('electricore.core.pipelines.turpe').load_turpe_rules
+
+
+@pytest.fixture(scope='module')
+def regles_turpe() -> pl.LazyFrame:
+    return load_turpe_rules()
+
+
+@pytest.fixture
+def agregats() -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """(cdc, cdc_mensuelle, consos_agregees) sur trois mois : PRM_A jusqu'à 80 kVA, PRM_B sous 30 kVA."""
+    rng = np.random.default_rng(2)
+    n = 3000
+    prms = rng.choice(['PRM_A', 'PRM_B'], n)
+    durees = (
+        pl.DataFrame({
+            'Identifiant PRM': prms,
+            'mois': pl.Series(rng.choice(['2025-01-01', '2025-02-01', '2025-03-01'], n)).str.to_date(),
+            'cadran': rng.choice(CADRANS, n),
+            'pmax': np.round(rng.gamma(3.0, 9.0, n).clip(0, np.where(prms == 'PRM_A', 80, 30)), 1),
+            'duree_h': np.full(n, 1 / 6),
+        })
+        .group_by(['Identifiant PRM', 'mois', 'cadran', 'pmax'])
+        .agg(pl.col('duree_h').sum())
+    )
+    energies_agregees = pl.DataFrame({
+        'pdl': ['PRM_A', 'PRM_B'],
+        'energie_hph_kwh': [5200.0, 800.0],
+        'energie_hch_kwh': [2100.0, 300.0],
+        'energie_hpb_kwh': [9800.0, 2600.0],
+        'energie_hcb_kwh': [4100.0, 900.0],
+        'date_debut': [datetime(2025, 1, 1)] * 2,
+        'date_fin': [datetime(2025, 3, 31)] * 2,
+    })
+    return agreger_depassements(durees, energies_agregees)
+
+
+def test_noyau_egal_electricore(agregats, regles_turpe):
+    cdc, cdc_mensuelle, consos = agregats
+    regles = extraire_regles_turpe(regles_turpe, DATE_TURPE)
+    scenarios = generer_scenarios(
+        consos, cdc, HistogrammeDepassement.depuis_cdc(cdc), regles, p_min=3, p_max=100,
+    )
+    resultats = calculer_couts(
+        preparer_scenarios_turpe(scenarios),
+        NoyauTurpe(regles),
+        IndexDepassementMensuel.depuis_cdc_mensuelle(cdc_mensuelle),
+    )
+
+    # BTINF et BTSUP, avec et sans dépassement
+    assert set(resultats['formule_tarifaire_acheminement']) >= {'BTINFCU4', 'BTINFLU', 'BTSUPCU', 'BTSUPLU'}
+    assert (resultats['turpe_depassement_eur'] > 0).any()
+
+    nb_verifies, ecart_max = verifier_noyau_turpe(resultats, regles_turpe, taille_echantillon=resultats.height)
+    assert nb_verifies == resultats.height
+    assert ecart_max <= 0.01
+
+
+def test_noyau_ecarte_les_fta_sans_regle(agregats, regles_turpe):
+    _, cdc_mensuelle, consos = agregats
+    scenarios = preparer_scenarios_turpe(
+        consos
+        .join(pl.DataFrame({'formule_tarifaire_acheminement': ['BTINFCU4', 'FTA_INCONNUE']}), how='cross')
+        .with_columns([
+            pl.lit(DATE_TURPE).alias('date_debut'),
+            pl.lit(datetime(2026, 7, 31)).alias('date_fin'),
+            pl.lit(365).alias('nb_jours'),
+            pl.lit(36).alias('puissance_souscrite_kva'),
+            *[pl.lit(36).alias(f'puissance_{c.lower()}_kva') for c in CADRANS],
+        ])
+    )
+    resultats = NoyauTurpe.depuis_regles(regles_turpe, DATE_TURPE).calculer(
+        scenarios, IndexDepassementMensuel.depuis_cdc_mensuelle(cdc_mensuelle)
+    )
+    assert resultats['formule_tarifaire_acheminement'].to_list() == ['BTINFCU4', 'BTINFCU4']